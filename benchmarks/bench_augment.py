@@ -0,0 +1,165 @@
+"""
+Compares `augment` with the previous implementation, which rebuilt the string and shifted every markup after each
+edit, on synthetic strings: both must give the same output for the same random state. The check also runs on
+strings whose markup overlaps (duplicate spans, spans sharing a start, and nested spans), which are not timed.
+
+    python -m benchmarks.bench_augment [--strings 20000] [--markup-density 0.15] [--n 1 2 3 5] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import PageSpec, make_names, make_page
+from pubchem_scraper.augment import augment, get_iupac, get_rand_name, get_rand_synonym, get_random_alias, get_random_id
+from pubchem_scraper.fastdecode import iter_simple_elements
+from pubchem_scraper.names import NameLookup
+from pubchem_scraper.pubchem_schema import SimpleMarkup, SimpleStringWithMarkup
+
+
+def legacy_replace_text(text: str, start: int, length: int, new_text: str) -> tuple[str, int]:
+    return (text[:start] + new_text + text[start + length :], len(new_text) - length)
+
+
+def legacy_shift_markup(markup: list[SimpleMarkup], from_pos: int, shift: int) -> None:
+    for m in markup:
+        if m.start > from_pos:
+            m.start += shift
+
+
+def legacy_replace(markup: SimpleMarkup, result: SimpleStringWithMarkup, new_text: str) -> str:
+    text, shift = legacy_replace_text(result.string, markup.start, markup.length, new_text)
+    markup.hit = new_text
+    markup.length = len(new_text)
+    legacy_shift_markup(result.markup, markup.start, shift)
+    return text
+
+
+def legacy_augment(
+    string: SimpleStringWithMarkup, n: int, rng: random.Random, names: NameLookup
+) -> SimpleStringWithMarkup:
+    if not string.markup:
+        return string
+
+    result = string.model_copy(deep=True)
+
+    choices = []
+    while len(choices) < n:
+        choice = rng.choice(range(1, 6))
+        if choice == 5 and 5 in choices:
+            continue
+        choices.append(choice)
+
+    for case in choices:
+        if not result.markup:
+            break
+
+        markup = rng.choice(result.markup)
+        match case:
+            case 1:
+                text = legacy_replace(markup, result, get_rand_name(markup.cid, rng, names))
+            case 2:
+                text = legacy_replace(markup, result, f"{markup.hit} ({get_rand_synonym(markup.cid, rng, names)})")
+            case 3:
+                text = legacy_replace(markup, result, rng.choice([get_random_alias(rng), get_random_id(rng)]))
+            case 4:
+                new_name = get_rand_name(markup.cid, rng, names)
+                alias = rng.choice([get_random_alias(rng), get_random_id(rng)])
+                text = legacy_replace(markup, result, f"{new_name} ({alias})")
+            case _:
+                first_markup = min(result.markup, key=lambda x: x.start)
+                if not first_markup.cid:
+                    text = result.string
+                else:
+                    new_name = get_iupac(first_markup.cid, names)
+                    alias = rng.choice([get_random_alias(rng), get_random_id(rng)])
+                    prefix = f"{new_name} ({alias}): "
+                    text = prefix + result.string
+                    legacy_shift_markup(result.markup, -1, len(prefix))
+                    result.markup.append(
+                        SimpleMarkup(start=0, length=len(prefix) - 2, cid=first_markup.cid, hit=f"{new_name} ({alias})")
+                    )
+
+        result.string = text
+        result.markup = sorted(result.markup, key=lambda x: x.start)
+
+    return result
+
+
+def make_strings(num_strings: int, markup_density: float, seed: int = 0) -> list[SimpleStringWithMarkup]:
+    """Marked-up strings out of synthetic pages, as many pages as it takes"""
+    spec = PageSpec(num_annotations=500, markup_density=markup_density)
+    strings: list[SimpleStringWithMarkup] = []
+    page = 0
+    while len(strings) < num_strings:
+        body = make_page(spec, seed + page)
+        strings += [element.string for _, element in iter_simple_elements(body) if element.string.markup]
+        page += 1
+    return strings[:num_strings]
+
+
+def make_overlapping(strings: list[SimpleStringWithMarkup], seed: int = 0) -> list[SimpleStringWithMarkup]:
+    """
+    Copies of `strings` where every markup has a duplicate, a span sharing its start, or a span nested in it added
+    after it, so that edits run into each other
+    """
+    rng = random.Random(seed)
+    result = []
+    for string in strings:
+        markup = []
+        for m in string.markup:
+            markup.append(m)
+            match rng.randint(0, 3):
+                case 0:
+                    markup.append(m.model_copy())
+                case 1:
+                    end = min(len(string.string), m.start + m.length + rng.randint(1, 8))
+                    markup.append(m.model_copy(update={"length": end - m.start, "hit": string.string[m.start : end]}))
+                case 2 if m.length > 2:
+                    start = m.start + rng.randint(1, m.length - 2)
+                    length = rng.randint(0, m.start + m.length - start)
+                    hit = string.string[start : start + length]
+                    markup.append(SimpleMarkup(start=start, length=length, cid=m.cid, hit=hit))
+        result.append(SimpleStringWithMarkup(string=string.string, markup=markup))
+    return result
+
+
+def run(fn, strings: list[SimpleStringWithMarkup], n: int, names: NameLookup) -> list[SimpleStringWithMarkup]:
+    return [fn(string, n=n, rng=random.Random(i), names=names) for i, string in enumerate(strings)]
+
+
+def timeit(fn, strings: list[SimpleStringWithMarkup], n: int, names: NameLookup, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(fn, strings, n, names)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--strings", type=int, default=20_000)
+    parser.add_argument("--markup-density", type=float, default=0.15)
+    parser.add_argument("--n", type=int, nargs="+", default=[1, 2, 3, 5], help="Augmentations per string")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    strings = make_strings(args.strings, args.markup_density)
+    names = make_names(PageSpec().num_cids)
+    num_markup = sum(len(s.markup) for s in strings)
+    print(f"{len(strings)} strings, {num_markup / len(strings):.1f} markup per string")
+
+    overlapping = make_overlapping(strings[:3000])
+
+    for n in args.n:
+        for label, cases in [("", strings), (" with overlapping markup", overlapping)]:
+            expected = [s.model_dump() for s in run(legacy_augment, cases, n, names)]
+            actual = [s.model_dump() for s in run(augment, cases, n, names)]
+            assert expected == actual, f"Output differs for n={n}{label}"
+
+        baseline = None
+        for name, fn in [("legacy augment", legacy_augment), ("augment", augment)]:
+            elapsed = timeit(fn, strings, n, names, args.repeat)
+            baseline = baseline or elapsed
+            print(f"n={n} {name:16s} {elapsed * 1e3:9.1f} ms  {baseline / elapsed:5.1f}x")
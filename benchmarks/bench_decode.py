@@ -0,0 +1,82 @@
+"""
+Compares the validating page decoder with the fast path in `pubchem_scraper.fastdecode`.
+
+    python -m benchmarks.bench_decode [--page data/page.json] [--annotations 2000] [--repeat 5]
+"""
+
+import argparse
+import contextlib
+import gc
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import PageSpec, make_page
+from pubchem_scraper.fastdecode import decode_simple_record, iter_simple_elements
+from pubchem_scraper.pubchem_schema import Record, SimpleRecord, SimpleStringWithMarkup
+
+
+def flatten(record: SimpleRecord) -> list[SimpleStringWithMarkup]:
+    strings = []
+    for annotation in record.Annotations:
+        for section in annotation.Data:
+            with contextlib.suppress(ValueError):
+                strings.append(SimpleStringWithMarkup.from_string_with_markup(section.Value))
+    return strings
+
+
+def validating_path(body: bytes) -> tuple[SimpleRecord, list[SimpleStringWithMarkup]]:
+    record = SimpleRecord.from_record(Record.model_validate_json(body))
+    return record, flatten(record)
+
+
+def fast_path(body: bytes) -> tuple[SimpleRecord, list[SimpleStringWithMarkup]]:
+    record = decode_simple_record(body)
+    return record, flatten(record)
+
+
+def fast_strings(body: bytes) -> list[SimpleStringWithMarkup]:
+    return [element.string for _, element in iter_simple_elements(body)]
+
+
+def timeit(fn, body: bytes, repeat: int) -> float:
+    """
+    Best of `repeat` runs, with garbage collection off while timing as in the `timeit` module: otherwise whichever
+    path runs later pays for collecting the object graphs the earlier ones left behind
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn(body)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page", type=Path, default=None, help="Raw page JSON to decode (default: synthetic)")
+    parser.add_argument("--annotations", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = args.page.read_bytes() if args.page else make_page(PageSpec(num_annotations=args.annotations))
+
+    slow_record, slow_strings = validating_path(body)
+    fast_record, _ = fast_path(body)
+    assert slow_record.model_dump() == fast_record.model_dump(), "SimpleRecord differs between paths"
+    assert [s.model_dump() for s in slow_strings] == [s.model_dump() for s in fast_strings(body)], "Strings differ"
+
+    print(f"page size: {len(body) / 1e6:.1f} MB, {len(slow_strings)} strings")
+    baseline = None
+    for name, fn in [
+        ("Record -> SimpleRecord -> strings", validating_path),
+        ("decode_simple_record -> strings", fast_path),
+        ("iter_simple_elements", fast_strings),
+    ]:
+        elapsed = timeit(fn, body, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:36s} {elapsed * 1e3:9.1f} ms  {baseline / elapsed:5.1f}x")
@@ -0,0 +1,183 @@
+"""
+Compares `merge_molecules` with the previous quadratic implementation on large synthetic inputs.
+
+The previous implementation collected each group's names in sets, so which of two equally long names it chose
+depended on string hashing and changed from one process to the next. It is timed as it was, while the output check
+runs against a copy that collects them in insertion order, as `merge_molecules` does. Every timed run starts with
+the `normalized_ids` cache empty.
+
+    python -m benchmarks.bench_merge [--molecules 500] [--synonyms 20] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from functools import partial
+
+from benchmarks.bench_normalize import (
+    legacy_map_unicode_characters,
+    legacy_replace_greek_letters,
+    legacy_replace_greek_single_letter,
+)
+from pubchem_scraper.datatypes import Molecule, dedup_prefer_capital, merge_molecules
+from pubchem_scraper.normalize import normalized_ids
+
+STEMS = ["α-tocopherol", "β-carotene", "acetyl", "benzyl", "chloro", "methyl", "pyridin", "γ-butyro", "ethyl", "oxo"]
+
+
+class LegacyUnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        if x != self.parent.setdefault(x, x):
+            self.parent[x] = self.find(self.parent[x])
+        return self.parent[x]
+
+    def union(self, x, y):
+        self.parent[self.find(x)] = self.find(y)
+
+
+def legacy_all_ids(mol: Molecule) -> set[str]:
+    all_ids = {legacy_map_unicode_characters(id_) for id_ in [mol.name, *mol.alternatives]}
+    all_ids.update([id_.lower() for id_ in all_ids])
+    updates = []
+    for id_ in all_ids:
+        updates.append(legacy_replace_greek_letters(id_))
+        updates.append(legacy_replace_greek_single_letter(id_))
+    all_ids.update(updates)
+    return all_ids
+
+
+def legacy_merge_molecules(molecules: list[Molecule], ordered: bool = True) -> list[Molecule]:
+    """The previous merge; with `ordered` False it collects names in sets, exactly as it did"""
+    if not ordered:
+        return _unordered_legacy_merge(molecules)
+
+    uf = LegacyUnionFind()
+    id_to_indices = defaultdict(set)
+
+    for idx, mol in enumerate(molecules):
+        for id_ in legacy_all_ids(mol):
+            id_to_indices[id_].add(idx)
+
+    for indices in id_to_indices.values():
+        indices = list(indices)
+        for i in range(len(indices) - 1):
+            uf.union(indices[i], indices[i + 1])
+
+    groups = defaultdict(list)
+    for idx in range(len(molecules)):
+        groups[uf.find(idx)].append(idx)
+
+    merged_molecules = []
+    for group in groups.values():
+        names = {}
+        alternatives = {}
+        for idx in group:
+            names[molecules[idx].name] = None
+            alternatives.update(dict.fromkeys(molecules[idx].alternatives))
+        all_ids = dedup_prefer_capital(list(names | alternatives))
+        chosen_name = sorted(all_ids, key=len, reverse=True)[0]  # noqa: FURB192
+        all_ids.remove(chosen_name)
+        all_ids = sorted(all_ids, key=lambda x: (x.lower(), x))
+
+        selected = []
+        for id_ in all_ids:
+            if id_.lower() in [s.lower() for s in selected]:
+                continue
+            selected.append(id_)
+
+        merged_molecules.append(Molecule(name=chosen_name, alternatives=selected))
+
+    return merged_molecules
+
+
+def _unordered_legacy_merge(molecules: list[Molecule]) -> list[Molecule]:
+    uf = LegacyUnionFind()
+    id_to_indices = defaultdict(set)
+
+    for idx, mol in enumerate(molecules):
+        for id_ in legacy_all_ids(mol):
+            id_to_indices[id_].add(idx)
+
+    for indices in id_to_indices.values():
+        indices = list(indices)
+        for i in range(len(indices) - 1):
+            uf.union(indices[i], indices[i + 1])
+
+    groups = defaultdict(list)
+    for idx in range(len(molecules)):
+        groups[uf.find(idx)].append(idx)
+
+    merged_molecules = []
+    for group in groups.values():
+        names = set()
+        alternatives = set()
+        for idx in group:
+            names.add(molecules[idx].name)
+            alternatives.update(molecules[idx].alternatives)
+        all_ids = dedup_prefer_capital(names.union(alternatives))  # type: ignore
+        chosen_name = sorted(all_ids, key=len, reverse=True)[0]  # noqa: FURB192
+        all_ids.remove(chosen_name)
+        all_ids = sorted(all_ids, key=lambda x: (x.lower(), x))
+
+        selected = []
+        for id_ in all_ids:
+            if id_.lower() in [s.lower() for s in selected]:
+                continue
+            selected.append(id_)
+
+        merged_molecules.append(Molecule(name=chosen_name, alternatives=selected))
+
+    return merged_molecules
+
+
+def make_molecules(num_molecules: int, num_synonyms: int, seed: int = 0) -> list[tuple[str, list[str]]]:
+    """Names drawn from a shared pool, so molecules overlap, in varying case and with greek letters"""
+    rng = random.Random(seed)
+    pool = [f"{rng.choice(STEMS)}-{rng.randint(1, num_molecules * 2)}" for _ in range(num_molecules * 4)]
+
+    def name() -> str:
+        n = rng.choice(pool)
+        return n.upper() if rng.random() < 0.2 else n
+
+    return [(name(), [name() for _ in range(rng.randint(0, num_synonyms))]) for _ in range(num_molecules)]
+
+
+def timeit(fn, specs: list[tuple[str, list[str]]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # Fresh molecules every run, since `_all_ids` is cached per instance
+        molecules = [Molecule(name=n, alternatives=alts) for n, alts in specs]
+        normalized_ids.cache_clear()
+        start = time.perf_counter()
+        fn(molecules)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--molecules", type=int, default=500)
+    parser.add_argument("--synonyms", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    specs = make_molecules(args.molecules, args.synonyms)
+    fresh = [Molecule(name=n, alternatives=alts) for n, alts in specs]
+    expected = [m.model_dump() for m in legacy_merge_molecules(fresh)]
+    assert expected == [m.model_dump() for m in merge_molecules(fresh)], "Merged molecules differ"
+
+    num_ids = sum(1 + len(alts) for _, alts in specs)
+    print(f"{args.molecules} molecules, {num_ids} identifiers, {len(expected)} merged")
+    baseline = None
+    for name, fn in [
+        ("legacy, as it was (sets)", partial(legacy_merge_molecules, ordered=False)),
+        ("legacy, insertion-ordered", legacy_merge_molecules),
+        ("merge_molecules", merge_molecules),
+    ]:
+        elapsed = timeit(fn, specs, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:26s} {elapsed * 1e3:9.1f} ms  {baseline / elapsed:5.1f}x")
@@ -0,0 +1,137 @@
+"""
+Compares `pubchem_scraper.normalize` with the per-call implementations it replaced.
+
+    python -m benchmarks.bench_normalize [--names 20000] [--distinct 2000] [--repeat 5]
+"""
+
+import argparse
+import random
+import re
+import time
+import unicodedata
+
+from pubchem_scraper import normalize
+
+GREEK_RE = re.compile(r"[\u0370-\u03FF]")
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789-,() " + "αβγδεθλμπσωΑΒΓΔΩ" + "’“”—–…‘´″" + "ϐϑϒϕϖ"
+
+
+def legacy_replace_greek_letters(text: str) -> str:
+    def greek_to_english(match: re.Match) -> str:
+        char = match.group(0)
+        try:
+            name = unicodedata.name(char).lower()
+            name = name.replace("greek small letter ", "").replace("greek capital letter ", "")
+            return name
+        except ValueError:
+            return char
+
+    return GREEK_RE.sub(greek_to_english, text)
+
+
+def legacy_replace_greek_single_letter(text: str) -> str:
+    # fmt: off
+    greek_to_english = {
+        'α': 'a', 'Α': 'A',  # alpha
+        'β': 'b', 'Β': 'B',  # beta
+        'γ': 'g', 'Γ': 'G',  # gamma
+        'δ': 'd', 'Δ': 'D',  # delta
+        'ε': 'e', 'Ε': 'E',  # epsilon
+        'ζ': 'z', 'Ζ': 'Z',  # zeta
+        'η': 'h', 'Η': 'H',  # eta
+        'θ': 'th', 'Θ': 'Th',  # theta
+        'ι': 'i', 'Ι': 'I',  # iota
+        'κ': 'k', 'Κ': 'K',  # kappa
+        'λ': 'l', 'Λ': 'L',  # lambda
+        'μ': 'm', 'Μ': 'M',  # mu
+        'ν': 'n', 'Ν': 'N',  # nu
+        'ξ': 'x', 'Ξ': 'X',  # xi
+        'ο': 'o', 'Ο': 'O',  # omicron
+        'π': 'p', 'Π': 'P',  # pi
+        'ρ': 'r', 'Ρ': 'R',  # rho
+        'σ': 's', 'Σ': 'S',  # sigma
+        'ς': 's',            # final sigma
+        'τ': 't', 'Τ': 'T',  # tau
+        'υ': 'y', 'Υ': 'Y',  # upsilon
+        'φ': 'ph', 'Φ': 'Ph',  # phi
+        'χ': 'ch', 'Χ': 'Ch',  # chi
+        'ψ': 'ps', 'Ψ': 'Ps',  # psi
+        'ω': 'o', 'Ω': 'O'   # omega
+    }
+    # fmt: on
+
+    for greek, english in greek_to_english.items():
+        text = text.replace(greek, english)
+
+    return text
+
+
+def legacy_map_unicode_characters(text):
+    translation_table = {
+        ord("’"): "'",
+        ord("“"): '"',
+        ord("”"): '"',
+        ord("—"): "-",
+        ord("–"): "-",
+        ord("…"): "...",
+        ord("‘"): "'",
+        ord("´"): "'",
+        ord("″"): '"',
+    }
+
+    return text.translate(translation_table)
+
+
+def legacy_normalized_ids(id_: str) -> frozenset[str]:
+    mapped = legacy_map_unicode_characters(id_)
+    forms = {mapped, mapped.lower()}
+    return frozenset(
+        forms.union(*((legacy_replace_greek_letters(f), legacy_replace_greek_single_letter(f)) for f in forms))
+    )
+
+
+def make_names(num_names: int, num_distinct: int, seed: int = 0) -> list[str]:
+    """Names repeated the way they are across a corpus; about a third are plain ASCII"""
+    rng = random.Random(seed)
+    ascii_chars = ALPHABET[:41]
+    distinct = [
+        "".join(rng.choices(ascii_chars if rng.random() < 0.33 else ALPHABET, k=rng.randint(5, 40)))
+        for _ in range(num_distinct)
+    ]
+    return rng.choices(distinct, k=num_names)
+
+
+def timeit(fn, names: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        normalize.normalized_ids.cache_clear()
+        start = time.perf_counter()
+        fn(names)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, default=20_000)
+    parser.add_argument("--distinct", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names = make_names(args.names, args.distinct)
+    for name in set(names):
+        assert legacy_map_unicode_characters(name) == normalize.map_unicode_characters(name)
+        assert legacy_replace_greek_letters(name) == normalize.replace_greek_letters(name)
+        assert legacy_replace_greek_single_letter(name) == normalize.replace_greek_single_letter(name)
+        assert legacy_normalized_ids(name) == normalize.normalized_ids(name)
+
+    print(f"{len(names)} names, {len(set(names))} distinct")
+    baseline = None
+    for label, fn in [
+        ("per-call functions", lambda names: [legacy_normalized_ids(n) for n in names]),
+        ("normalize tables, uncached", lambda names: [normalize.normalized_ids.__wrapped__(n) for n in names]),
+        ("normalize_many", normalize.normalize_many),
+    ]:
+        elapsed = timeit(fn, names, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{label:28s} {elapsed * 1e3:9.1f} ms  {baseline / elapsed:5.1f}x")
@@ -0,0 +1,281 @@
+"""
+Local stand-in for the PUG-View annotations endpoint, for measuring the scraper without touching NCBI.
+
+Serves `/rest/pug_view/annotations/heading/{heading}/JSON?page=N` with synthetic pages, after a configurable latency,
+and injects 429s, 5xxs and hung requests at configurable rates. Besides the origin it listens on one port per fake
+proxy: the scraper's HTTP client sends absolute-form requests to those, which are answered directly, so every request
+is attributed to the proxy it went through. Proxies can be given their own extra latency and error rate to imitate a
+bad exit.
+
+    python -m benchmarks.fake_pugview [--port 8800] [--proxies 4] [--total-pages 20] [--latency 0.05] [--throttle 0.02]
+
+`GET /_stats` on the origin returns request counts by status (counted when answered), by proxy, and the number of
+hung and truncated requests and the body bytes sent; `POST /_stats/reset` clears them.
+
+Page bodies are gzip compressed for clients that accept it (brotli compressed, if they accept that and the `brotli`
+package is installed), as PubChem does, unless started with `--no-compression`.
+
+Pages carry an ETag and `If-None-Match` is answered with a 304 when it matches. To exercise refreshes,
+`POST /_revise?heading=...&from_page=N&total_pages=M` changes the content of a heading's pages from page N on (both
+optional, as is a new page count).
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import socket
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+
+from aiohttp import web
+
+from benchmarks.synthetic import PageSpec, make_page
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PATH_PREFIX = "/rest/pug_view/annotations/heading"
+
+
+@dataclass
+class ProxyProfile:
+    """Faults added on top of the server's own for requests through one proxy"""
+
+    extra_latency: float = 0.0
+    error_rate: float = 0.0
+
+
+@dataclass
+class FakeServerConfig:
+    total_pages: int = 20
+    annotations_per_page: int = 50
+    latency: float = 0.05
+    """Mean response latency in seconds; each request waits an exponentially distributed time around it"""
+    throttle_rate: float = 0.0
+    """Fraction of requests answered with 429 and a Retry-After of `retry_after` seconds"""
+    retry_after: float = 1.0
+    error_rate: float = 0.0
+    """Fraction of requests answered with a 500, 502 or 503"""
+    timeout_rate: float = 0.0
+    """Fraction of requests that hang for `hang_seconds` before answering, to trip the client timeout"""
+    hang_seconds: float = 60.0
+    truncate_rate: float = 0.0
+    """Fraction of 200s whose body is cut in half, as a misbehaving proxy might answer"""
+    compression: bool = True
+    proxies: list[ProxyProfile] = field(default_factory=list)
+    seed: int = 0
+
+
+@lru_cache(maxsize=1024)
+def page_body(heading: str, page: int, num_annotations: int, total_pages: int, revision: int = 0) -> bytes:
+    seed = zlib.crc32(f"{heading}\0{page}\0{revision}".encode())
+    return make_page(PageSpec(num_annotations=num_annotations), seed, heading, page, total_pages)
+
+
+def etag(body: bytes) -> str:
+    return f'"{zlib.crc32(body):08x}"'
+
+
+class FakePugView:
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.statuses: Counter[int] = Counter()
+        self.by_proxy: Counter[str] = Counter()
+        self.hung = 0
+        self.truncated = 0
+        self.bytes_sent = 0
+        self.runners: list[web.AppRunner] = []
+        self.proxy_ports: dict[str, tuple[int, ProxyProfile]] = {}
+        # Per heading: the first page of every revision so far, and a page count overriding the configured one
+        self.revisions: dict[str, list[int]] = {}
+        self.total_pages: dict[str, int] = {}
+
+    def _profile(self, request: web.Request) -> tuple[str, ProxyProfile]:
+        port = request.transport.get_extra_info("sockname")[1] if request.transport else None
+        for name, (proxy_port, profile) in self.proxy_ports.items():
+            if proxy_port == port:
+                return name, profile
+        return "direct", ProxyProfile()
+
+    async def handle_page(self, request: web.Request) -> web.StreamResponse:
+        config = self.config
+        proxy, profile = self._profile(request)
+        self.by_proxy[proxy] += 1
+
+        await asyncio.sleep(self.rng.expovariate(1 / config.latency) if config.latency > 0 else 0)
+        await asyncio.sleep(profile.extra_latency)
+
+        heading = request.match_info["heading"]  # Already decoded, and may contain "/"
+        total_pages = self.total_pages.get(heading, config.total_pages)
+        page = int(request.query.get("page", "1"))
+        throttle_until = config.timeout_rate + config.throttle_rate
+        roll = self.rng.random()
+        if roll < config.timeout_rate:
+            self.hung += 1
+            await asyncio.sleep(config.hang_seconds)
+
+        if config.timeout_rate <= roll < throttle_until:
+            status = 429
+        elif throttle_until <= roll < throttle_until + config.error_rate + profile.error_rate:
+            status = self.rng.choice([500, 502, 503])
+        elif not 1 <= page <= total_pages:
+            status = 404
+        else:
+            status = 200
+
+        if status == 200:
+            revision = sum(first <= page for first in self.revisions.get(heading, []))
+            body = page_body(heading, page, config.annotations_per_page, total_pages, revision)
+            if request.headers.get("If-None-Match") == etag(body):
+                status = 304
+        self.statuses[status] += 1
+
+        if status == 429:
+            return web.Response(status=429, headers={"Retry-After": str(config.retry_after)})
+        if status == 404:
+            return web.json_response({"Fault": {"Code": "PUGVIEW.NotFound"}}, status=404)
+        if status == 304:
+            return web.Response(status=304, headers={"ETag": etag(body)})
+        if status != 200:
+            return web.Response(status=status)
+        headers = {"ETag": etag(body)}
+        encoding = self._encoding(request) if config.compression else None
+        if encoding == "br":
+            body = brotli.compress(body, quality=5)  # type: ignore
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=6)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        if self.rng.random() < config.truncate_rate:
+            self.truncated += 1
+            body = body[: len(body) // 2]
+        self.bytes_sent += len(body)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    @staticmethod
+    def _encoding(request: web.Request) -> str | None:
+        accepted = {token.split(";")[0].strip() for token in request.headers.get("Accept-Encoding", "").split(",")}
+        if "br" in accepted and brotli is not None:
+            return "br"
+        return "gzip" if "gzip" in accepted else None
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "statuses": dict(self.statuses),
+                "by_proxy": dict(self.by_proxy),
+                "hung": self.hung,
+                "truncated": self.truncated,
+                "bytes": self.bytes_sent,
+            }
+        )
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.statuses.clear()
+        self.by_proxy.clear()
+        self.hung = 0
+        self.truncated = 0
+        self.bytes_sent = 0
+        return web.json_response({})
+
+    async def handle_revise(self, request: web.Request) -> web.Response:
+        heading = request.query["heading"]
+        self.revisions.setdefault(heading, []).append(int(request.query.get("from_page", "1")))
+        if "total_pages" in request.query:
+            self.total_pages[heading] = int(request.query["total_pages"])
+        return web.json_response({})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(PATH_PREFIX + "/{heading:.+}/JSON", self.handle_page)
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_post("/_stats/reset", self.handle_reset)
+        app.router.add_post("/_revise", self.handle_revise)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[str, list[str]]:
+        """Starts the origin and one listener per proxy; returns the base URL and the proxy URLs"""
+        ports = [port or free_port(host)] + [free_port(host) for _ in self.config.proxies]
+        self.proxy_ports = {f"proxy-{i}": (p, prof) for i, (p, prof) in enumerate(zip(ports[1:], self.config.proxies))}
+
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        for p in ports:
+            await web.TCPSite(runner, host, p).start()
+        self.runners.append(runner)
+
+        return f"http://{host}:{ports[0]}{PATH_PREFIX}", [f"http://{host}:{p}" for p in ports[1:]]
+
+    async def stop(self) -> None:
+        for runner in self.runners:
+            await runner.cleanup()
+        self.runners.clear()
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--proxies", type=int, default=4, help="Number of fake proxy endpoints")
+    parser.add_argument("--bad-proxies", type=int, default=0, help="How many of them are slow and flaky")
+    parser.add_argument("--bad-proxy-latency", type=float, default=0.5)
+    parser.add_argument("--bad-proxy-errors", type=float, default=0.3)
+    parser.add_argument("--total-pages", type=int, default=20)
+    parser.add_argument("--annotations", type=int, default=50, help="Annotations per page")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean latency in seconds")
+    parser.add_argument("--throttle", type=float, default=0.0, help="429 rate")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--errors", type=float, default=0.0, help="5xx rate")
+    parser.add_argument("--timeouts", type=float, default=0.0, help="Hung request rate")
+    parser.add_argument("--truncate", type=float, default=0.0, help="Rate of 200s with a truncated body")
+    parser.add_argument("--no-compression", action="store_true", help="Never compress page bodies")
+    parser.add_argument("--hang", type=float, default=60.0, help="How long hung requests hang, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeServerConfig:
+    bad = ProxyProfile(extra_latency=args.bad_proxy_latency, error_rate=args.bad_proxy_errors)
+    return FakeServerConfig(
+        total_pages=args.total_pages,
+        annotations_per_page=args.annotations,
+        latency=args.latency,
+        throttle_rate=args.throttle,
+        retry_after=args.retry_after,
+        error_rate=args.errors,
+        timeout_rate=args.timeouts,
+        hang_seconds=args.hang,
+        truncate_rate=args.truncate,
+        compression=not args.no_compression,
+        proxies=[bad if i < args.bad_proxies else ProxyProfile() for i in range(args.proxies)],
+        seed=args.seed,
+    )
+
+
+async def serve(config: FakeServerConfig, host: str, port: int) -> None:
+    server = FakePugView(config)
+    base_url, proxies = await server.start(host, port)
+    print(json.dumps({"base_url": base_url, "proxies": proxies, "config": asdict(config)}), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(serve(config_from_args(args), args.host, args.port))
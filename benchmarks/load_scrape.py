@@ -0,0 +1,184 @@
+"""
+End-to-end load test of `scrape.main` against the local PUG-View stand-in in `benchmarks.fake_pugview`.
+
+Starts the fake server in a subprocess, then runs a full scrape into a scratch directory once per `--concurrency`
+value (in `--partitions` processes sharing the work through leases) and reports pages/s, per-attempt latency
+percentiles (measured around each `fetch_page` call, so including the rate limiter wait), retries and the
+server-side status counts. Options the harness doesn't know are passed on to the server, e.g.
+
+    python -m benchmarks.load_scrape --concurrency 5 10 30 -- --total-pages 50 --throttle 0.02 --errors 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import replace
+from pathlib import Path
+
+import scrape
+from benchmarks.fake_pugview import PATH_PREFIX, free_port
+from pubchem_scraper.manifest import DONE, Manifest
+from pubchem_scraper.scheduler import POLICIES, SMALLEST_FIRST
+from scrape import ScrapeConfig
+
+
+def start_server(server_argv: list[str]) -> tuple[subprocess.Popen, str, list[str]]:
+    argv = [sys.executable, "-m", "benchmarks.fake_pugview", "--port", str(free_port()), *server_argv]
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()  # type: ignore
+    if not line:
+        raise RuntimeError(f"Fake server exited with {process.wait()}")
+    info = json.loads(line)
+    return process, info["base_url"], info["proxies"]
+
+
+def server_request(base_url: str, path: str, method: str = "GET") -> dict:
+    origin = base_url.removesuffix(PATH_PREFIX)
+    with urllib.request.urlopen(urllib.request.Request(origin + path, method=method)) as response:
+        return json.load(response)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_scrape(headings: list[str], proxies: list[str], config: ScrapeConfig, attempts_path: Path) -> None:
+    """Runs `scrape.main` with every `fetch_page` call timed, saving (seconds, ok) pairs to `attempts_path`"""
+    attempts: list[tuple[float, bool]] = []
+    fetch_page = scrape.fetch_page
+
+    async def timed_fetch_page(*a, **kw) -> scrape.Fetched:
+        start = time.perf_counter()
+        ok = False
+        try:
+            fetched = await fetch_page(*a, **kw)
+            ok = True
+            return fetched
+        finally:
+            attempts.append((time.perf_counter() - start, ok))
+
+    scrape.fetch_page = timed_fetch_page
+    try:
+        asyncio.run(scrape.main(headings, proxies, config))
+    finally:
+        scrape.fetch_page = fetch_page
+        attempts_path.write_text(json.dumps(attempts))
+
+
+def run_once(
+    headings: list[str], proxies: list[str], base_url: str, max_concurrent: int, args: argparse.Namespace
+) -> dict:
+    server_request(base_url, "/_stats/reset", "POST")
+    with tempfile.TemporaryDirectory() as tmp:
+        config = ScrapeConfig(
+            max_concurrent=max_concurrent,
+            global_rate=args.global_rate or None,
+            per_proxy_rate=args.per_proxy_rate or None,
+            max_attempts=args.max_attempts,
+            manifest_path=Path(tmp) / "manifest.sqlite",
+            store_root=Path(tmp) / "shards",
+            base_url=base_url,
+            limit_per_host=args.limit_per_host,
+            request_timeout=args.request_timeout,
+            metrics_path=Path(tmp) / "metrics.json",
+            changes_path=Path(tmp) / "changes.jsonl",
+            policy=args.policy,
+            per_proxy_concurrency=args.per_proxy_concurrency or None,
+        )
+
+        start = time.perf_counter()
+        if args.partitions > 1:
+            # Separate processes, as `python scrape.py --partitions N` would start them
+            context = multiprocessing.get_context("spawn")
+            processes = [
+                context.Process(
+                    target=run_scrape,
+                    args=(
+                        headings,
+                        proxies,
+                        replace(config, partition=(i, args.partitions)),
+                        Path(tmp) / f"attempts-{i}.json",
+                    ),
+                )
+                for i in range(args.partitions)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        else:
+            run_scrape(headings, proxies, config, Path(tmp) / "attempts-0.json")
+        elapsed = time.perf_counter() - start
+
+        attempts = [tuple(a) for path in Path(tmp).glob("attempts-*.json") for a in json.loads(path.read_text())]
+        manifest = Manifest(Path(tmp) / "manifest.sqlite")
+        counts = manifest.counts()
+        manifest.close()
+
+    latencies = [t for t, _ in attempts]
+    pages = counts.get(DONE, 0)
+    return {
+        "max_concurrent": max_concurrent,
+        "partitions": args.partitions,
+        "seconds": elapsed,
+        "pages": pages,
+        "pages_per_s": pages / elapsed,
+        "attempts": len(attempts),
+        "retries": len(attempts) - pages,
+        "failed_attempts": sum(not ok for _, ok in attempts),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": max(latencies, default=float("nan")),
+        "manifest": counts,
+        "server": server_request(base_url, "/_stats"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[5, 10, 30], help="max_concurrent values")
+    parser.add_argument("--headings", type=int, default=4)
+    parser.add_argument("--global-rate", type=float, default=0, help="Requests/s overall (0: unlimited)")
+    parser.add_argument("--per-proxy-rate", type=float, default=0, help="Requests/s per proxy (0: unlimited)")
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--policy", choices=POLICIES, default=SMALLEST_FIRST)
+    parser.add_argument("--partitions", type=int, default=1, help="Scraper processes sharing the work through leases")
+    parser.add_argument("--per-proxy-concurrency", type=int, default=0, help="Requests in flight per proxy (0: no cap)")
+    parser.add_argument("--limit-per-host", type=int, default=30)
+    parser.add_argument("--request-timeout", type=float, default=5.0)
+    parser.add_argument("--out", type=Path, default=None, help="Write results to this JSON file")
+    args, server_argv = parser.parse_known_args()
+    server_argv = [a for a in server_argv if a != "--"]
+
+    process, base_url, proxies = start_server(server_argv)
+    try:
+        headings = [f"Benchmark Heading {i}" for i in range(args.headings)]
+        results = []
+        for max_concurrent in args.concurrency:
+            result = run_once(headings, proxies, base_url, max_concurrent, args)
+            results.append(result)
+            tail = "/".join(f"{result[f'latency_{q}'] * 1e3:.0f}" for q in ("p50", "p95", "p99"))
+            server = result["server"]
+            print(
+                f"max_concurrent={max_concurrent:<4d} {result['pages']:6d} pages {result['seconds']:7.1f} s"
+                f" {result['pages_per_s']:8.1f} pages/s  latency p50/p95/p99 {tail} ms"
+                f"  {result['retries']} retries  server {server['statuses']}, {server['hung']} hung"
+                f", {server['truncated']} truncated, {server['bytes'] / 1e3 / max(result['pages'], 1):.1f} kB sent/page"
+            )
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.out:
+        meta = {"server_argv": server_argv, "args": vars(args) | {"out": str(args.out)}}
+        args.out.write_text(json.dumps(meta | {"results": results}, indent=2))
@@ -0,0 +1,171 @@
+"""
+CPU benchmark suite for the hot paths from page JSON to training examples.
+
+Every stage runs on the same seeded synthetic page and reports its throughput (best of `--repeat` runs) and its peak
+Python heap usage (a separate, traced run). Results are written to JSON; pass an earlier result as `--baseline` to
+compare, and the suite exits non-zero if any stage got slower than `--max-regression` allows.
+
+    python -m benchmarks.suite [--annotations 2000] [--markup-density 0.05] [--out bench.json] [--baseline old.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.synthetic import PageSpec, make_names, make_page
+from pubchem_scraper.augment import augment
+from pubchem_scraper.datatypes import Example, Molecule, merge_molecules
+from pubchem_scraper.markup_columns import ColumnarString
+from pubchem_scraper.pubchem_schema import Record, SimpleRecord, SimpleStringWithMarkup, StringWithMarkup
+from pubchem_scraper.training import create_ft_example
+
+PROMPT = "Identify all small molecules in the paragraph."
+
+
+def run_stages(spec: PageSpec, seed: int) -> dict[str, tuple[Callable[[], object], int]]:
+    """Stage name -> (zero-argument callable, number of items it processes), each stage fed by the one before"""
+    body = make_page(spec, seed)
+    record = Record.model_validate_json(body)
+    simple = SimpleRecord.from_record(record)
+
+    values = [s.Value for a in simple.Annotations for s in a.Data if isinstance(s.Value, StringWithMarkup)]
+    strings = []
+    for value in values:
+        try:
+            strings.append(SimpleStringWithMarkup.from_string_with_markup(value))
+        except ValueError:
+            continue
+    marked = [s for s in strings if s.markup]
+    names = make_names(spec.num_cids)
+    molecules = [[Molecule(name=m.hit) for m in s.markup] for s in marked]
+
+    # Stages return their output, so the peak memory includes holding on to it as the next stage would
+
+    def from_string_with_markup() -> list[SimpleStringWithMarkup]:
+        out = []
+        for value in values:
+            try:
+                out.append(SimpleStringWithMarkup.from_string_with_markup(value))
+            except ValueError:
+                continue
+        return out
+
+    def columnar_from_string_with_markup() -> list[ColumnarString]:
+        out = []
+        for value in values:
+            try:
+                out.append(ColumnarString.from_string_with_markup(value))
+            except ValueError:
+                continue
+        return out
+
+    def augment_all() -> list[SimpleStringWithMarkup]:
+        return [augment(string, n=2, rng=random.Random(seed + i), names=names) for i, string in enumerate(marked)]
+
+    def merge_all() -> list[list[Molecule]]:
+        # Fresh molecules, since each one caches its normalized identifiers
+        return [merge_molecules([Molecule(name=m.name) for m in mols]) for mols in molecules]
+
+    def create_all() -> list[Example]:
+        return [create_ft_example(string, PROMPT) for string in marked]
+
+    return {
+        "Record.model_validate_json": (lambda: Record.model_validate_json(body), len(record.Annotations.Annotation)),
+        "SimpleRecord.from_record": (lambda: SimpleRecord.from_record(record), len(record.Annotations.Annotation)),
+        "SimpleStringWithMarkup.from_string_with_markup": (from_string_with_markup, len(values)),
+        "ColumnarString.from_string_with_markup": (columnar_from_string_with_markup, len(values)),
+        "augment": (augment_all, len(marked)),
+        "merge_molecules": (merge_all, len(molecules)),
+        "create_ft_example": (create_all, len(marked)),
+    }
+
+
+def measure(fn: Callable[[], object], items: int, repeat: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"items": items, "seconds": best, "items_per_s": items / best, "peak_mb": peak / 1e6}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Prints per-stage speedups against `baseline` and returns the stages that regressed too far"""
+    regressed = []
+    for name, stage in results["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        old = baseline["stages"][name]
+        ratio = stage["items_per_s"] / old["items_per_s"]
+        print(f"{name:48s} {ratio:5.2f}x throughput  {stage['peak_mb'] - old['peak_mb']:+8.2f} MB peak")
+        if ratio < 1 - max_regression:
+            regressed.append(name)
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotations", type=int, default=2000)
+    parser.add_argument("--markup-density", type=float, default=0.05)
+    parser.add_argument("--min-words", type=int, default=20)
+    parser.add_argument("--max-words", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", default=None, help="Run only these stages")
+    parser.add_argument("--out", type=Path, default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Tolerated fractional throughput loss")
+    args = parser.parse_args()
+
+    spec = PageSpec(
+        num_annotations=args.annotations,
+        markup_density=args.markup_density,
+        min_words=args.min_words,
+        max_words=args.max_words,
+    )
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "spec": asdict(spec),
+        },
+        "stages": {},
+    }
+
+    for name, (fn, items) in run_stages(spec, args.seed).items():
+        if args.only and name not in args.only:
+            continue
+        stage = results["stages"][name] = measure(fn, items, args.repeat)
+        print(
+            f"{name:48s} {stage['items']:7d} items {stage['seconds'] * 1e3:9.1f} ms"
+            f" {stage['items_per_s']:12.0f} items/s {stage['peak_mb']:8.2f} MB peak"
+        )
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["meta"]["spec"] != results["meta"]["spec"]:
+            print("warning: baseline was run with a different page spec", file=sys.stderr)
+        regressed = compare(results, baseline, args.max_regression)
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}", file=sys.stderr)
+            sys.exit(1)
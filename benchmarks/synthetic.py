@@ -0,0 +1,96 @@
+"""
+Seeded generator for synthetic PUG-View annotation pages and the names augmentation draws from.
+
+Pages mix text sections, with compound markup at a configurable density, with the numeric, binary and table values
+the simplified models throw away, so every stage of the pipeline sees realistic input.
+"""
+
+import json
+import random
+from dataclasses import dataclass
+
+from pubchem_scraper.names import NUM_SYNONYMS, NameTable
+
+WORDS = ["the", "of", "compound", "was", "and", "in", "with", "acid", "solution", "to", "is", "by", "mg", "water"]
+STEMS = ["α-tocopherol", "β-carotene", "acetyl", "benzyl", "chloro", "methyl", "pyridin", "γ-butyro", "ethyl", "oxo"]
+
+
+@dataclass
+class PageSpec:
+    num_annotations: int = 2000
+    markup_density: float = 0.05
+    """Fraction of words that are a compound mention"""
+    min_words: int = 20
+    max_words: int = 80
+    text_fraction: float = 0.6
+    """Fraction of sections holding text rather than numbers, binary data or a table reference"""
+    num_cids: int = 10_000
+    """Size of the pool mentions and linked records draw their CIDs from"""
+
+
+def compound_name(cid: int) -> str:
+    """Mentions are spelled like real names, with greek letters and varying case, and always contain the CID"""
+    rng = random.Random(cid)
+    name = f"{rng.choice(STEMS)}-{cid}"
+    return name.upper() if rng.random() < 0.2 else name
+
+
+def make_page(
+    spec: PageSpec, seed: int = 0, heading: str = "Benchmark Heading", page: int = 1, total_pages: int = 1
+) -> bytes:
+    rng = random.Random(seed)
+    toc = {"type": "Compound", "#TOCHeading": heading}
+
+    def text_item() -> dict:
+        parts, markup, offset = [], [], 0
+        for _ in range(rng.randint(spec.min_words, spec.max_words)):
+            if rng.random() < spec.markup_density:
+                cid = rng.randint(1, spec.num_cids)
+                word = compound_name(cid)
+                markup.append(
+                    {"Start": offset, "Length": len(word), "URL": f"https://pubchem.ncbi.nlm.nih.gov/compound/{cid}"}
+                    | {"Type": "PubChem Internal Link", "Extra": f"CID-{cid}"}
+                )
+            else:
+                word = rng.choice(WORDS)
+            parts.append(word)
+            offset += len(word) + 1
+        string = " ".join(parts)
+        return {"String": string, "Markup": markup} if markup else {"String": string}
+
+    def section() -> dict:
+        kind = rng.random()
+        rest = (1 - spec.text_fraction) / 3
+        if kind < spec.text_fraction:
+            value = {"StringWithMarkup": [text_item() for _ in range(rng.randint(1, 3))]}
+        elif kind < spec.text_fraction + rest:
+            value = {"Number": [rng.uniform(0, 500) for _ in range(rng.randint(1, 4))], "Unit": "°C"}
+        elif kind < spec.text_fraction + 2 * rest:
+            value = {"Binary": ["x" * rng.randint(100, 2000)], "MimeType": "image/png"}
+        else:
+            value = {"ExternalTableName": "bioactivity"}
+        return {"TOCHeading": toc, "Description": "desc", "Reference": ["ref"], "Value": value}
+
+    annotations = [
+        {
+            "SourceName": rng.choice(["HSDB", "ChEBI", "DrugBank"]),
+            "SourceID": str(anid),
+            "Name": f"Record {anid}",
+            "URL": "https://example.org",
+            "ANID": anid,
+            "LinkedRecords": {"CID": [rng.randint(1, spec.num_cids) for _ in range(rng.randint(1, 3))]},
+            "Data": [section() for _ in range(rng.randint(1, 6))],
+        }
+        for anid in range(spec.num_annotations)
+    ]
+    return json.dumps({"Annotations": {"Annotation": annotations, "Page": page, "TotalPages": total_pages}}).encode()
+
+
+def make_names(num_cids: int) -> NameTable:
+    """An IUPAC name and `NUM_SYNONYMS` synonyms for every CID in the pool, derived from the CID alone"""
+    return NameTable(
+        {
+            cid: [f"iupac-{compound_name(cid)}", *(f"{compound_name(cid)} syn{i}" for i in range(NUM_SYNONYMS))]
+            for cid in range(1, num_cids + 1)
+        }
+    )
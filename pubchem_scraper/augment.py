@@ -1,22 +1,30 @@
+import hashlib
 import random
+from collections.abc import Iterable, Iterator
+from itertools import islice
 
-import polars as pl
+from pubchem_scraper.names import NameLookup, NameTable, get_name_index
+from pubchem_scraper.pubchem_schema import SimpleStringWithMarkup
+from pubchem_scraper.rewrite import MarkupRewriter
 
-from pubchem_scraper.pubchem_schema import SimpleMarkup, SimpleStringWithMarkup
 
-new_name = pl.read_parquet("./data/iupac_subset.parquet")
-syns = pl.read_parquet("./data/synonyms_subset.parquet")
+def get_iupac(cid: int, names: NameLookup | None = None) -> str:
+    return (names or get_name_index()).iupac(cid)
 
 
-def get_iupac(cid: int) -> str:
-    return new_name.filter(pl.col("CID").eq(cid)).select("IUPAC").rows()[0][0]
+def get_rand_synonym(cid: int, rng: random.Random | None = None, names: NameLookup | None = None) -> str:
+    return (rng or random).choice((names or get_name_index()).synonyms(cid))
 
 
-def get_rand_synonym(cid: int) -> str:
-    return syns.filter(pl.col("CID").eq(cid)).select("SYN").head(5).sample(1).rows()[0][0]
+def get_rand_name(cid: int, rng: random.Random | None = None, names: NameLookup | None = None) -> str:
+    """Either a random synonym or the IUPAC name, with equal probability"""
+    if (rng or random).random() < 0.5:
+        return get_rand_synonym(cid, rng, names)
+    return get_iupac(cid, names)
 
 
-def get_random_alias() -> str:
+def get_random_alias(rng: random.Random | None = None) -> str:
+    rng = rng or random  # type: ignore
     chemical_terms = [
         "compound",
         "ligand",
@@ -37,33 +45,27 @@ def get_random_alias() -> str:
         "inhibitor",
     ]
     # Choose 1 or 2 terms
-    num_terms = random.randint(1, 2)
-    terms = random.sample(chemical_terms, num_terms)
+    num_terms = rng.randint(1, 2)
+    terms = rng.sample(chemical_terms, num_terms)
 
-    idx = get_random_id()
+    idx = get_random_id(rng)
 
     return f"{' '.join(terms)} {idx}"
 
 
-def get_random_id() -> str:
-    number = random.randint(1, 99)
-    letter = random.choice("abcdefghijklmnopqrstuvwxyz") if random.random() < 0.5 else ""
+def get_random_id(rng: random.Random | None = None) -> str:
+    rng = rng or random  # type: ignore
+    number = rng.randint(1, 99)
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz") if rng.random() < 0.5 else ""
     return f"{number}{letter}"
 
 
-def replace_text(text: str, start: int, length: int, new_text: str) -> tuple[str, int]:
-    """Replace text at given position and return the new text and position shift."""
-    return (text[:start] + new_text + text[start + length :], len(new_text) - length)
-
-
-def shift_markup(markup: list[SimpleMarkup], from_pos: int, shift: int) -> None:
-    """Shift all markup positions after from_pos by shift amount."""
-    for m in markup:
-        if m.start > from_pos:
-            m.start += shift
-
-
-def augment(string: SimpleStringWithMarkup, n: int = 1) -> SimpleStringWithMarkup:
+def augment(
+    string: SimpleStringWithMarkup,
+    n: int = 1,
+    rng: random.Random | None = None,
+    names: NameLookup | None = None,
+) -> SimpleStringWithMarkup:
     """
     Augment chemical compound mentions in text using various transformation strategies n times.
 
@@ -77,115 +79,113 @@ def augment(string: SimpleStringWithMarkup, n: int = 1) -> SimpleStringWithMarku
     Args:
         string: SimpleStringWithMarkup containing text and compound annotations
         n: Number of augmentations to perform (default=1)
+        rng: Random generator to draw from (default: the global `random` state)
+        names: Name lookup for synonyms and IUPAC names (default: the process-wide NameIndex)
 
     Returns:
         SimpleStringWithMarkup with augmented text and updated markup
 
     Raises:
         ValueError: If markup positions are invalid
+        KeyError: If no replacement name is known for a CID that was picked
     """
     if not string.markup:
         return string
 
-    result = string.model_copy(deep=True)
+    rng = rng or random  # type: ignore
+    names = names or get_name_index()
 
     choices = []
     while len(choices) < n:
-        choice = random.choice(range(1, 6))
+        choice = rng.choice(range(1, 6))
         if choice == 5 and 5 in choices:
             continue
 
         choices.append(choice)
 
+    # Edits are planned one by one and applied in a single pass at the end, except a lone edit, which is applied as is
+    rewriter = MarkupRewriter(string, sequential=n == 1)
     for case in choices:
-        if not result.markup:
-            break
-
-        markup_to_change = random.choice(result.markup)
+        markup_to_change = rng.choice(rewriter.order)
 
         match case:
             case 1:
-                result, text = _aug_type_1(markup_to_change, result)
+                _aug_type_1(markup_to_change, rewriter, rng, names)
             case 2:
-                result, text = _aug_type_2(markup_to_change, result)
+                _aug_type_2(markup_to_change, rewriter, rng, names)
             case 3:
-                result, text = _aug_type_3(markup_to_change, result)
+                _aug_type_3(markup_to_change, rewriter, rng, names)
             case 4:
-                result, text = _aug_type_4(markup_to_change, result)
+                _aug_type_4(markup_to_change, rewriter, rng, names)
             case 5:
-                result, text = _aug_type_5(markup_to_change, result)
+                _aug_type_5(markup_to_change, rewriter, rng, names)
             case _:
                 raise ValueError("Invalid case number")
 
-        result.string = text
-        result.markup = sorted(result.markup, key=lambda x: x.start)
-
-    return result
+        rewriter.settle()
 
+    return rewriter.apply()
 
-def _aug_type_1(markup_to_change: SimpleMarkup, result: SimpleStringWithMarkup) -> tuple[SimpleStringWithMarkup, str]:
-    new_text = random.choice([get_rand_synonym(markup_to_change.cid), get_iupac(markup_to_change.cid)])
-    text, shift = replace_text(result.string, markup_to_change.start, markup_to_change.length, new_text)
-    markup_to_change.hit = new_text
-    markup_to_change.length = len(new_text)
-    shift_markup(result.markup, markup_to_change.start, shift)
 
-    return result, text
+def _aug_type_1(markup_to_change: int, rewriter: MarkupRewriter, rng: random.Random, names: NameLookup) -> None:
+    new_text = get_rand_name(rewriter.cids[markup_to_change], rng, names)
+    rewriter.replace(markup_to_change, new_text)
 
 
-def _aug_type_2(markup_to_change: SimpleMarkup, result: SimpleStringWithMarkup) -> tuple[SimpleStringWithMarkup, str]:
-    new_synonym = get_rand_synonym(markup_to_change.cid)
-    new_string = f"{markup_to_change.hit} ({new_synonym})"
-    text, shift = replace_text(result.string, markup_to_change.start, markup_to_change.length, new_string)
-    markup_to_change.hit = new_string
-    markup_to_change.length = len(new_string)
-    shift_markup(result.markup, markup_to_change.start, shift)
+def _aug_type_2(markup_to_change: int, rewriter: MarkupRewriter, rng: random.Random, names: NameLookup) -> None:
+    new_synonym = get_rand_synonym(rewriter.cids[markup_to_change], rng, names)
+    rewriter.replace(markup_to_change, f"{rewriter.hits[markup_to_change]} ({new_synonym})")
 
-    return result, text
 
+def _aug_type_3(markup_to_change: int, rewriter: MarkupRewriter, rng: random.Random, names: NameLookup) -> None:
+    alias = rng.choice([get_random_alias(rng), get_random_id(rng)])
+    rewriter.replace(markup_to_change, alias)
 
-def _aug_type_3(markup_to_change: SimpleMarkup, result: SimpleStringWithMarkup) -> tuple[SimpleStringWithMarkup, str]:
-    alias = random.choice([get_random_alias(), get_random_id()])
-    text, shift = replace_text(result.string, markup_to_change.start, markup_to_change.length, alias)
-    markup_to_change.hit = alias
-    markup_to_change.length = len(alias)
-    shift_markup(result.markup, markup_to_change.start, shift)
 
-    return result, text
+def _aug_type_4(markup_to_change: int, rewriter: MarkupRewriter, rng: random.Random, names: NameLookup) -> None:
+    new_name = get_rand_name(rewriter.cids[markup_to_change], rng, names)
+    alias = rng.choice([get_random_alias(rng), get_random_id(rng)])
+    rewriter.replace(markup_to_change, f"{new_name} ({alias})")
 
 
-def _aug_type_4(markup_to_change: SimpleMarkup, result: SimpleStringWithMarkup) -> tuple[SimpleStringWithMarkup, str]:
-    new_name = random.choice([get_rand_synonym(markup_to_change.cid), get_iupac(markup_to_change.cid)])
-    alias = random.choice([get_random_alias(), get_random_id()])
-    new_text = f"{new_name} ({alias})"
+def _aug_type_5(markup_to_change: int, rewriter: MarkupRewriter, rng: random.Random, names: NameLookup) -> None:
+    first_cid = rewriter.cids[rewriter.first()]
+    if not first_cid:
+        return
 
-    text, shift = replace_text(result.string, markup_to_change.start, markup_to_change.length, new_text)
-    markup_to_change.hit = new_text
-    markup_to_change.length = len(new_text)
-    shift_markup(result.markup, markup_to_change.start, shift)
+    new_name = get_iupac(first_cid, names)
+    alias = rng.choice([get_random_alias(rng), get_random_id(rng)])
+    rewriter.prepend(f"{new_name} ({alias})", first_cid)
 
-    return result, text
 
+def element_seed(seed: int, string: SimpleStringWithMarkup) -> int:
+    """Per-element seed derived from the content, so an element's augmentation never depends on its neighbours"""
+    digest = hashlib.blake2b(f"{seed}\0{string.string}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
 
-def _aug_type_5(markup_to_change: SimpleMarkup, result: SimpleStringWithMarkup) -> tuple[SimpleStringWithMarkup, str]:
-    first_markup = min(result.markup, key=lambda x: x.start)
-    if not first_markup.cid:
-        return result, result.string
 
-    new_name = get_iupac(first_markup.cid)
-    alias = random.choice([get_random_alias(), get_random_id()])
-    prefix = f"{new_name} ({alias}): "
-
-    new_markup = SimpleMarkup(
-        start=0,
-        length=len(prefix) - 2,
-        cid=first_markup.cid,
-        hit=f"{new_name} ({alias})",
-    )
-
-    text = prefix + result.string
-    shift_markup(result.markup, -1, len(prefix))
-
-    result.markup.append(new_markup)
-
-    return result, text
+def augment_batch(
+    strings: Iterable[SimpleStringWithMarkup],
+    n: int = 1,
+    seed: int = 0,
+    batch_size: int = 4096,
+    names: NameLookup | None = None,
+) -> Iterator[SimpleStringWithMarkup]:
+    """
+    Augments a stream of strings, resolving names for a whole batch at once.
+
+    For every batch of `batch_size` strings, all CIDs in their markup are resolved with a single join against the
+    Parquet tables before any edits are made. That join scans both tables, so callers that augment many small batches
+    should pass `names` instead (e.g. the memory-mapped NameIndex), which is then used for every batch. Each string
+    gets its own generator seeded from `seed` and its text, so the output is the same whatever the batch size. Strings
+    that cannot be augmented, because a CID has no replacement names or the markup is malformed, are passed through
+    unchanged.
+    """
+    iterator = iter(strings)
+    while batch := list(islice(iterator, batch_size)):
+        batch_names = names or NameTable.from_parquet({m.cid for string in batch for m in string.markup})
+        for string in batch:
+            try:
+                yield augment(string, n=n, rng=random.Random(element_seed(seed, string)), names=batch_names)
+            except Exception:
+                yield string
@@ -0,0 +1,295 @@
+"""
+Inverted index from CIDs to the corpus rows that mention them, for pulling every element about a set of compounds
+out of the corpus without reading the rest of it.
+
+A posting points at a row (one SimpleElement, i.e. one section string) of a block file of the Parquet corpus written
+by `pubchem_scraper.corpus`, and carries the page, the ANID and the offset of the markup in the string (-1 for a CID
+that only appears in the annotation's LinkedRecords). The index is a list of immutable segments of three flat files
+each, which are memory-mapped for queries:
+
+- `{segment}.cids`: the distinct CIDs, sorted (int64)
+- `{segment}.offsets`: where each CID's postings start in the postings file, plus the end (int64)
+- `{segment}.postings`: fixed-size posting records, grouped by CID
+
+`update` indexes only the corpus blocks that are new or were rewritten since the last update, into a new segment.
+Postings of blocks that were rewritten or deleted are skipped by queries and dropped when `compact` merges all segments
+into one, which `update` does once there are more than `max_segments`.
+
+    python -m pubchem_scraper.cid_index                     # update the index
+    python -m pubchem_scraper.cid_index --query 2244 3672   # print the elements mentioning these CIDs
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import unquote
+
+import polars as pl
+
+from pubchem_scraper.corpus import elements_from_frame
+from pubchem_scraper.pubchem_schema import SimpleElement
+
+STATE_FILE = "index.json"
+
+# block id, row, page, markup start (-1 for LinkedRecords), ANID
+POSTING = struct.Struct("<iiiiq")
+
+_INDEXED_COLUMNS = ["markup_cid", "markup_start", "records", "anid", "page"]
+
+
+class Posting(NamedTuple):
+    cid: int
+    block: str
+    """Path of the block file, relative to the corpus"""
+    row: int
+    page: int
+    start: int
+    anid: int
+
+    @property
+    def heading(self) -> str:
+        return unquote(Path(self.block).parent.name)
+
+
+class Segment:
+    def __init__(self, prefix: Path):
+        self._maps: list[mmap.mmap] = []
+        self.cids = self._map(prefix.with_suffix(".cids")).cast("q")
+        self.offsets = self._map(prefix.with_suffix(".offsets")).cast("q")
+        self.postings = self._map(prefix.with_suffix(".postings"))
+
+    def _map(self, path: Path) -> memoryview:
+        with open(path, "rb") as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(m)
+        return memoryview(m)
+
+    def lookup(self, cid: int) -> Iterator[tuple[int, int, int, int, int]]:
+        i = bisect_left(self.cids, cid)
+        if i < len(self.cids) and self.cids[i] == cid:
+            start, end = self.offsets[i] * POSTING.size, self.offsets[i + 1] * POSTING.size
+            yield from POSTING.iter_unpack(self.postings[start:end])
+
+    def items(self) -> Iterator[tuple[int, tuple[int, int, int, int, int]]]:
+        """Every (cid, posting) in CID order"""
+        for i, cid in enumerate(self.cids):
+            start, end = self.offsets[i] * POSTING.size, self.offsets[i + 1] * POSTING.size
+            for posting in POSTING.iter_unpack(self.postings[start:end]):
+                yield cid, posting
+
+    def close(self) -> None:
+        for view in (self.cids, self.offsets, self.postings):
+            view.release()
+        for m in self._maps:
+            m.close()
+
+
+def write_segment(prefix: Path, items: Iterable[tuple[int, tuple]]) -> int:
+    """Writes (cid, posting) pairs, which must be sorted by CID, as a segment; returns the number of postings"""
+    cids = array("q")
+    offsets = array("q")
+    count = 0
+    buffer = bytearray()
+    with open(prefix.with_suffix(".postings"), "wb") as f:
+        for cid, posting in items:
+            if not cids or cids[-1] != cid:
+                cids.append(cid)
+                offsets.append(count)
+            buffer += POSTING.pack(*posting)
+            count += 1
+            if len(buffer) >= 1 << 20:
+                f.write(buffer)
+                buffer.clear()
+        f.write(buffer)
+    offsets.append(count)
+
+    with open(prefix.with_suffix(".cids"), "wb") as f:
+        cids.tofile(f)
+    with open(prefix.with_suffix(".offsets"), "wb") as f:
+        offsets.tofile(f)
+    return count
+
+
+def remove_segment(prefix: Path) -> None:
+    for suffix in (".cids", ".offsets", ".postings"):
+        prefix.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def block_postings(path: Path, block_id: int) -> Iterator[tuple[int, tuple[int, int, int, int, int]]]:
+    columns = pl.read_parquet(path, columns=_INDEXED_COLUMNS)
+    for row, (cids, starts, records, anid, page) in enumerate(columns.iter_rows()):
+        for cid, start in zip(cids, starts):
+            yield cid, (block_id, row, page, start, anid)
+        for cid in records or ():
+            yield cid, (block_id, row, page, -1, anid)
+
+
+def _load_state(index_dir: Path) -> dict:
+    path = index_dir / STATE_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"segments": [], "next_segment": 0, "blocks": {}, "next_block": 0}
+
+
+def _save_state(index_dir: Path, state: dict) -> None:
+    tmp = index_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, index_dir / STATE_FILE)
+
+
+def _new_segment(state: dict) -> str:
+    state["next_segment"] += 1
+    return f"segment-{state['next_segment']:05d}"
+
+
+def update(
+    corpus_dir: str | Path = "./data/corpus",
+    index_dir: str | Path = "./data/cid_index",
+    max_segments: int = 8,
+    segment_postings: int = 4_000_000,
+) -> dict[str, int]:
+    """
+    Brings the index up to date with the corpus, reading only block files that changed since the last update.
+
+    Blocks are recognised as changed by their modification time and size, which the corpus build's write-and-rename
+    always changes. At most `segment_postings` postings are held in memory before they are written out as a segment.
+    """
+    corpus_dir, index_dir = Path(corpus_dir), Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    state = _load_state(index_dir)
+    blocks = state["blocks"]
+
+    current = {str(path.relative_to(corpus_dir)): path.stat() for path in sorted(corpus_dir.glob("*/*.parquet"))}
+    removed = [block for block in blocks if block not in current]
+    for block in removed:
+        del blocks[block]
+
+    changed = [
+        block
+        for block, stat in current.items()
+        if block not in blocks or (blocks[block]["mtime_ns"], blocks[block]["size"]) != (stat.st_mtime_ns, stat.st_size)
+    ]
+
+    batch: list[tuple[int, tuple]] = []
+    postings = 0
+
+    def flush() -> None:
+        nonlocal postings
+        if not batch:
+            return
+        batch.sort(key=lambda item: item[0])
+        name = _new_segment(state)
+        postings += write_segment(index_dir / name, batch)
+        state["segments"].append(name)
+        batch.clear()
+
+    for block in changed:
+        block_id = state["next_block"]
+        state["next_block"] += 1
+        stat = current[block]
+        blocks[block] = {"id": block_id, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        batch.extend(block_postings(corpus_dir / block, block_id))
+        if len(batch) >= segment_postings:
+            flush()
+    flush()
+
+    state["corpus"] = str(corpus_dir)
+    _save_state(index_dir, state)
+    if len(state["segments"]) > max_segments:
+        compact(index_dir)
+
+    return {"blocks": len(changed), "removed": len(removed), "postings": postings}
+
+
+def compact(index_dir: str | Path = "./data/cid_index") -> int:
+    """Merges all segments into one, dropping postings of blocks no longer in the corpus; returns the posting count"""
+    index_dir = Path(index_dir)
+    state = _load_state(index_dir)
+    live = {block["id"] for block in state["blocks"].values()}
+    old = state["segments"]
+    segments = [Segment(index_dir / name) for name in old]
+    try:
+        merged = heapq.merge(*(segment.items() for segment in segments), key=lambda item: item[0])
+        name = _new_segment(state)
+        postings = write_segment(index_dir / name, ((cid, p) for cid, p in merged if p[0] in live))
+    finally:
+        for segment in segments:
+            segment.close()
+
+    state["segments"] = [name] if postings else []
+    _save_state(index_dir, state)
+    for segment_name in [*old, *([] if postings else [name])]:
+        remove_segment(index_dir / segment_name)
+    return postings
+
+
+class CidIndex:
+    """Read-only view of an index, as of when it was opened"""
+
+    def __init__(self, index_dir: str | Path = "./data/cid_index", corpus_dir: str | Path | None = None):
+        index_dir = Path(index_dir)
+        state = _load_state(index_dir)
+        self.corpus_dir = Path(corpus_dir or state.get("corpus", "./data/corpus"))
+        self.blocks = {block["id"]: path for path, block in state["blocks"].items()}
+        self.segments = [Segment(index_dir / name) for name in state["segments"]]
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self) -> "CidIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def postings(self, cids: Iterable[int]) -> Iterator[Posting]:
+        for cid in sorted(set(cids)):
+            for segment in self.segments:
+                for block_id, *rest in segment.lookup(cid):
+                    if block_id in self.blocks:  # Otherwise the block was rewritten or deleted since
+                        yield Posting(cid, self.blocks[block_id], *rest)
+
+    def headings(self, cids: Iterable[int]) -> set[str]:
+        return {posting.heading for posting in self.postings(cids)}
+
+    def elements(self, cids: Iterable[int]) -> Iterator[SimpleElement]:
+        """Every element mentioning any of `cids`, once each, reading only the block files that hold them"""
+        rows: defaultdict[str, set[int]] = defaultdict(set)
+        for posting in self.postings(cids):
+            rows[posting.block].add(posting.row)
+
+        for block in sorted(rows):
+            frame = pl.read_parquet(self.corpus_dir / block)
+            yield from elements_from_frame(frame[sorted(rows[block])])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the CID index of the corpus")
+    parser.add_argument("--corpus", default="./data/corpus")
+    parser.add_argument("--index", default="./data/cid_index")
+    parser.add_argument("--query", type=int, nargs="+", default=None, help="Print the elements mentioning these CIDs")
+    parser.add_argument("--headings", action="store_true", help="With --query, print only the headings")
+    parser.add_argument("--compact", action="store_true", help="Merge all segments after updating")
+    args = parser.parse_args()
+
+    if args.query is None:
+        print(update(args.corpus, args.index))
+        if args.compact:
+            print(f"Compacted into {compact(args.index)} postings")
+    else:
+        with CidIndex(args.index, args.corpus) as index:
+            if args.headings:
+                print("\n".join(sorted(index.headings(args.query))))
+            else:
+                for element in index.elements(args.query):
+                    print(element.model_dump_json())
@@ -0,0 +1,157 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import quote
+
+import polars as pl
+
+from pubchem_scraper.fastdecode import iter_columnar_elements
+from pubchem_scraper.markup_columns import MarkupColumns
+from pubchem_scraper.pubchem_schema import SimpleElement
+from pubchem_scraper.refresh import read_reports
+from pubchem_scraper.storage import ShardStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = {
+    "string": pl.String,
+    "markup_start": pl.List(pl.Int32),
+    "markup_length": pl.List(pl.Int32),
+    "markup_cid": pl.List(pl.Int64),
+    "label": pl.String,
+    "records": pl.List(pl.Int64),
+    "anid": pl.Int64,
+    "page": pl.Int32,
+}
+
+STATE_FILE = "_state.json"
+
+
+def elements_from_frame(frame: pl.DataFrame) -> Iterator[SimpleElement]:
+    """The rows of a corpus frame as elements, converting the markup columns in bulk rather than row by row"""
+    markup = MarkupColumns.from_frame(frame)
+    for string, label, records in zip(markup, frame["label"].to_list(), frame["records"].to_list()):
+        yield SimpleElement(string=string.to_simple(), label=label, records=records)
+
+
+def iter_elements(dataset: str | Path) -> Iterator[SimpleElement]:
+    """Streams the elements of a corpus dataset one Parquet file at a time"""
+    for path in sorted(Path(dataset).glob("*/*.parquet")):
+        yield from elements_from_frame(pl.read_parquet(path))
+
+
+_store: ShardStore | None = None
+
+
+def _build_block(store_root: str, out_dir: str, heading: str, block: int, block_size: int) -> int:
+    global _store
+    if _store is None:
+        _store = ShardStore(store_root)
+
+    opath = Path(out_dir) / quote(heading, safe=" ()-,") / f"block-{block:05d}.parquet"
+    first, last = block * block_size, (block + 1) * block_size
+    pages = [page for page in _store.pages(heading) if first <= page < last]
+    if not pages:
+        opath.unlink(missing_ok=True)  # Every page of the block was removed by a refresh
+        return 0
+
+    markup = MarkupColumns()
+    columns: dict[str, list] = {"label": [], "records": [], "anid": [], "page": []}
+    for page in pages:
+        try:
+            elements = list(iter_columnar_elements(_store.get(heading, page)))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.error(f"Skipping {heading} page {page}: {e}")
+            continue
+
+        for anid, label, records, string in elements:
+            markup.append(string)
+            columns["label"].append(label)
+            columns["records"].append(records)
+            columns["anid"].append(anid)
+            columns["page"].append(page)
+
+    opath.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = opath.with_suffix(".tmp")
+    pl.DataFrame(markup.columns() | columns, schema=SCHEMA).write_parquet(tmp_path)
+    tmp_path.replace(opath)
+
+    return len(markup)
+
+
+def build(
+    store_root: str | Path = "./data/shards",
+    out_dir: str | Path = "./data/corpus",
+    block_size: int = 100,
+    max_workers: int | None = None,
+    full: bool = False,
+    changes_path: str | Path | None = "./data/changes.jsonl",
+) -> int:
+    """
+    Turns stored pages into a Parquet dataset of SimpleElement rows, one directory per heading.
+
+    Pages are grouped into blocks of `block_size` consecutive pages per heading, and each block is written as one
+    Parquet file. Only blocks containing pages stored since the last build (tracked by the store's `seq` watermark)
+    are rebuilt, so re-running after a scrape touches just the new data. Returns the number of rows written.
+
+    Pages a refresh removed are not in the store any more; the blocks that held them are found through the scraper's
+    change reports at `changes_path` (see `pubchem_scraper.refresh`), of which only those not seen yet are read.
+    """
+    out_dir = Path(out_dir)
+    state_path = out_dir / STATE_FILE
+    state = {}
+    if state_path.exists() and not full:
+        state = json.loads(state_path.read_text())
+    since_seq = state.get("last_seq", 0)
+    reports_read = state.get("reports_read", 0)
+
+    with ShardStore(store_root) as store:
+        last_seq = store.last_seq()
+        dirty: dict[str, set[int]] = defaultdict(set)
+        for _, heading, page in store.iter_entries(since_seq):
+            dirty[heading].add(page // block_size)
+
+    reports = read_reports(changes_path, reports_read) if changes_path else []
+    for report in reports:
+        for heading, changes in report["headings"].items():
+            dirty[heading].update(page // block_size for page in changes["removed"])
+
+    jobs = [(heading, block) for heading, blocks in dirty.items() for block in sorted(blocks)]
+    logger.info(f"Rebuilding {len(jobs)} blocks from {len(dirty)} headings")
+
+    rows = 0
+    # Forked workers would inherit polars' thread pool from a parent that already used it, and deadlock in it
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=context) as pool:
+        futures = [
+            pool.submit(_build_block, str(store_root), str(out_dir), heading, block, block_size)
+            for heading, block in jobs
+        ]
+        for future in as_completed(futures):
+            rows += future.result()
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path.write_text(json.dumps({"last_seq": last_seq, "reports_read": reports_read + len(reports)}))
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build the SimpleElement Parquet corpus from scraped pages")
+    parser.add_argument("--store", default="./data/shards")
+    parser.add_argument("--out", default="./data/corpus")
+    parser.add_argument("--block-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and rebuild every block")
+    parser.add_argument("--changes", default="./data/changes.jsonl", help="Change reports written by the scraper")
+    args = parser.parse_args()
+
+    rows = build(args.store, args.out, args.block_size, args.workers, args.full, args.changes)
+    logger.info(f"Wrote {rows} elements to {args.out}")
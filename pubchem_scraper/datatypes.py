@@ -1,11 +1,17 @@
 import re
-import unicodedata
 from collections import defaultdict
 from collections.abc import Sequence
 from functools import cached_property
 
 from pydantic import BaseModel
 
+from pubchem_scraper.normalize import (  # noqa: F401  The helpers used to live here
+    map_unicode_characters,
+    normalize_many,
+    replace_greek_letters,
+    replace_greek_single_letter,
+)
+
 
 class Molecule(BaseModel):
     name: str
@@ -13,23 +19,7 @@ class Molecule(BaseModel):
 
     @cached_property
     def _all_ids(self):
-        all_ids = [self.name, *self.alternatives]
-        all_ids = [map_unicode_characters(id_) for id_ in all_ids]
-
-        all_ids = set(all_ids)
-
-        # Include upper and lowercase
-        all_ids.update([id_.lower() for id_ in all_ids])
-
-        # Now, go through everything and add strings with greek letters replaced with english words and single letters
-        updates = []
-        for id_ in all_ids:
-            updates.append(replace_greek_letters(id_))
-            updates.append(replace_greek_single_letter(id_))
-
-        all_ids.update(updates)
-
-        return all_ids
+        return set().union(*normalize_many([self.name, *self.alternatives]))
 
 
 class Paragraph(BaseModel):
@@ -45,30 +35,48 @@ class Example(BaseModel):
 
 
 class UnionFind:
+    """Union-find over hashable items with union by rank and iterative path compression"""
+
     def __init__(self):
         self.parent = {}
+        self.rank = {}
 
     def find(self, x):
-        if x != self.parent.setdefault(x, x):
-            self.parent[x] = self.find(self.parent[x])
-        return self.parent[x]
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+
+        while x != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
 
     def union(self, x, y):
-        self.parent[self.find(x)] = self.find(y)
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return
+
+        rank_x, rank_y = self.rank.get(x, 0), self.rank.get(y, 0)
+        if rank_x < rank_y:
+            x, y = y, x
+        self.parent[y] = x
+        if rank_x == rank_y:
+            self.rank[x] = rank_x + 1
 
 
 def merge_molecules(molecules: list[Molecule]) -> list[Molecule]:
+    """
+    Merges molecules that share any normalized identifier, transitively.
+
+    Each molecule is unioned with the first molecule that produced each of its identifiers, so the work is linear in
+    the total number of identifiers.
+    """
     uf = UnionFind()
-    id_to_indices = defaultdict(set)
+    first_with_id = {}
 
     for idx, mol in enumerate(molecules):
+        uf.find(idx)
         for id_ in mol._all_ids:
-            id_to_indices[id_].add(idx)
-
-    for indices in id_to_indices.values():
-        indices = list(indices)
-        for i in range(len(indices) - 1):
-            uf.union(indices[i], indices[i + 1])
+            uf.union(first_with_id.setdefault(id_, idx), idx)
 
     groups = defaultdict(list)
     for idx in range(len(molecules)):
@@ -77,25 +85,28 @@ def merge_molecules(molecules: list[Molecule]) -> list[Molecule]:
 
     merged_molecules = []
     for group in groups.values():
-        names = set()
-        alternatives = set()
+        # Insertion-ordered, so ties between equally long names don't depend on string hashing
+        names = {}
+        alternatives = {}
         for idx in group:
             mol = molecules[idx]
-            names.add(mol.name)
-            alternatives.update(mol.alternatives)
-        all_ids = names.union(alternatives)
-        all_ids = dedup_prefer_capital(all_ids)  # type: ignore
-        chosen_name = sorted(all_ids, key=len, reverse=True)[0]
+            names[mol.name] = None
+            alternatives.update(dict.fromkeys(mol.alternatives))
+        all_ids = names | alternatives
+        all_ids = dedup_prefer_capital(list(all_ids))
+        chosen_name = max(all_ids, key=len)
         all_ids.remove(chosen_name)
 
         # Sort chosen names alphabetically, with capital letters first
         all_ids = sorted(all_ids, key=lambda x: (x.lower(), x))
 
         selected = []
+        selected_lower = set()
         for id_ in all_ids:
-            if id_.lower() in [s.lower() for s in selected]:
+            if id_.lower() in selected_lower:
                 continue
             selected.append(id_)
+            selected_lower.add(id_.lower())
 
         merged_molecules.append(Molecule(name=chosen_name, alternatives=selected))
 
@@ -103,76 +114,9 @@ def merge_molecules(molecules: list[Molecule]) -> list[Molecule]:
 
 
 MATCH_RE = re.compile(r"^(.*?)\s\((.*?)\)\s*$")
-GREEK_RE = re.compile(r"[\u0370-\u03FF]")
 ALIAS_RE = re.compile(r".*?(\d{1,2}[a-zA-Z]?)$")
 
 
-def replace_greek_letters(text: str) -> str:
-    def greek_to_english(match: re.Match) -> str:
-        char = match.group(0)
-        try:
-            name = unicodedata.name(char).lower()
-            name = name.replace("greek small letter ", "").replace("greek capital letter ", "")
-            return name
-        except ValueError:
-            return char
-
-    return GREEK_RE.sub(greek_to_english, text)
-
-
-def replace_greek_single_letter(text: str) -> str:
-    # fmt: off
-    greek_to_english = {
-        'α': 'a', 'Α': 'A',  # alpha
-        'β': 'b', 'Β': 'B',  # beta
-        'γ': 'g', 'Γ': 'G',  # gamma
-        'δ': 'd', 'Δ': 'D',  # delta
-        'ε': 'e', 'Ε': 'E',  # epsilon
-        'ζ': 'z', 'Ζ': 'Z',  # zeta
-        'η': 'h', 'Η': 'H',  # eta
-        'θ': 'th', 'Θ': 'Th',  # theta
-        'ι': 'i', 'Ι': 'I',  # iota
-        'κ': 'k', 'Κ': 'K',  # kappa
-        'λ': 'l', 'Λ': 'L',  # lambda
-        'μ': 'm', 'Μ': 'M',  # mu
-        'ν': 'n', 'Ν': 'N',  # nu
-        'ξ': 'x', 'Ξ': 'X',  # xi
-        'ο': 'o', 'Ο': 'O',  # omicron
-        'π': 'p', 'Π': 'P',  # pi
-        'ρ': 'r', 'Ρ': 'R',  # rho
-        'σ': 's', 'Σ': 'S',  # sigma
-        'ς': 's',            # final sigma
-        'τ': 't', 'Τ': 'T',  # tau
-        'υ': 'y', 'Υ': 'Y',  # upsilon
-        'φ': 'ph', 'Φ': 'Ph',  # phi
-        'χ': 'ch', 'Χ': 'Ch',  # chi
-        'ψ': 'ps', 'Ψ': 'Ps',  # psi
-        'ω': 'o', 'Ω': 'O'   # omega
-    }
-    # fmt: on
-
-    for greek, english in greek_to_english.items():
-        text = text.replace(greek, english)
-
-    return text
-
-
-def map_unicode_characters(text):
-    translation_table = {
-        ord("’"): "'",
-        ord("“"): '"',
-        ord("”"): '"',
-        ord("—"): "-",
-        ord("–"): "-",
-        ord("…"): "...",
-        ord("‘"): "'",
-        ord("´"): "'",
-        ord("″"): '"',
-    }
-
-    return text.translate(translation_table)
-
-
 def dedup_prefer_capital(strings: Sequence[str]) -> list[str]:
     seen = {}
     for s in strings:
@@ -0,0 +1,177 @@
+"""
+Fast paths from raw PUG-View page JSON to the simplified models.
+
+`SimpleRecord.from_record(Record.model_validate_json(body))` validates the whole annotation tree, including every
+BinaryData, NumericValue and table reference, only to throw most of it away again.
+
+All of them walk the `json.loads` output and pick the `Value` union member by key. `decode_simple_record` drops
+every non-text section and annotation field on the way, and validates what is left as a SimpleRecord in one call.
+`simple_string_from_items` and `iter_simple_elements` skip the intermediate models altogether and parse each markup's
+CID once. Their columnar
+counterparts, `columnar_string_from_items` and `iter_columnar_elements`, do not build SimpleMarkup models either (see
+`pubchem_scraper.markup_columns`).
+
+They produce exactly what the validating path produces for pages that follow the PUG-View schema. Markup with a
+malformed CID reference counts as unusable, like markup without one, instead of failing the whole page.
+"""
+
+import json
+from array import array
+from collections.abc import Iterator
+
+from pubchem_scraper.markup_columns import ColumnarString
+from pubchem_scraper.pubchem_schema import (
+    SimpleElement,
+    SimpleMarkup,
+    SimpleRecord,
+    SimpleStringWithMarkup,
+    _Markup,
+)
+
+
+def _markup_cid(extra: str | None) -> int | None:
+    """The CID of a markup's `Extra` ("CID-1234"), None if it is not a well-formed CID reference"""
+    if extra is None or not extra.startswith("CID-"):
+        return None
+    number = extra.split("-")[1]
+    return int(number) if number.isdigit() else None
+
+
+def _page_label(annotations: list[dict]) -> str | None:
+    """The TOC heading of a page, from its first section (None if it has none)"""
+    for annotation in annotations:
+        if annotation["Data"]:
+            return annotation["Data"][0]["TOCHeading"]["#TOCHeading"]
+    return None
+
+
+def _annotation_sections(annotation: dict) -> Iterator[dict]:
+    """Only sections holding a StringWithMarkup value survive simplification"""
+    for section in annotation["Data"]:
+        if "StringWithMarkup" in section["Value"]:
+            yield section
+
+
+def _linked_cids(annotation: dict) -> list[int] | None:
+    linked = annotation.get("LinkedRecords")
+    return linked.get("CID") if linked is not None else None
+
+
+def decode_simple_record(body: bytes | str) -> SimpleRecord:
+    """Equivalent to `SimpleRecord.from_record(Record.model_validate_json(body))`"""
+    annotations = json.loads(body)["Annotations"]["Annotation"]
+    label = _page_label(annotations)
+    if label is None:
+        raise ValueError("Page has no sections")
+
+    simple_annotations = []
+    for annotation in annotations:
+        sections = [
+            {
+                "Value": section["Value"],
+                "Name": section.get("Name"),
+                "Description": section.get("Description"),
+                "Reference": section.get("Reference"),
+            }
+            for section in _annotation_sections(annotation)
+        ]
+        if not sections:
+            continue
+
+        simple_annotations.append(
+            {
+                "SourceName": annotation["SourceName"],
+                "Data": sections,
+                "ANID": annotation["ANID"],
+                "LinkedRecords": _linked_cids(annotation),
+            }
+        )
+
+    # Only what simplification keeps is validated, in a single call
+    return SimpleRecord.model_validate({"TOCHeading": label, "Annotations": simple_annotations})
+
+
+def simple_string_from_items(items: list[dict]) -> SimpleStringWithMarkup:
+    """Equivalent to `SimpleStringWithMarkup.from_string_with_markup` on raw `StringWithMarkup` items"""
+    current_offset = 0
+    markups: list[SimpleMarkup] = []
+
+    for item in items:
+        string = item["String"]
+        for markup in item.get("Markup", ()):
+            start = markup.get("Start")
+            length = markup.get("Length")
+            cid = _markup_cid(markup.get("Extra"))
+            if start is None or length is None or cid is None:
+                raise ValueError(f"Invalid markup: {_Markup.model_validate(markup)}")
+
+            markups.append(
+                SimpleMarkup(start=start + current_offset, length=length, cid=cid, hit=string[start : start + length])
+            )
+
+        current_offset += len(string) + 1
+
+    return SimpleStringWithMarkup(
+        string="\n".join(item["String"] for item in items),
+        markup=markups,
+    )
+
+
+def columnar_string_from_items(items: list[dict]) -> ColumnarString:
+    """`simple_string_from_items` with the markup kept in arrays"""
+    starts, lengths, cids = array("i"), array("i"), array("q")
+    current_offset = 0
+
+    for item in items:
+        for markup in item.get("Markup", ()):
+            start = markup.get("Start")
+            length = markup.get("Length")
+            cid = _markup_cid(markup.get("Extra"))
+            if start is None or length is None or cid is None:
+                raise ValueError(f"Invalid markup: {_Markup.model_validate(markup)}")
+
+            starts.append(start + current_offset)
+            lengths.append(length)
+            cids.append(cid)
+
+        current_offset += len(item["String"]) + 1
+
+    return ColumnarString("\n".join(item["String"] for item in items), starts, lengths, cids)
+
+
+def iter_simple_elements(body: bytes | str) -> Iterator[tuple[int, SimpleElement]]:
+    """
+    Yields (ANID, element) for every text section of a raw page, skipping sections with unusable markup.
+
+    This goes straight from the page JSON to flattened elements without building the intermediate SimpleRecord.
+    """
+    annotations = json.loads(body)["Annotations"]["Annotation"]
+    label = _page_label(annotations)
+    if label is None:
+        return
+
+    for annotation in annotations:
+        records = _linked_cids(annotation)
+        for section in _annotation_sections(annotation):
+            try:
+                string = simple_string_from_items(section["Value"]["StringWithMarkup"])
+            except (ValueError, TypeError):
+                continue
+            yield annotation["ANID"], SimpleElement(string=string, label=label, records=records)
+
+
+def iter_columnar_elements(body: bytes | str) -> Iterator[tuple[int, str, list[int] | None, ColumnarString]]:
+    """`iter_simple_elements` yielding (ANID, label, LinkedRecords CIDs, string) with columnar markup"""
+    annotations = json.loads(body)["Annotations"]["Annotation"]
+    label = _page_label(annotations)
+    if label is None:
+        return
+
+    for annotation in annotations:
+        records = _linked_cids(annotation)
+        for section in _annotation_sections(annotation):
+            try:
+                string = columnar_string_from_items(section["Value"]["StringWithMarkup"])
+            except (ValueError, TypeError):
+                continue
+            yield annotation["ANID"], label, records, string
@@ -0,0 +1,130 @@
+"""
+Work leases for running several scraper processes on one machine against one manifest.
+
+The page space of every heading is cut into chunks of `chunk_size` pages. A process leases a chunk, downloads its
+outstanding pages and marks it finished; the lease is renewed while the process works on it and expires if the process
+dies, after which any other process can take the chunk over. Leases live in the manifest's SQLite file, so the
+processes only need to share that file (and the shard store); SQLite's locking does the rest. Every process must use
+the same `chunk_size`.
+
+The manifest and the store's index run in SQLite's WAL mode, whose shared-memory index does not work over a network
+filesystem, so all processes have to run on the machine that holds the data directory.
+
+`scrape.py --partitions N` starts N such processes. Each one uses only its disjoint share of the proxies
+(`split_proxies`) and an even share of the global request rate, and writes its metrics to a file and port of its own.
+"""
+
+import os
+import socket
+import time
+from collections.abc import Iterable
+
+from pubchem_scraper.manifest import DONE, Manifest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    heading TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (heading, chunk)
+);
+CREATE INDEX IF NOT EXISTS leases_open ON leases (finished, chunk, heading);
+"""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def split_proxies(proxies: list[str], index: int, count: int) -> list[str]:
+    """The disjoint share of `proxies` for partition `index` of `count`"""
+    share = proxies[index::count]
+    if not share:
+        raise ValueError(f"Partition {index} of {count} gets none of the {len(proxies)} proxies")
+    return share
+
+
+class Leases:
+    """
+    Chunk leases of one process, stored alongside `manifest`.
+
+    Chunks are handed out lowest chunk number first, so the first pages of all headings (including the discovery of
+    unknown page counts) are done before the later pages of any heading.
+    """
+
+    def __init__(
+        self, manifest: Manifest, owner: str | None = None, chunk_size: int = 100, lease_seconds: float = 120.0
+    ):
+        self.manifest = manifest
+        self.conn = manifest.conn
+        self.owner = owner or default_owner()
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.conn.executescript(_SCHEMA)
+
+    def add_headings(self, headings: Iterable[str]) -> None:
+        """Creates the chunks of `headings`; a heading whose page count is unknown gets just the chunk of page 1"""
+        rows = []
+        for heading in headings:
+            total_pages = self.manifest.total_pages(heading) or 1
+            rows.extend((heading, chunk) for chunk in range((total_pages - 1) // self.chunk_size + 1))
+
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT OR IGNORE INTO leases (heading, chunk) VALUES (?, ?)", rows)
+
+    def reopen(self, heading: str | None = None) -> int:
+        """Makes finished chunks that have outstanding pages again (failed or stale ones) available; returns how many"""
+        return self.conn.execute(
+            "UPDATE leases SET finished = 0 WHERE finished = 1 AND (? IS NULL OR heading = ?) AND EXISTS ("
+            "SELECT 1 FROM pages WHERE pages.heading = leases.heading AND pages.status != ? "
+            "AND pages.page BETWEEN leases.chunk * ? + 1 AND (leases.chunk + 1) * ?)",
+            (heading, heading, DONE, self.chunk_size, self.chunk_size),
+        ).rowcount
+
+    def acquire(self) -> tuple[str, int] | None:
+        """Leases the next unfinished chunk nobody holds, or whose lease expired; returns (heading, chunk)"""
+        now = time.time()
+        return self.conn.execute(
+            "UPDATE leases SET owner = ?, expires = ? WHERE (heading, chunk) = ("
+            "SELECT heading, chunk FROM leases WHERE finished = 0 AND expires < ? ORDER BY chunk, heading LIMIT 1"
+            ") RETURNING heading, chunk",
+            (self.owner, now + self.lease_seconds, now),
+        ).fetchone()
+
+    def renew(self) -> int:
+        """Extends every lease this process holds; returns how many it holds"""
+        return self.conn.execute(
+            "UPDATE leases SET expires = ? WHERE owner = ? AND finished = 0",
+            (time.time() + self.lease_seconds, self.owner),
+        ).rowcount
+
+    def finish(self, heading: str, chunk: int) -> bool:
+        """
+        Marks a chunk this process holds finished. Returns False if the lease expired and another process took the
+        chunk over, which then stays theirs to finish.
+        """
+        return (
+            self.conn.execute(
+                "UPDATE leases SET finished = 1, owner = NULL, expires = 0 "
+                "WHERE heading = ? AND chunk = ? AND owner = ?",
+                (heading, chunk, self.owner),
+            ).rowcount
+            > 0
+        )
+
+    def unfinished(self) -> bool:
+        """Whether any chunk is still to be done, whether leased by someone or not"""
+        return self.conn.execute("SELECT 1 FROM leases WHERE finished = 0 LIMIT 1").fetchone() is not None
+
+    def outstanding_pages(self, heading: str, chunk: int) -> list[int]:
+        if self.manifest.total_pages(heading) is None:
+            return [1] if chunk == 0 else []
+        first = chunk * self.chunk_size + 1
+        rows = self.conn.execute(
+            "SELECT page FROM pages WHERE heading = ? AND page BETWEEN ? AND ? AND status != ? ORDER BY page",
+            (heading, first, first + self.chunk_size - 1, DONE),
+        )
+        return [page for (page,) in rows]
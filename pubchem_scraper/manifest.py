@@ -0,0 +1,265 @@
+import asyncio
+import json
+import random
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pubchem_scraper.storage import ShardStore
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS headings (
+    heading TEXT PRIMARY KEY,
+    total_pages INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    heading TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    PRIMARY KEY (heading, page)
+);
+CREATE INDEX IF NOT EXISTS pages_status ON pages (status, heading, page);
+"""
+
+# Columns added after the first release, with their types, for upgrading older manifests in place
+_ADDED_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT", "content_hash": "TEXT"}
+
+
+class Manifest:
+    """
+    Durable record of scrape progress, one row per (heading, page).
+
+    Pages move from pending to done, or to failed once every retry in a run has been used up. Failed pages are
+    picked up again by the next run, so a restart only ever schedules outstanding work.
+
+    Done pages also keep the validators of the response they were stored from (ETag, Last-Modified and a content
+    hash), so a refresh can ask for them conditionally and tell whether they changed.
+    """
+
+    def __init__(self, path: str | Path = "./data/manifest.sqlite"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.is_new = not self.path.exists()
+
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(_SCHEMA)
+
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        for name, kind in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE pages ADD COLUMN {name} {kind}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def total_pages(self, heading: str) -> int | None:
+        row = self.conn.execute("SELECT total_pages FROM headings WHERE heading = ?", (heading,)).fetchone()
+        return row[0] if row else None
+
+    def set_total_pages(self, heading: str, total_pages: int) -> list[int]:
+        """
+        Register the page count of a heading and add any pages not yet known as pending.
+
+        Pages beyond a shrunken page count are dropped; their numbers are returned.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")  # Take the write lock up front, other processes may share the file
+            removed = [
+                page
+                for (page,) in self.conn.execute(
+                    "SELECT page FROM pages WHERE heading = ? AND page > ? ORDER BY page", (heading, total_pages)
+                )
+            ]
+            self.conn.execute("DELETE FROM pages WHERE heading = ? AND page > ?", (heading, total_pages))
+            self.conn.execute(
+                "INSERT INTO headings (heading, total_pages) VALUES (?, ?) "
+                "ON CONFLICT (heading) DO UPDATE SET total_pages = excluded.total_pages",
+                (heading, total_pages),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO pages (heading, page) VALUES (?, ?)",
+                ((heading, page) for page in range(1, total_pages + 1)),
+            )
+        return removed
+
+    def mark_stale(self, heading: str, first_page: int = 1, last_page: int | None = None) -> int:
+        """Makes done pages from `first_page` to `last_page` pending again, so they are re-checked; returns how many"""
+        return self.conn.execute(
+            "UPDATE pages SET status = ? WHERE heading = ? AND page >= ? AND (? IS NULL OR page <= ?) AND status = ?",
+            (PENDING, heading, first_page, last_page, last_page, DONE),
+        ).rowcount
+
+    def validators(self, heading: str, page: int) -> tuple[str | None, str | None, str | None]:
+        """(etag, last_modified, content_hash) of the stored copy of a page, None where unknown"""
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash FROM pages WHERE heading = ? AND page = ?", (heading, page)
+        ).fetchone()
+        return row or (None, None, None)
+
+    def iter_outstanding(self, batch_size: int = 1000, heading: str | None = None) -> Iterator[tuple[str, int]]:
+        """
+        Streams every (heading, page) that is not done yet, optionally only those of one heading.
+
+        Rows are fetched in keyset-paginated batches rather than through one long-lived cursor, so memory stays
+        bounded and status updates made while iterating cannot disturb the scan.
+        """
+        if heading is None:
+            query = "SELECT heading, page FROM pages WHERE status != ? AND (heading, page) > (?, ?) "
+            last = ("", 0)
+        else:
+            query = "SELECT heading, page FROM pages WHERE status != ? AND heading = ? AND page > ? "
+            last = (heading, 0)
+
+        while True:
+            rows = self.conn.execute(query + "ORDER BY heading, page LIMIT ?", (DONE, *last, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1]
+
+    def outstanding_counts(self) -> dict[str, int]:
+        """Number of pages not done yet, per heading with a known page count"""
+        return dict(
+            self.conn.execute("SELECT heading, COUNT(*) FROM pages WHERE status != ? GROUP BY heading", (DONE,))
+        )
+
+    def mark_done(
+        self,
+        heading: str,
+        page: int,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        content_hash: str | None = None,
+    ) -> None:
+        """Validators that are None keep their previous value, e.g. when a 304 leaves out the ETag"""
+        self.conn.execute(
+            "INSERT INTO pages (heading, page, status, updated_at, etag, last_modified, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (heading, page) DO UPDATE SET status = excluded.status, last_error = NULL, "
+            "updated_at = excluded.updated_at, etag = COALESCE(excluded.etag, etag), "
+            "last_modified = COALESCE(excluded.last_modified, last_modified), "
+            "content_hash = COALESCE(excluded.content_hash, content_hash)",
+            (heading, page, DONE, time.time(), etag, last_modified, content_hash),
+        )
+
+    def mark_failed(self, heading: str, page: int, error: str) -> None:
+        self._set_status(heading, page, FAILED, error)
+
+    def record_attempt(self, heading: str, page: int, error: str) -> None:
+        """Count a failed attempt without giving up on the page."""
+        self._set_status(heading, page, PENDING, error)
+
+    def _set_status(self, heading: str, page: int, status: str, error: str) -> None:
+        """Records a failed attempt, leaving the page in `status`"""
+        self.conn.execute(
+            "INSERT INTO pages (heading, page, status, attempts, last_error, updated_at) VALUES (?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT (heading, page) DO UPDATE SET status = excluded.status, "
+            "attempts = attempts + 1, last_error = excluded.last_error, updated_at = excluded.updated_at",
+            (heading, page, status, error, time.time()),
+        )
+
+    def counts(self) -> dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall())
+
+    def counts_in_thread(self) -> dict[str, int]:
+        """
+        `counts` through a read-only connection of its own, so that it can run off the event loop (the query scans
+        every page row); in WAL mode it neither blocks nor waits for writers
+        """
+        conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall())
+        finally:
+            conn.close()
+
+    def import_store(self, store: ShardStore, headings: Iterable[str]) -> None:
+        """One-off import of pages that were already in the store before the manifest existed."""
+        for heading in headings:
+            if not store.contains(heading, 1):
+                continue
+
+            try:
+                total_pages = json.loads(store.get(heading, 1))["Annotations"]["TotalPages"]
+            except (json.JSONDecodeError, KeyError):
+                continue
+
+            self.set_total_pages(heading, total_pages)
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "UPDATE pages SET status = ?, updated_at = ? WHERE heading = ? AND page = ?",
+                    ((DONE, time.time(), heading, page) for page in store.pages(heading)),
+                )
+
+
+class ManifestWriter:
+    """
+    Records page outcomes in the manifest from a thread and connection of its own.
+
+    Processes sharing a manifest contend for its write lock, and a write may wait up to the busy timeout for it; off
+    the event loop, that wait holds up only the page being recorded rather than every request in flight. There is a
+    single thread, so a page's updates are applied in the order they were made.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="manifest-writer")
+        self._manifest: Manifest | None = None
+
+    def _run(self, method: str, *args):
+        # The connection is opened in the writer thread, which is the only one that ever uses it
+        if self._manifest is None:
+            self._manifest = Manifest(self.path)
+        return getattr(self._manifest, method)(*args)
+
+    async def _call(self, method: str, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._run, method, *args)
+
+    async def validators(self, heading: str, page: int) -> tuple[str | None, str | None, str | None]:
+        return await self._call("validators", heading, page)
+
+    async def mark_done(
+        self,
+        heading: str,
+        page: int,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        content_hash: str | None = None,
+    ) -> None:
+        await self._call("mark_done", heading, page, etag, last_modified, content_hash)
+
+    async def mark_failed(self, heading: str, page: int, error: str) -> None:
+        await self._call("mark_failed", heading, page, error)
+
+    async def record_attempt(self, heading: str, page: int, error: str) -> None:
+        await self._call("record_attempt", heading, page, error)
+
+    def close(self) -> None:
+        """Waits for pending writes and closes the connection"""
+        self.executor.submit(self._close).result()
+        self.executor.shutdown(wait=True)
+
+    def _close(self) -> None:
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given (1-based) attempt number."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
@@ -0,0 +1,236 @@
+"""
+Columnar markup: the starts, lengths and CIDs of a string's markup in parallel typed arrays instead of a list of
+SimpleMarkup models.
+
+A SimpleMarkup is a pydantic model holding three Python ints and a copy of its hit, and building one validates every
+field; over millions of paragraphs that dominates both memory and the time spent moving markup around. A
+`ColumnarString` keeps the same information in three `array.array`s (16 bytes per markup in total), never stores the
+hits (`hit(i)` slices them out of the string when asked) and shifts offsets in bulk. Page decoding
+(`pubchem_scraper.fastdecode`) and selection produce them, and augmentation builds its output as one.
+
+`MarkupColumns` holds the markup of many strings in the layout Arrow and Parquet use for list columns: one flat array
+per field plus row offsets, so whole corpus blocks move between Parquet and memory without a Python object per markup.
+`ColumnarString.to_simple` and the `markup` view are the adapter to code written against SimpleStringWithMarkup.
+"""
+
+from array import array
+from collections.abc import Iterator, Sequence
+from itertools import accumulate
+from typing import overload
+
+import polars as pl
+
+from pubchem_scraper.pubchem_schema import SimpleMarkup, SimpleStringWithMarkup, StringWithMarkup
+
+
+class MarkupView(Sequence[SimpleMarkup]):
+    """Read-only SimpleMarkup sequence over a ColumnarString, building each model only when it is accessed"""
+
+    def __init__(self, string: "ColumnarString"):
+        self._string = string
+
+    def __len__(self) -> int:
+        return len(self._string)
+
+    @overload
+    def __getitem__(self, i: int) -> SimpleMarkup: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[SimpleMarkup]: ...
+
+    def __getitem__(self, i: int | slice) -> SimpleMarkup | list[SimpleMarkup]:
+        if isinstance(i, slice):
+            return [self._string.simple_markup(j) for j in range(len(self))[i]]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._string.simple_markup(i)
+
+
+class ColumnarString:
+    """
+    A string with its markup as parallel `starts`, `lengths` and `cids` arrays.
+
+    The arrays may be memoryviews into a `MarkupColumns` batch; methods that modify them (`shift`, `prepend`) need
+    owned arrays, which `copy` gives.
+    """
+
+    __slots__ = ("string", "starts", "lengths", "cids")
+
+    def __init__(
+        self,
+        string: str,
+        starts: Sequence[int] = (),
+        lengths: Sequence[int] = (),
+        cids: Sequence[int] = (),
+    ):
+        if not len(starts) == len(lengths) == len(cids):
+            raise ValueError(f"Markup columns differ in length: {len(starts)}, {len(lengths)}, {len(cids)}")
+        self.string = string
+        self.starts = starts if isinstance(starts, array | memoryview) else array("i", starts)
+        self.lengths = lengths if isinstance(lengths, array | memoryview) else array("i", lengths)
+        self.cids = cids if isinstance(cids, array | memoryview) else array("q", cids)
+
+    @classmethod
+    def from_string_with_markup(cls, swm: StringWithMarkup) -> "ColumnarString":
+        """Like `SimpleStringWithMarkup.from_string_with_markup`"""
+        starts, lengths, cids = array("i"), array("i"), array("q")
+        current_offset = 0
+        for item in swm.StringWithMarkup:
+            for markup in item.Markup:
+                if markup.Start is None or markup.Length is None or markup.cid is None:
+                    raise ValueError(f"Invalid markup: {markup}")
+                starts.append(markup.Start + current_offset)
+                lengths.append(markup.Length)
+                cids.append(markup.cid)  # type: ignore
+
+            current_offset += len(item.String) + 1
+
+        return cls("\n".join(item.String for item in swm.StringWithMarkup), starts, lengths, cids)
+
+    @classmethod
+    def from_simple(cls, simple: SimpleStringWithMarkup) -> "ColumnarString":
+        markup = simple.markup
+        return cls(simple.string, [m.start for m in markup], [m.length for m in markup], [m.cid for m in markup])
+
+    def to_simple(self, hits: Sequence[str] | None = None) -> SimpleStringWithMarkup:
+        """As a SimpleStringWithMarkup, with `hits` as the markup's hits instead of the text under each span if given"""
+        if hits is None:
+            hits = self.hits()
+        markup = [
+            SimpleMarkup(start=start, length=length, cid=cid, hit=hit)
+            for start, length, cid, hit in zip(self.starts, self.lengths, self.cids, hits)
+        ]
+        return SimpleStringWithMarkup(string=self.string, markup=markup)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ColumnarString):
+            return NotImplemented
+        return (
+            self.string == other.string
+            and list(self.starts) == list(other.starts)
+            and list(self.lengths) == list(other.lengths)
+            and list(self.cids) == list(other.cids)
+        )
+
+    def __repr__(self) -> str:
+        columns = f"starts={list(self.starts)}, lengths={list(self.lengths)}, cids={list(self.cids)}"
+        return f"ColumnarString({self.string!r}, {columns})"
+
+    @property
+    def markup(self) -> MarkupView:
+        """The markup as SimpleMarkup models, for code written against SimpleStringWithMarkup"""
+        return MarkupView(self)
+
+    def hit(self, i: int) -> str:
+        start = self.starts[i]
+        return self.string[start : start + self.lengths[i]]
+
+    def hits(self) -> list[str]:
+        string = self.string
+        return [string[start : start + length] for start, length in zip(self.starts, self.lengths)]
+
+    def simple_markup(self, i: int) -> SimpleMarkup:
+        # Validating in pydantic-core is cheaper than model_construct's pure-Python path
+        return SimpleMarkup(start=self.starts[i], length=self.lengths[i], cid=self.cids[i], hit=self.hit(i))
+
+    def copy(self) -> "ColumnarString":
+        return ColumnarString(self.string, array("i", self.starts), array("i", self.lengths), array("q", self.cids))
+
+    def shift(self, delta: int, first: int = 0) -> None:
+        """Moves the starts of markup `first` onwards by `delta`, as after inserting text before them"""
+        starts = self.starts
+        for i in range(first, len(starts)):
+            starts[i] += delta
+
+    def prepend(self, text: str, cid: int, separator: str = ": ") -> None:
+        """Puts `text` and `separator` in front of the string, with `text` as a new first markup"""
+        self.shift(len(text) + len(separator))
+        self.string = text + separator + self.string
+        self.starts.insert(0, 0)
+        self.lengths.insert(0, len(text))
+        self.cids.insert(0, cid)
+
+
+class MarkupColumns:
+    """
+    The strings and markup of many rows, with the markup flattened across rows.
+
+    Row `i`'s markup is `starts[offsets[i]:offsets[i + 1]]` (and likewise for lengths and CIDs), which is how Arrow
+    and Parquet store the `markup_*` list columns of the corpus (see `pubchem_scraper.corpus.SCHEMA`).
+    """
+
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self.offsets = array("q", [0])
+        self.starts = array("i")
+        self.lengths = array("i")
+        self.cids = array("q")
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def append(self, string: ColumnarString) -> None:
+        self.strings.append(string.string)
+        self.starts.extend(string.starts)
+        self.lengths.extend(string.lengths)
+        self.cids.extend(string.cids)
+        self.offsets.append(len(self.starts))
+
+    def __getitem__(self, i: int) -> ColumnarString:
+        """Row `i`, whose markup arrays are views into this batch rather than copies"""
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return ColumnarString(
+            self.strings[i],
+            memoryview(self.starts)[a:b],
+            memoryview(self.lengths)[a:b],
+            memoryview(self.cids)[a:b],
+        )
+
+    def __iter__(self) -> Iterator[ColumnarString]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def shift(self, deltas: Sequence[int]) -> None:
+        """Moves all markup of row `i` by `deltas[i]`"""
+        starts, offsets = self.starts, self.offsets
+        for i, delta in enumerate(deltas):
+            if delta:
+                for j in range(offsets[i], offsets[i + 1]):
+                    starts[j] += delta
+
+    @classmethod
+    def from_frame(cls, frame: pl.DataFrame) -> "MarkupColumns":
+        """From the `string` and `markup_*` columns of a corpus frame, converting each column in one pass"""
+        batch = cls()
+        batch.strings = frame["string"].to_list()
+        batch.offsets = array("q", [0, *accumulate(frame["markup_start"].list.len().fill_null(0))])
+        batch.starts = array("i", frame["markup_start"].explode().drop_nulls().to_list())
+        batch.lengths = array("i", frame["markup_length"].explode().drop_nulls().to_list())
+        batch.cids = array("q", frame["markup_cid"].explode().drop_nulls().to_list())
+        if not len(batch.starts) == len(batch.lengths) == len(batch.cids) == batch.offsets[-1]:
+            raise ValueError("Markup list columns differ in length")
+        return batch
+
+    def columns(self) -> dict[str, pl.Series]:
+        """The `string` and `markup_*` columns of a corpus frame"""
+        # Each list column is cut out of its flat values by the row offsets in one vectorized step
+        offsets = pl.Series(self.offsets, dtype=pl.Int64)
+        rows = pl.DataFrame({"offset": offsets.slice(0, len(self)), "length": offsets.diff().slice(1)})
+
+        def column(name: str, values: array, dtype: pl.DataType) -> pl.Series:
+            if not len(self):  # A literal is not broadcast to no rows
+                return pl.Series(name, [], dtype=pl.List(dtype))
+            flat = pl.Series(name, values, dtype=dtype).implode()
+            return rows.select(pl.lit(flat).list.slice("offset", "length").alias(name)).to_series()
+
+        return {
+            "string": pl.Series("string", self.strings, dtype=pl.String),
+            "markup_start": column("markup_start", self.starts, pl.Int32()),
+            "markup_length": column("markup_length", self.lengths, pl.Int32()),
+            "markup_cid": column("markup_cid", self.cids, pl.Int64()),
+        }
@@ -0,0 +1,285 @@
+"""
+In-process metrics for the scraper: counters, latency histograms and gauges, plus a reporter that publishes them.
+
+Recording is a handful of dict and integer updates with no I/O, so it is cheap enough to do for every request. The
+`MetricsReporter` periodically writes a JSON snapshot to disk and logs a one-line progress summary, and can serve the
+same snapshot over HTTP for pulling.
+
+A snapshot holds page, byte (decoded and on the wire), attempt and retry counters, rates, response statuses,
+connection reuse, latency histograms per proxy and per heading, and gauges such as in-flight requests and the depth of
+the page queue.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from collections.abc import Callable
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from pubchem_scraper.manifest import DONE
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, roughly 1.4x apart from 1 ms to about 90 s; anything slower lands in an overflow bucket
+LATENCY_BUCKETS = [0.001 * 2 ** (i / 2) for i in range(34)]
+
+
+class Histogram:
+    def __init__(self, bounds: list[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, capped at the largest value seen"""
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+def proxy_label(proxy: str) -> str:
+    """host:port of a proxy URL, so credentials never end up in metrics"""
+    parts = urlsplit(proxy)
+    return f"{parts.hostname}:{parts.port}" if parts.port else str(parts.hostname)
+
+
+class ScrapeMetrics:
+    """Everything the scraper counts. Proxies are labelled by host:port, see `proxy_label`."""
+
+    def __init__(self, rate_window: float = 60.0):
+        self.started = time.monotonic()
+        self.rate_window = rate_window
+
+        self.pages = 0
+        self.pages_failed = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.attempts = 0
+        self.retries = 0
+        self.statuses: Counter[str] = Counter()
+
+        self.proxy_latency: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.proxy_statuses: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self.proxy_connections: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self.heading_latency: defaultdict[str, Histogram] = defaultdict(Histogram)
+
+        self.in_flight = 0
+        self.gauges: dict[str, Callable[[], float]] = {}
+
+        # Completion times within the last `rate_window` seconds, for the recent rate
+        self._recent: deque[float] = deque()
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        self.attempts += 1
+
+    def request_finished(
+        self, proxy: str, status: str, elapsed: float, size: int = 0, wire_size: int | None = None
+    ) -> None:
+        """
+        `status` is the HTTP status code, or the exception name for requests that got no response. `size` is the
+        decoded body size, `wire_size` what was transferred for it if it was compressed.
+        """
+        self.in_flight -= 1
+        label = proxy_label(proxy)
+        self.statuses[status] += 1
+        self.proxy_statuses[label][status] += 1
+        self.proxy_latency[label].observe(elapsed)
+        self.bytes += size
+        self.wire_bytes += size if wire_size is None else wire_size
+
+    def connection(self, proxy: str, reused: bool) -> None:
+        """A request through `proxy` got a connection, either a new one or an idle one from the pool"""
+        self.proxy_connections[proxy_label(proxy)]["reused" if reused else "new"] += 1
+
+    def connection_reuse(self) -> float:
+        """Fraction of requests that reused a pooled connection"""
+        reused = sum(c["reused"] for c in self.proxy_connections.values())
+        total = reused + sum(c["new"] for c in self.proxy_connections.values())
+        return reused / total if total else 0.0
+
+    def page_done(self, heading: str, elapsed: float) -> None:
+        """`elapsed` covers every attempt at the page, including backoff"""
+        self.pages += 1
+        self.heading_latency[heading].observe(elapsed)
+
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent[0] < now - self.rate_window:
+            self._recent.popleft()
+
+    def page_failed(self) -> None:
+        self.pages_failed += 1
+
+    def retry(self) -> None:
+        self.retries += 1
+
+    def add_gauge(self, name: str, fn: Callable[[], float]) -> None:
+        """Registers a gauge that is sampled whenever a snapshot is taken"""
+        self.gauges[name] = fn
+
+    def recent_rate(self) -> float:
+        now = time.monotonic()
+        recent = sum(1 for t in self._recent if t >= now - self.rate_window)
+        return recent / min(self.rate_window, max(now - self.started, 1e-9))
+
+    def snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        return {
+            "time": time.time(),
+            "uptime_s": uptime,
+            "counters": {
+                "pages": self.pages,
+                "pages_failed": self.pages_failed,
+                "bytes": self.bytes,
+                "wire_bytes": self.wire_bytes,
+                "attempts": self.attempts,
+                "retries": self.retries,
+            },
+            "rates": {
+                "pages_per_s": self.pages / uptime if uptime else 0.0,
+                "recent_pages_per_s": self.recent_rate(),
+                "bytes_per_s": self.bytes / uptime if uptime else 0.0,
+                "wire_bytes_per_s": self.wire_bytes / uptime if uptime else 0.0,
+                "compression_ratio": self.bytes / self.wire_bytes if self.wire_bytes else 1.0,
+                "connection_reuse": self.connection_reuse(),
+            },
+            "statuses": dict(self.statuses),
+            "gauges": {"in_flight": self.in_flight} | {name: fn() for name, fn in self.gauges.items()},
+            "proxies": {
+                label: {
+                    "statuses": dict(self.proxy_statuses[label]),
+                    "latency": hist.summary(),
+                    "connections": dict(self.proxy_connections[label]),
+                }
+                for label, hist in self.proxy_latency.items()
+            },
+            "headings": {heading: hist.summary() for heading, hist in self.heading_latency.items()},
+        }
+
+
+def progress_line(snapshot: dict, progress: dict[str, int] | None = None) -> str:
+    """One-line summary of a snapshot; `progress` are the manifest's page counts by status"""
+    counters, rates, gauges = snapshot["counters"], snapshot["rates"], snapshot["gauges"]
+    parts = [
+        f"{counters['pages']} pages ({rates['recent_pages_per_s']:.1f}/s, {rates['bytes_per_s'] / 1e6:.1f} MB/s,"
+        f" {rates['wire_bytes_per_s'] / 1e6:.1f} MB/s on the wire)",
+        f"{rates['connection_reuse']:.0%} connections reused",
+        f"{counters['retries']} retries",
+        f"{counters['pages_failed']} failed",
+        " ".join(f"{name}={value}" for name, value in gauges.items()),
+    ]
+    if progress:
+        total = sum(progress.values())
+        done = progress.get(DONE, 0)
+        remaining = total - done  # Failed pages are picked up again, so they count as outstanding
+        parts.append(f"{done}/{total} done ({100 * done / total if total else 0:.1f}%)")
+        if rates["recent_pages_per_s"] > 0:
+            parts.append(f"ETA {timedelta(seconds=round(remaining / rates['recent_pages_per_s']))}")
+    return " | ".join(parts)
+
+
+class MetricsReporter:
+    """
+    Publishes `metrics` every `interval` seconds: atomically rewrites the JSON snapshot at `path` (if given) and logs
+    a progress line. With a `port`, `GET /metrics` on it returns a fresh snapshot.
+
+    `progress` is called for the overall page counts by status, which are added to both. It runs in a worker thread
+    once per interval, since counting may take a while (e.g. `Manifest.counts_in_thread`), and `/metrics` serves the
+    counts from the last interval along with fresh metrics.
+    """
+
+    def __init__(
+        self,
+        metrics: ScrapeMetrics,
+        path: str | Path | None = None,
+        port: int | None = None,
+        interval: float = 10.0,
+        progress: Callable[[], dict[str, int]] | None = None,
+    ):
+        self.metrics = metrics
+        self.path = Path(path) if path else None
+        self.port = port
+        self.interval = interval
+        self.progress = progress
+        self._progress: dict[str, int] | None = None
+        self._task: asyncio.Task | None = None
+        self._runner: web.AppRunner | None = None
+
+    def snapshot(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        if self._progress is not None:
+            snapshot["progress"] = self._progress
+        return snapshot
+
+    async def publish(self) -> None:
+        if self.progress:
+            self._progress = await asyncio.to_thread(self.progress)
+        snapshot = self.snapshot()
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(snapshot))
+            os.replace(tmp, self.path)
+        logger.info(progress_line(snapshot, snapshot.get("progress")))
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.json_response(self.snapshot())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.publish()
+
+    async def start(self) -> None:
+        if self.port is not None:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops reporting, publishing one last snapshot"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._runner:
+            await self._runner.cleanup()
+        await self.publish()
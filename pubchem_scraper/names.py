@@ -0,0 +1,175 @@
+import json
+import mmap
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Protocol
+
+import polars as pl
+
+NUM_SYNONYMS = 5
+SEPARATOR = "\x1f"
+
+
+class NameLookup(Protocol):
+    def iupac(self, cid: int) -> str: ...
+
+    def synonyms(self, cid: int) -> list[str]: ...
+
+
+def _candidate_table(iupac: pl.LazyFrame, synonyms: pl.LazyFrame) -> pl.LazyFrame:
+    """Per CID, its first IUPAC name ("" if none) and first `NUM_SYNONYMS` synonyms joined by `SEPARATOR`"""
+    iupac = iupac.select("CID", "IUPAC").unique("CID", keep="first", maintain_order=True)
+    synonyms = (
+        synonyms.select("CID", "SYN")
+        .group_by("CID", maintain_order=True)
+        .head(NUM_SYNONYMS)
+        .group_by("CID", maintain_order=True)
+        .agg(pl.col("SYN"))
+    )
+    return iupac.join(synonyms, on="CID", how="full", coalesce=True).select(
+        "CID",
+        pl.concat_list(pl.col("IUPAC").fill_null(""), pl.col("SYN").fill_null([])).list.join(SEPARATOR).alias("entry"),
+    )
+
+
+class _CandidateLookup(ABC):
+    """A NameLookup over per-CID candidate lists: the IUPAC name ("" if none) followed by synonyms"""
+
+    @abstractmethod
+    def candidates(self, cid: int) -> list[str]: ...
+
+    def iupac(self, cid: int) -> str:
+        iupac = self.candidates(cid)[0]
+        if not iupac:
+            raise KeyError(f"No IUPAC name for CID {cid}")
+        return iupac
+
+    def synonyms(self, cid: int) -> list[str]:
+        synonyms = self.candidates(cid)[1:]
+        if not synonyms:
+            raise KeyError(f"No synonyms for CID {cid}")
+        return synonyms
+
+
+class NameTable(_CandidateLookup):
+    """In-memory names for a known set of CIDs, e.g. everything referenced by one batch of strings"""
+
+    def __init__(self, entries: dict[int, list[str]]):
+        self.entries = entries
+
+    @classmethod
+    def from_parquet(
+        cls,
+        cids: Iterable[int],
+        iupac_path: str | Path = "./data/iupac_subset.parquet",
+        synonyms_path: str | Path = "./data/synonyms_subset.parquet",
+    ) -> "NameTable":
+        """Resolves all `cids` at once with a semi-join of both Parquet tables against the CID list"""
+        wanted = pl.LazyFrame({"CID": sorted(set(cids))}, schema={"CID": pl.Int64})
+
+        def restrict(path: str | Path) -> pl.LazyFrame:
+            table = pl.scan_parquet(path)
+            return table.join(wanted.cast({"CID": table.collect_schema()["CID"]}), on="CID", how="semi")
+
+        table = _candidate_table(restrict(iupac_path), restrict(synonyms_path)).collect()
+        return cls({cid: entry.split(SEPARATOR) for cid, entry in table.iter_rows()})
+
+    def candidates(self, cid: int) -> list[str]:
+        if cid not in self.entries:
+            raise KeyError(f"No names for CID {cid}")
+        return self.entries[cid]
+
+
+class NameIndex(_CandidateLookup):
+    """
+    CID-keyed lookup of the replacement names used by augmentation.
+
+    The IUPAC and synonym Parquet tables are condensed once into three flat files: a sorted array of CIDs, an array
+    of byte offsets, and a UTF-8 blob holding, per CID, its IUPAC name followed by its first `NUM_SYNONYMS` synonyms.
+    The files are memory-mapped, so a lookup is a binary search plus decoding one small slice, and nothing is read
+    until the first lookup. The index is rebuilt whenever the Parquet files change. It pickles as its paths, so it
+    can be handed to worker processes, which map the files themselves.
+    """
+
+    def __init__(
+        self,
+        iupac_path: str | Path = "./data/iupac_subset.parquet",
+        synonyms_path: str | Path = "./data/synonyms_subset.parquet",
+        index_dir: str | Path = "./data/name_index",
+    ):
+        self.iupac_path = Path(iupac_path)
+        self.synonyms_path = Path(synonyms_path)
+        self.index_dir = Path(index_dir)
+        self._cids: memoryview | None = None
+        self._offsets: memoryview | None = None
+        self._names: mmap.mmap | bytes = b""
+
+    def __reduce__(self):
+        return NameIndex, (self.iupac_path, self.synonyms_path, self.index_dir)
+
+    def _sources(self) -> dict[str, list[float]]:
+        return {str(p): [p.stat().st_mtime, p.stat().st_size] for p in (self.iupac_path, self.synonyms_path)}
+
+    def _is_fresh(self) -> bool:
+        meta_path = self.index_dir / "meta.json"
+        return meta_path.exists() and json.loads(meta_path.read_text()) == self._sources()
+
+    def build(self) -> None:
+        table = (
+            _candidate_table(pl.scan_parquet(self.iupac_path), pl.scan_parquet(self.synonyms_path))
+            .sort("CID")
+            .collect()
+        )
+
+        entries = [entry.encode() for entry in table["entry"]]
+        offsets = array("q", [0])
+        for entry in entries:
+            offsets.append(offsets[-1] + len(entry))
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        (self.index_dir / "cids.bin").write_bytes(array("q", table["CID"].to_list()).tobytes())
+        (self.index_dir / "offsets.bin").write_bytes(offsets.tobytes())
+        (self.index_dir / "names.bin").write_bytes(b"".join(entries))
+        (self.index_dir / "meta.json").write_text(json.dumps(self._sources()))
+
+    def _map(self, name: str) -> mmap.mmap | bytes:
+        with open(self.index_dir / name, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def ensure_built(self) -> None:
+        """Builds the index files unless they are up to date with the Parquet files"""
+        if not self._is_fresh():
+            self.build()
+
+    def _load(self) -> None:
+        self.ensure_built()
+        self._cids = memoryview(self._map("cids.bin")).cast("q")
+        self._offsets = memoryview(self._map("offsets.bin")).cast("q")
+        self._names = self._map("names.bin")
+
+    def candidates(self, cid: int) -> list[str]:
+        """The IUPAC name ("" if there is none) followed by up to `NUM_SYNONYMS` synonyms"""
+        if self._cids is None:
+            self._load()
+        assert self._cids is not None and self._offsets is not None
+
+        i = bisect_left(self._cids, cid)
+        if i == len(self._cids) or self._cids[i] != cid:
+            raise KeyError(f"No names for CID {cid}")
+        return self._names[self._offsets[i] : self._offsets[i + 1]].decode().split(SEPARATOR)
+
+
+_name_index: NameIndex | None = None
+
+
+def get_name_index() -> NameIndex:
+    """The process-wide index over the default Parquet files, created on first use"""
+    global _name_index
+    if _name_index is None:
+        _name_index = NameIndex()
+    return _name_index
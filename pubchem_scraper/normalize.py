@@ -0,0 +1,105 @@
+"""
+Name normalization used to decide whether two identifiers refer to the same molecule.
+
+All translation tables are built once at import, so each rewrite is a single `str.translate` call. The greek letter
+names that used to come from `unicodedata.name` for every matched character are looked up once for the whole Greek
+and Coptic block.
+"""
+
+import unicodedata
+from collections.abc import Iterable
+from functools import lru_cache
+
+UNICODE_PUNCTUATION = str.maketrans(
+    {
+        "’": "'",
+        "“": '"',
+        "”": '"',
+        "—": "-",
+        "–": "-",
+        "…": "...",
+        "‘": "'",
+        "´": "'",
+        "″": '"',
+    }
+)
+
+# fmt: off
+GREEK_SINGLE_LETTERS = str.maketrans({
+    'α': 'a', 'Α': 'A',  # alpha
+    'β': 'b', 'Β': 'B',  # beta
+    'γ': 'g', 'Γ': 'G',  # gamma
+    'δ': 'd', 'Δ': 'D',  # delta
+    'ε': 'e', 'Ε': 'E',  # epsilon
+    'ζ': 'z', 'Ζ': 'Z',  # zeta
+    'η': 'h', 'Η': 'H',  # eta
+    'θ': 'th', 'Θ': 'Th',  # theta
+    'ι': 'i', 'Ι': 'I',  # iota
+    'κ': 'k', 'Κ': 'K',  # kappa
+    'λ': 'l', 'Λ': 'L',  # lambda
+    'μ': 'm', 'Μ': 'M',  # mu
+    'ν': 'n', 'Ν': 'N',  # nu
+    'ξ': 'x', 'Ξ': 'X',  # xi
+    'ο': 'o', 'Ο': 'O',  # omicron
+    'π': 'p', 'Π': 'P',  # pi
+    'ρ': 'r', 'Ρ': 'R',  # rho
+    'σ': 's', 'Σ': 'S',  # sigma
+    'ς': 's',            # final sigma
+    'τ': 't', 'Τ': 'T',  # tau
+    'υ': 'y', 'Υ': 'Y',  # upsilon
+    'φ': 'ph', 'Φ': 'Ph',  # phi
+    'χ': 'ch', 'Χ': 'Ch',  # chi
+    'ψ': 'ps', 'Ψ': 'Ps',  # psi
+    'ω': 'o', 'Ω': 'O'   # omega
+})
+# fmt: on
+
+
+def _greek_names() -> dict[int, str]:
+    """Lowercase Unicode name of every assigned character in U+0370..U+03FF, without the "greek ... letter" prefix"""
+    table = {}
+    for code in range(0x0370, 0x0400):
+        name = unicodedata.name(chr(code), None)
+        if name is not None:
+            table[code] = name.lower().replace("greek small letter ", "").replace("greek capital letter ", "")
+    return table
+
+
+GREEK_NAMES = _greek_names()
+
+
+def map_unicode_characters(text: str) -> str:
+    return text.translate(UNICODE_PUNCTUATION)
+
+
+def replace_greek_letters(text: str) -> str:
+    """Spells out greek characters, e.g. "α-tocopherol" -> "alpha-tocopherol" """
+    return text.translate(GREEK_NAMES)
+
+
+def replace_greek_single_letter(text: str) -> str:
+    """Replaces greek letters with their latin counterpart, e.g. "α-tocopherol" -> "a-tocopherol" """
+    return text.translate(GREEK_SINGLE_LETTERS)
+
+
+@lru_cache(maxsize=1 << 20)
+def normalized_ids(id_: str) -> frozenset[str]:
+    """
+    Every form of `id_` that counts as the same identifier when merging: with unicode punctuation mapped to ASCII, in
+    its own and lower case, and each of those with greek letters spelled out or replaced by a single letter.
+
+    Cached for the whole process (up to about a million names), since the same names come up again and again across
+    examples.
+    """
+    # None of the tables touch ASCII, which covers most names
+    if id_.isascii():
+        return frozenset((id_, id_.lower()))
+
+    mapped = map_unicode_characters(id_)
+    forms = {mapped, mapped.lower()}
+    return frozenset(forms.union(*((replace_greek_letters(f), replace_greek_single_letter(f)) for f in forms)))
+
+
+def normalize_many(names: Iterable[str]) -> list[frozenset[str]]:
+    """`normalized_ids` of every name, computing each distinct name once"""
+    return [normalized_ids(name) for name in names]
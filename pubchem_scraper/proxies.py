@@ -0,0 +1,244 @@
+"""
+The proxy pool: which proxy a request goes through, based on how each proxy has been doing.
+
+Every proxy keeps an exponentially weighted moving average (EWMA) of its success rate and of its latency. Requests
+are spread over proxies at random, weighted by success rate squared over latency, so a slow or flaky proxy gets
+proportionally less work instead of every Nth request. A proxy that fails `failure_threshold` times in a row has its
+circuit opened and gets no requests at all for `open_seconds`. After that it is half-open: a single probe request is
+let through, which closes the circuit again on success or reopens it, for twice as long, on failure.
+
+Only failures that may be the proxy's fault count (see `scrape.fetch_page`): connection errors, timeouts, server
+errors, 403/407 and truncated bodies, but not throttling, which the rate limiter deals with, or other client errors.
+
+The proxy list can be reloaded while running (`reload`, or `watch` to follow a file); proxies that stay keep their
+health, new ones start out healthy, and removed ones get no new requests. A removed proxy is forgotten once its last
+request in flight completes, which `on_removed` is told about (the scraper closes the proxy's session then).
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from pubchem_scraper.metrics import proxy_label
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def read_proxies(file_path: str | Path) -> list[str]:
+    """Proxies from a file of `ip:port:user:password` lines"""
+    with open(file_path) as f:
+        return [
+            f"http://{user}:{password}@{ip}:{port}"
+            for ip, port, user, password in (line.strip().split(":") for line in f if line.strip())
+        ]
+
+
+@dataclass
+class ProxyHealth:
+    success: float = 1.0
+    """EWMA of the success rate, starting out optimistic"""
+    latency: float | None = None
+    """EWMA of the latency of successful requests, in seconds"""
+    failures: int = 0
+    """Consecutive failures"""
+    state: str = CLOSED
+    open_until: float = 0.0
+    open_seconds: float = 0.0
+    """How long the circuit stays open the next time it trips, doubling while probes fail"""
+    in_use: int = 0
+
+
+class ProxyPool:
+    """
+    Hands out proxies weighted by health, with at most `per_proxy` requests in flight on each (None: no cap).
+
+    Proxies at their cap or with an open circuit are skipped; `acquire` only waits when no proxy can take a request,
+    until a slot is released or a circuit turns half-open.
+    """
+
+    def __init__(
+        self,
+        proxies: Sequence[str],
+        per_proxy: int | None = None,
+        alpha: float = 0.2,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        max_open_seconds: float = 600.0,
+        rng: random.Random | None = None,
+        on_removed: Callable[[str], None] | None = None,
+    ):
+        if not proxies:
+            raise ValueError("At least one proxy is required")
+        self.per_proxy = per_proxy
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.rng = rng or random.Random()
+        self.on_removed = on_removed
+
+        self.proxies: list[str] = []
+        self.health: dict[str, ProxyHealth] = {}
+        self.reload(proxies)
+        self._released = asyncio.Condition()
+
+    def reload(self, proxies: Sequence[str]) -> None:
+        """Switches to a new proxy list; requests in flight on removed proxies still complete"""
+        if not proxies:
+            raise ValueError("At least one proxy is required")
+        self.proxies = list(dict.fromkeys(proxies))
+        for proxy in self.proxies:
+            self.health.setdefault(proxy, ProxyHealth(open_seconds=self.base_open_seconds))
+        for proxy in [
+            proxy for proxy, health in self.health.items() if proxy not in self.proxies and not health.in_use
+        ]:
+            self._forget(proxy)
+
+    def _forget(self, proxy: str) -> None:
+        """Drops a removed proxy that has no requests in flight"""
+        del self.health[proxy]
+        if self.on_removed:
+            self.on_removed(proxy)
+
+    def weights(self, proxies: Sequence[str]) -> list[float]:
+        """Success rate squared over latency; proxies without a success yet are assumed to be as fast as the average"""
+        known = [h.latency for h in self.health.values() if h.latency is not None]
+        default = sum(known) / len(known) if known else 1.0
+        weights = []
+        for proxy in proxies:
+            health = self.health[proxy]
+            latency = health.latency if health.latency is not None else default
+            weights.append(health.success**2 / max(latency, 1e-3))
+        return weights
+
+    def _available(self, proxy: str, now: float) -> bool:
+        health = self.health[proxy]
+        if self.per_proxy is not None and health.in_use >= self.per_proxy:
+            return False
+        if health.state == OPEN:
+            return now >= health.open_until
+        if health.state == HALF_OPEN:
+            return health.in_use == 0  # One probe at a time
+        return True
+
+    def _pick(self, avoid: str | None) -> str | None:
+        """
+        A proxy whose circuit is due for a probe, or else a random available proxy weighted by health; other than
+        `avoid` unless it is the only one
+        """
+        now = time.monotonic()
+        candidates = [proxy for proxy in self.proxies if self._available(proxy, now)]
+        if len(candidates) > 1 and avoid in candidates:
+            candidates.remove(avoid)
+        if not candidates:
+            return None
+
+        for proxy in candidates:
+            health = self.health[proxy]
+            if health.state == OPEN:
+                health.state = HALF_OPEN
+                return proxy
+        return self.rng.choices(candidates, weights=self.weights(candidates))[0]
+
+    def _next_probe(self) -> float | None:
+        """Seconds until the next open circuit turns half-open"""
+        waits = [
+            h.open_until - time.monotonic() for p, h in self.health.items() if p in self.proxies and h.state == OPEN
+        ]
+        return max(min(waits), 0.0) if waits else None
+
+    async def acquire(self, avoid: str | None = None) -> str:
+        """Takes a slot on a proxy, preferring one other than `avoid` (e.g. the proxy that just failed)"""
+        async with self._released:
+            while (proxy := self._pick(avoid)) is None:
+                with contextlib.suppress(asyncio.TimeoutError):  # Woken up to let a circuit go half-open
+                    await asyncio.wait_for(self._released.wait(), self._next_probe())
+            self.health[proxy].in_use += 1
+            return proxy
+
+    async def release(self, proxy: str) -> None:
+        async with self._released:
+            health = self.health[proxy]
+            health.in_use -= 1
+            if proxy not in self.proxies and not health.in_use:
+                self._forget(proxy)
+            self._released.notify()
+
+    def record_success(self, proxy: str, latency: float) -> None:
+        health = self.health.get(proxy)
+        if health is None:
+            return
+        health.success += self.alpha * (1.0 - health.success)
+        health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+        health.failures = 0
+        if health.state != CLOSED:
+            logger.info(f"Proxy {proxy_label(proxy)} recovered, closing its circuit")
+            health.state = CLOSED
+            health.open_seconds = self.base_open_seconds
+
+    def record_failure(self, proxy: str) -> None:
+        health = self.health.get(proxy)
+        if health is None:
+            return
+        health.success -= self.alpha * health.success
+        health.failures += 1
+        if health.state == HALF_OPEN or (health.state == CLOSED and health.failures >= self.failure_threshold):
+            if health.state == HALF_OPEN:
+                health.open_seconds = min(2 * health.open_seconds, self.max_open_seconds)
+            health.state = OPEN
+            health.open_until = time.monotonic() + health.open_seconds
+            logger.warning(
+                f"Proxy {proxy_label(proxy)} failed {health.failures} times in a row, "
+                f"opening its circuit for {health.open_seconds:.0f}s"
+            )
+
+    def busy(self) -> int:
+        """Number of proxies at their cap"""
+        if self.per_proxy is None:
+            return 0
+        return sum(self.health[proxy].in_use >= self.per_proxy for proxy in self.proxies)
+
+    def open_circuits(self) -> int:
+        return sum(self.health[proxy].state != CLOSED for proxy in self.proxies)
+
+    async def watch(
+        self,
+        path: str | Path,
+        interval: float = 5.0,
+        select: Callable[[list[str]], list[str]] | None = None,
+    ) -> None:
+        """
+        Reloads the proxy list from `path` whenever the file changes, until cancelled.
+
+        `select` picks this process's share out of the file (see `pubchem_scraper.leases.split_proxies`). A file that
+        cannot be read or yields no proxies is ignored until it changes again.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = os.stat(path).st_mtime_ns
+                if current == mtime:
+                    continue
+                mtime = current
+                proxies = read_proxies(path)
+                if select:
+                    proxies = select(proxies)
+                self.reload(proxies)
+            except (OSError, ValueError) as e:
+                logger.error(f"Not reloading proxies from {path}: {e}")
+                continue
+
+            logger.info(f"Reloaded {len(self.proxies)} proxies from {path}")
+            async with self._released:
+                self._released.notify_all()
@@ -22,7 +22,9 @@ class _Markup(BaseModel):
     @property
     def cid(self) -> int | None:
         if self.has_cid and self.Extra:
-            return int(self.Extra.split("-")[1])
+            parts = self.Extra.split("-")
+            if len(parts) > 1 and parts[1].isdigit():
+                return int(parts[1])
         return None
 
 
@@ -92,7 +94,7 @@ class SimpleStringWithMarkup(BaseModel):
 
             # Adjust and add markup
             for markup in item.Markup:
-                if markup.Start is None or markup.Length is None or not markup.has_cid:
+                if markup.Start is None or markup.Length is None or markup.cid is None:
                     raise ValueError(f"Invalid markup: {markup}")
 
                 adjusted_markup = SimpleMarkup(
@@ -234,3 +236,5 @@ class SimpleElement(BaseModel):
     string: SimpleStringWithMarkup
     label: str
     records: list[int] | None = None
+    labels: list[str] | None = None
+    """Every heading the string was found under, when deduplicated across headings (`label` is the first of them)"""
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+class TokenBucket:
+    """
+    Async token bucket with adjustable rate.
+
+    Callers reserve a token immediately and sleep off any deficit, so waiters are released in arrival order
+    without needing a lock or a condition variable.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, min_rate: float | None = None):
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        self._refill()
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def slow_down(self, factor: float) -> None:
+        """Multiplicatively decrease the rate (the "MD" in AIMD)."""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def speed_up(self, step: float) -> None:
+        """Additively increase the rate back towards its configured maximum."""
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + step)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for at least `seconds`, e.g. to honour a Retry-After header."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class RateLimiter:
+    """
+    Paces requests with one token bucket per proxy plus a global bucket.
+
+    Responses are fed back through `record`: throttling statuses (429/503) halve the offending proxy's rate and
+    nudge the global rate down, while successes slowly restore both to their configured maximum.
+    """
+
+    def __init__(
+        self,
+        global_rate: float | None,
+        per_proxy_rate: float | None,
+        backoff_factor: float = 0.5,
+        recovery_steps: int = 20,
+    ):
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.per_proxy_rate = per_proxy_rate
+        self.backoff_factor = backoff_factor
+        self.recovery_steps = recovery_steps
+        self.proxy_buckets: dict[str, TokenBucket] = {}
+
+    def _proxy_bucket(self, proxy: str) -> TokenBucket | None:
+        if not self.per_proxy_rate:
+            return None
+        if proxy not in self.proxy_buckets:
+            self.proxy_buckets[proxy] = TokenBucket(self.per_proxy_rate)
+        return self.proxy_buckets[proxy]
+
+    async def acquire(self, proxy: str) -> None:
+        if bucket := self._proxy_bucket(proxy):
+            await bucket.acquire()
+        if self.global_bucket:
+            await self.global_bucket.acquire()
+
+    def record(self, proxy: str, status: int, retry_after: float | None = None) -> None:
+        proxy_bucket = self._proxy_bucket(proxy)
+
+        if status in THROTTLE_STATUSES:
+            if proxy_bucket:
+                proxy_bucket.slow_down(self.backoff_factor)
+                if retry_after:
+                    proxy_bucket.pause(retry_after)
+            if self.global_bucket:
+                self.global_bucket.slow_down(1 - (1 - self.backoff_factor) / 5)
+            return
+
+        for bucket in (proxy_bucket, self.global_bucket):
+            if bucket and bucket.rate < bucket.max_rate:
+                bucket.speed_up(bucket.max_rate / self.recovery_steps)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,111 @@
+"""
+Bookkeeping for refreshing an existing scrape.
+
+A refresh re-probes page 1 of every heading with a conditional request. A heading whose first page is unchanged is
+assumed unchanged; otherwise its page count is updated and every later page is re-checked, again conditionally and
+by content hash, since inserted or removed annotations shift the pages after them. Only pages whose content actually
+changed are written to the store.
+
+Each run appends a `ChangeReport` to a JSON lines file. Additions and replacements also reach the corpus build
+through the store's `seq` watermark, but pages that disappeared only show up in the report.
+"""
+
+import hashlib
+import json
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+PROBE = "probe"
+"""Refresh mode that re-fetches the pages of headings whose first page changed"""
+ALL = "all"
+"""Refresh mode that conditionally re-fetches every page"""
+MODES = (PROBE, ALL)
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def conditional_headers(etag: str | None, last_modified: str | None) -> dict[str, str]:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+@dataclass
+class HeadingChanges:
+    added: int = 0
+    unchanged: int = 0
+    changed: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    total_pages: tuple[int, int] | None = None
+    """(old, new) page count, when it changed"""
+
+
+class ChangeReport:
+    """What one scrape run did to the store, per heading"""
+
+    def __init__(self, refresh: str | None = None):
+        self.refresh = refresh
+        self.started = time.time()
+        self.headings: defaultdict[str, HeadingChanges] = defaultdict(HeadingChanges)
+
+    def page(self, heading: str, page: int, outcome: str) -> None:
+        changes = self.headings[heading]
+        if outcome == ADDED:
+            changes.added += 1
+        elif outcome == CHANGED:
+            changes.changed.append(page)
+        else:
+            changes.unchanged += 1
+
+    def resized(self, heading: str, old: int, new: int, removed: list[int]) -> None:
+        changes = self.headings[heading]
+        changes.total_pages = (old, new)
+        changes.removed.extend(removed)
+
+    def summary(self) -> dict[str, int]:
+        return {
+            ADDED: sum(c.added for c in self.headings.values()),
+            CHANGED: sum(len(c.changed) for c in self.headings.values()),
+            UNCHANGED: sum(c.unchanged for c in self.headings.values()),
+            "removed": sum(len(c.removed) for c in self.headings.values()),
+        }
+
+    def to_dict(self) -> dict:
+        """Headings with nothing but unchanged pages are only counted in the summary"""
+        return {
+            "started": self.started,
+            "finished": time.time(),
+            "refresh": self.refresh,
+            "summary": self.summary(),
+            "headings": {
+                heading: asdict(changes) | {CHANGED: sorted(changes.changed), "removed": sorted(changes.removed)}
+                for heading, changes in self.headings.items()
+                if changes.added or changes.changed or changes.removed or changes.total_pages
+            },
+        }
+
+    def append_to(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
+
+
+def read_reports(path: str | Path, skip: int = 0) -> list[dict]:
+    """The reports in a change log, after the first `skip` ones"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for i, line in enumerate(f) if i >= skip and line.strip()]
@@ -0,0 +1,144 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+from pubchem_scraper.markup_columns import ColumnarString
+from pubchem_scraper.pubchem_schema import SimpleStringWithMarkup
+
+
+class MarkupRewriter:
+    """
+    Plans edits to the markup spans of a string and applies them all at once.
+
+    Edits are recorded against the markup's original positions: `replace` swaps the text of one markup span and
+    `prepend` adds a new markup in front of the whole string. `apply` then builds the output string with a single join
+    and remaps every markup offset from the cumulative length change of the edited spans before it, instead of
+    rebuilding the string and shifting every markup after each edit. The output markup is assembled as a
+    ColumnarString, so a prepended markup moves all others with one bulk shift. The source object is never modified.
+
+    Markup is referred to by index: `0..n-1` are the source markup in its original order and `n` is the prepended
+    markup, once there is one. `order` lists the indices the way a markup list that is re-sorted by start after every
+    edit would hold them, so picking from it matches picking from such a list.
+
+    The single pass relies on markup spans being disjoint. When they are not (spans that share a start, repeat or
+    nest), an edit changes the text under other spans and the result depends on the order of the edits, so for such
+    strings each edit is applied to the text right away instead, one after another. With `sequential`, edits are
+    always applied that way, which is cheaper for a single edit than planning it.
+    """
+
+    def __init__(self, source: SimpleStringWithMarkup, separator: str = ": ", sequential: bool = False):
+        self.source = ColumnarString.from_simple(source)
+        self.separator = separator
+
+        self.hits = [m.hit for m in source.markup]
+        self.cids = self.source.cids.tolist()
+        self.starts = self.source.starts
+        self.replaced: dict[int, str] = {}
+        self.prefix: int | None = None
+
+        self.order = list(range(len(self.source)))
+        self._sorted_order = sorted(self.order, key=self.starts.__getitem__)
+
+        # Working copy of the text and markup positions, only kept when edits have to be applied one by one
+        self._sequential = sequential or _overlapping(self.source)
+        if self._sequential:
+            self._text = source.string
+            self._positions = self.starts.tolist()
+            self._lengths = self.source.lengths.tolist()
+
+    def replace(self, idx: int, new_text: str) -> None:
+        self.hits[idx] = new_text
+        if self._sequential:
+            start, length = self._positions[idx], self._lengths[idx]
+            self._text = self._text[:start] + new_text + self._text[start + length :]
+            self._lengths[idx] = len(new_text)
+            self._shift(start, len(new_text) - length)
+        elif idx != self.prefix:
+            self.replaced[idx] = new_text
+
+    def first(self) -> int:
+        """The source markup that starts earliest (the first of them in source order on ties)"""
+        if self._sequential:
+            return min((i for i in self.order if i != self.prefix), key=self._positions.__getitem__)
+        return min(range(len(self.starts)), key=self.starts.__getitem__)
+
+    def prepend(self, hit: str, cid: int) -> None:
+        if self.prefix is not None:
+            raise ValueError("Only one markup can be prepended")
+        self.prefix = len(self.hits)
+        self.hits.append(hit)
+        self.cids.append(cid)
+        if self._sequential:
+            self._text = hit + self.separator + self._text
+            self._shift(-1, len(hit) + len(self.separator))
+            self._positions.append(0)
+            self._lengths.append(len(hit))
+
+    def settle(self) -> None:
+        """Brings `order` up to date after an edit"""
+        if self._sequential:
+            if self.prefix is not None and self.prefix not in self.order:
+                self.order.append(self.prefix)
+            self.order = sorted(self.order, key=self._positions.__getitem__)
+            return
+        self.order = self._sorted_order if self.prefix is None else [self.prefix, *self._sorted_order]
+
+    def _shift(self, from_pos: int, shift: int) -> None:
+        """Moves every markup that starts after `from_pos` by `shift`"""
+        for i, start in enumerate(self._positions):
+            if start > from_pos:
+                self._positions[i] = start + shift
+
+    def apply(self) -> SimpleStringWithMarkup:
+        if self._sequential:
+            return self._apply_sequential()
+
+        source = self.source
+        text, starts, lengths = source.string, source.starts, source.lengths
+
+        edited = sorted(self.replaced, key=starts.__getitem__)
+        edited_starts = [starts[i] for i in edited]
+        parts = []
+        pos = 0
+        for idx in edited:
+            parts += [text[pos : starts[idx]], self.replaced[idx]]
+            pos = starts[idx] + lengths[idx]
+        parts.append(text[pos:])
+
+        # deltas[k] is the total length change of the first k edited spans
+        deltas = [0, *accumulate(len(self.replaced[i]) - lengths[i] for i in edited)]
+
+        rows = [idx for idx in self.order if idx != self.prefix]
+        result = ColumnarString(
+            "".join(parts),
+            [starts[i] + deltas[bisect_left(edited_starts, starts[i])] for i in rows],
+            [len(self.replaced[i]) if i in self.replaced else lengths[i] for i in rows],
+            [self.cids[i] for i in rows],
+        )
+        hits = [self.hits[i] for i in rows]
+
+        # The prepended markup is always first in `order`
+        if self.prefix is not None:
+            result.prepend(self.hits[self.prefix], self.cids[self.prefix], self.separator)
+            hits.insert(0, self.hits[self.prefix])
+
+        return result.to_simple(hits)
+
+    def _apply_sequential(self) -> SimpleStringWithMarkup:
+        order = self.order
+        result = ColumnarString(
+            self._text,
+            [self._positions[i] for i in order],
+            [self._lengths[i] for i in order],
+            [self.cids[i] for i in order],
+        )
+        return result.to_simple([self.hits[i] for i in order])
+
+
+def _overlapping(string: ColumnarString) -> bool:
+    """Whether any two markup spans share a start or overlap"""
+    previous, end = -1, -1
+    for start, length in sorted(zip(string.starts, string.lengths)):
+        if start == previous or start < end:
+            return True
+        previous, end = start, max(end, start + length)
+    return False
@@ -0,0 +1,72 @@
+"""
+Decides which page is downloaded next: `PageScheduler` orders the outstanding pages of all headings by a global policy
+instead of heading by heading. Which proxy a page goes through is up to `pubchem_scraper.proxies.ProxyPool`.
+"""
+
+import heapq
+from collections.abc import Iterable, Iterator
+
+from pubchem_scraper.manifest import Manifest
+
+ROUND_ROBIN = "round-robin"
+SMALLEST_FIRST = "smallest-first"
+PRIORITY = "priority"
+POLICIES = (ROUND_ROBIN, SMALLEST_FIRST, PRIORITY)
+
+
+class PageScheduler:
+    """
+    Global dispatch order for the outstanding pages of `headings`.
+
+    - round-robin: one page of each heading in turn, so all headings progress at the same pace
+    - smallest-first: headings with the fewest outstanding pages go first, so small headings finish early
+    - priority: headings with a higher value in `priorities` (default 0) go first, round-robin among equals
+
+    Headings sit in a heap keyed by the policy, and each one's pages are read lazily from the manifest, so only a
+    batch per heading is ever in memory.
+    """
+
+    def __init__(
+        self,
+        manifest: Manifest,
+        headings: Iterable[str],
+        policy: str = SMALLEST_FIRST,
+        priorities: dict[str, float] | None = None,
+        batch_size: int = 256,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.manifest = manifest
+        self.headings = list(dict.fromkeys(headings))
+        self.policy = policy
+        self.priorities = priorities or {}
+        self.batch_size = batch_size
+
+    def _key(self, heading: str, dispatched: int, outstanding: int) -> tuple[float, ...]:
+        if self.policy == SMALLEST_FIRST:
+            return (outstanding,)
+        if self.policy == PRIORITY:
+            return (-self.priorities.get(heading, 0), dispatched)
+        return (dispatched,)
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        outstanding = self.manifest.outstanding_counts()
+        heap = []
+        cursors = {}
+        for index, heading in enumerate(self.headings):
+            if outstanding.get(heading):
+                cursors[heading] = self.manifest.iter_outstanding(self.batch_size, heading)
+                heap.append((self._key(heading, 0, outstanding[heading]), index, heading, 0))
+        heapq.heapify(heap)
+
+        while heap:
+            _, index, heading, dispatched = heapq.heappop(heap)
+            page = next(cursors[heading], None)
+            if page is None:
+                del cursors[heading]
+                continue
+
+            yield page
+            dispatched += 1
+            key = self._key(heading, dispatched, outstanding[heading])
+            heapq.heappush(heap, (key, index, heading, dispatched))
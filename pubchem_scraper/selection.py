@@ -0,0 +1,222 @@
+"""
+Selects the text sections to train on from scraped records, streaming them to a JSONL file of SimpleElements.
+
+The same annotation text is often filed under many TOC headings. Sections are deduplicated on a digest of their text
+across all headings: the first occurrence is kept, with the union of the `labels` (headings) and `records` (linked
+CIDs) of all occurrences. Deduplication state, including the kept elements until they are written out, lives in a
+scratch SQLite database, so memory stays flat however large the input is.
+
+Markup is checked one item at a time instead of failing the whole record on the first bad span:
+
+- `strict`: a section with any unusable markup is dropped (`from_string_with_markup` instead fails on the first one)
+- `drop`: unusable markup spans are dropped and the rest of the section is kept
+- `repair`: like `drop`, but spans running past either end of their item's text are clipped to it first
+
+Markup without a CID (links to other PubChem pages) is never an error and is skipped in every mode, unlike in
+`from_string_with_markup`, which rejects it. Markup that claims a CID but has none that parses is unusable.
+
+    python -m pubchem_scraper.selection --store ./data/shards --out ./data/selected.jsonl --min-markup 1
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from pubchem_scraper.dedup import ScratchDatabase, content_digest
+from pubchem_scraper.fastdecode import decode_simple_record
+from pubchem_scraper.markup_columns import ColumnarString
+from pubchem_scraper.pubchem_schema import SimpleRecord, StringWithMarkup
+from pubchem_scraper.storage import ShardStore
+
+logger = logging.getLogger(__name__)
+
+STRICT = "strict"
+DROP = "drop"
+REPAIR = "repair"
+MARKUP_MODES = (STRICT, DROP, REPAIR)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS elements (digest INTEGER NOT NULL UNIQUE, string TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS labels (digest INTEGER NOT NULL, label TEXT NOT NULL, UNIQUE (digest, label));
+CREATE TABLE IF NOT EXISTS records (digest INTEGER NOT NULL, cid INTEGER NOT NULL, UNIQUE (digest, cid));
+"""
+
+
+@dataclass
+class Filters:
+    min_markup: int = 1
+    """Fewest CID markup spans a section needs (after dropping unusable ones)"""
+    min_length: int = 0
+    max_length: int | None = None
+    sources: frozenset[str] | None = None
+    """SourceNames to keep annotations from, all if None"""
+
+    def reason(self, string: ColumnarString) -> str | None:
+        """Why `string` is filtered out, or None if it is kept"""
+        if len(string) < self.min_markup:
+            return "filtered_markup"
+        length = len(string.string)
+        if length < self.min_length or (self.max_length is not None and length > self.max_length):
+            return "filtered_length"
+        return None
+
+
+def checked_string(value: StringWithMarkup, mode: str, counts: Counter) -> ColumnarString | None:
+    """
+    `value` as one string with columnar markup, handling unusable markup according to `mode`.
+
+    Returns None if the section is dropped (only in strict mode). Dropped and repaired spans are counted in `counts`.
+    """
+    starts, lengths, cids = array("i"), array("i"), array("q")
+    current_offset = 0
+    for item in value.StringWithMarkup:
+        size = len(item.String)
+        for markup in item.Markup:
+            if not markup.has_cid:
+                continue
+
+            start, length = markup.Start, markup.Length
+            if start is not None and length is not None and mode == REPAIR:
+                end = min(start + length, size)
+                clipped = max(start, 0)
+                if (clipped, end - clipped) != (start, length) and end > clipped:
+                    start, length = clipped, end - clipped
+                    counts["markup_repaired"] += 1
+
+            cid = markup.cid
+            if cid is None or start is None or length is None or start < 0 or length <= 0 or start + length > size:
+                if mode == STRICT:
+                    counts["invalid_sections"] += 1
+                    return None
+                counts["markup_dropped"] += 1
+                continue
+
+            starts.append(start + current_offset)
+            lengths.append(length)
+            cids.append(cid)
+
+        current_offset += size + 1
+
+    return ColumnarString("\n".join(item.String for item in value.StringWithMarkup), starts, lengths, cids)
+
+
+def iter_store_records(store_root: str | Path = "./data/shards") -> Iterator[SimpleRecord]:
+    """Every stored page as a SimpleRecord, skipping pages that do not decode"""
+    with ShardStore(store_root) as store:
+        for _, heading, page in store.iter_entries():
+            try:
+                record = decode_simple_record(store.get(heading, page))
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                logger.error(f"Skipping {heading} page {page}: {e}")
+                continue
+            if record.Annotations:
+                yield record
+
+
+def select(
+    records: Iterable[SimpleRecord],
+    out_path: str | Path = "./data/selected.jsonl",
+    filters: Filters | None = None,
+    markup: str = DROP,
+    db_path: str | Path | None = None,
+) -> dict[str, int]:
+    """
+    Writes the deduplicated, filtered text sections of `records` to `out_path` as JSON lines of SimpleElements.
+
+    Elements are written in the order their text was first seen. The output is only replaced once it is complete.
+    Returns counts of sections seen, kept and dropped, and of markup spans dropped or repaired.
+    """
+    if markup not in MARKUP_MODES:
+        raise ValueError(f"Unknown markup mode {markup!r}, expected one of {MARKUP_MODES}")
+    filters = filters or Filters()
+    counts: Counter[str] = Counter()
+
+    with ScratchDatabase(db_path, prefix="select-") as db:
+        conn = db.conn
+        conn.executescript(_SCHEMA)
+
+        for record in records:
+            label = record.TOCHeading
+            for annotation in record.Annotations:
+                counts["sections"] += len(annotation.Data)
+                if filters.sources is not None and annotation.SourceName not in filters.sources:
+                    counts["filtered_source"] += len(annotation.Data)
+                    continue
+
+                for section in annotation.Data:
+                    string = checked_string(section.Value, markup, counts)
+                    if string is None:
+                        continue
+                    reason = filters.reason(string)
+                    if reason is not None:
+                        counts[reason] += 1
+                        continue
+
+                    digest = content_digest(string.string)
+                    if conn.execute("SELECT 1 FROM elements WHERE digest = ?", (digest,)).fetchone() is None:
+                        conn.execute(
+                            "INSERT INTO elements VALUES (?, ?)", (digest, string.to_simple().model_dump_json())
+                        )
+                        counts["kept"] += 1
+                    else:
+                        counts["duplicates"] += 1
+                    conn.execute("INSERT OR IGNORE INTO labels VALUES (?, ?)", (digest, label))
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO records VALUES (?, ?)",
+                        [(digest, cid) for cid in annotation.LinkedRecords or ()],
+                    )
+            conn.commit()
+
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(line + "\n" for line in _element_lines(conn))
+        os.replace(tmp_path, out_path)
+
+    return dict(counts)
+
+
+def _element_lines(conn: sqlite3.Connection) -> Iterator[str]:
+    rows = conn.execute(
+        "SELECT string,"
+        " (SELECT json_group_array(label) FROM (SELECT label FROM labels WHERE digest = e.digest ORDER BY rowid)),"
+        " (SELECT json_group_array(cid) FROM (SELECT cid FROM records WHERE digest = e.digest ORDER BY rowid))"
+        " FROM elements e ORDER BY rowid"
+    )
+    for string, labels, records in rows:
+        labels = json.loads(labels)
+        # The string is stored as JSON already and spliced in as it is
+        rest = json.dumps({"label": labels[0], "records": json.loads(records) or None, "labels": labels})
+        yield f'{{"string":{string},{rest[1:]}'
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Select deduplicated text sections from scraped pages")
+    parser.add_argument("--store", default="./data/shards")
+    parser.add_argument("--out", default="./data/selected.jsonl")
+    parser.add_argument("--markup", choices=MARKUP_MODES, default=DROP, help="What to do with unusable markup")
+    parser.add_argument("--min-markup", type=int, default=1)
+    parser.add_argument("--min-length", type=int, default=0)
+    parser.add_argument("--max-length", type=int, default=None)
+    parser.add_argument("--sources", nargs="+", default=None, help="Only keep annotations from these SourceNames")
+    parser.add_argument("--db", default=None, help="Where to keep dedup state (default: a temporary file)")
+    args = parser.parse_args()
+
+    filters = Filters(
+        min_markup=args.min_markup,
+        min_length=args.min_length,
+        max_length=args.max_length,
+        sources=frozenset(args.sources) if args.sources else None,
+    )
+    counts = select(iter_store_records(args.store), args.out, filters, args.markup, args.db)
+    logger.info(f"Selected {counts.get('kept', 0)} sections into {args.out}: {counts}")
@@ -0,0 +1,182 @@
+import argparse
+import gzip
+import os
+import sqlite3
+import threading
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    heading TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    shard TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    UNIQUE (heading, page)
+);
+"""
+
+
+class ShardStore:
+    """
+    Append-only page store.
+
+    Every page is compressed as its own gzip member and appended to the current shard file, so a shard is a valid
+    gzip stream of concatenated pages while any single page can still be read back with one positioned read. A
+    SQLite index maps (heading, page) to (shard, offset, length).
+
+    Each writer appends to its own shards (named after `writer_id`), so several processes can share a store. Storing
+    a page again appends a new copy and repoints the index; the index `seq` only ever grows, which lets consumers
+    pick up new and replaced pages incrementally.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = "./data/shards",
+        writer_id: str | None = None,
+        max_shard_bytes: int = 256 * 1024 * 1024,
+        compresslevel: int = 6,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.writer_id = writer_id or uuid.uuid4().hex[:12]
+        self.max_shard_bytes = max_shard_bytes
+        self.compresslevel = compresslevel
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.root / "index.sqlite", isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(_SCHEMA)
+
+        self._shard_num = 0
+        self._shard_name: str | None = None
+        self._shard = None
+        self._read_fds: dict[str, int] = {}
+
+    def close(self) -> None:
+        with self.lock:
+            if self._shard is not None:
+                self._shard.flush()
+                os.fsync(self._shard.fileno())
+                self._shard.close()
+                self._shard = None
+            for fd in self._read_fds.values():
+                os.close(fd)
+            self._read_fds.clear()
+            self.conn.close()
+
+    def __enter__(self) -> "ShardStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _writable_shard(self):
+        if self._shard is not None and self._shard.tell() < self.max_shard_bytes:
+            return self._shard
+
+        if self._shard is not None:
+            self._shard.flush()
+            os.fsync(self._shard.fileno())
+            self._shard.close()
+
+        while True:
+            self._shard_num += 1
+            name = f"{self.writer_id}-{self._shard_num:05d}.jsonl.gz"
+            if not (self.root / name).exists():
+                break
+
+        self._shard_name = name
+        self._shard = open(self.root / name, "ab")  # noqa: SIM115
+        return self._shard
+
+    def put(self, heading: str, page: int, data: bytes) -> None:
+        """Appends a page to the current shard and (re)points the index at it"""
+        member = gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+        with self.lock:
+            shard = self._writable_shard()
+            offset = shard.tell()
+            shard.write(member)
+            shard.flush()
+            # The index is only updated once the data is written, so it never points at a partial member
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (heading, page, shard, offset, length) VALUES (?, ?, ?, ?, ?)",
+                (heading, page, self._shard_name, offset, len(member)),
+            )
+
+    def delete(self, heading: str, pages: list[int]) -> None:
+        """Drops pages from the index; their data stays in the shards like any other superseded copy"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM pages WHERE heading = ? AND page = ?", ((heading, p) for p in pages))
+
+    def contains(self, heading: str, page: int) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM pages WHERE heading = ? AND page = ?", (heading, page)).fetchone()
+        return row is not None
+
+    def get(self, heading: str, page: int) -> bytes:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT shard, offset, length FROM pages WHERE heading = ? AND page = ?", (heading, page)
+            ).fetchone()
+            if row is None:
+                raise KeyError((heading, page))
+            shard, offset, length = row
+            fd = self._read_fds.get(shard)
+            if fd is None:
+                fd = self._read_fds[shard] = os.open(self.root / shard, os.O_RDONLY)
+        return gzip.decompress(os.pread(fd, length, offset))
+
+    def pages(self, heading: str) -> list[int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT page FROM pages WHERE heading = ? ORDER BY page", (heading,)).fetchall()
+        return [page for (page,) in rows]
+
+    def last_seq(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(seq) FROM pages").fetchone()
+        return row[0] or 0
+
+    def iter_entries(self, since_seq: int = 0, batch_size: int = 1000) -> Iterator[tuple[int, str, int]]:
+        """Streams (seq, heading, page) for every page stored or replaced after `since_seq`, in seq order"""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT seq, heading, page FROM pages WHERE seq > ? ORDER BY seq LIMIT ?", (since_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            since_seq = rows[-1][0]
+
+
+def migrate_directory(source: str | Path, store: ShardStore) -> int:
+    """Imports a `{heading}/{page}.json` tree into the store, skipping pages it already holds"""
+    imported = 0
+    for heading_dir in sorted(Path(source).iterdir()):
+        if not heading_dir.is_dir():
+            continue
+
+        heading = heading_dir.name
+        for path in sorted(heading_dir.glob("*.json"), key=lambda p: p.stem):
+            if not path.stem.isdigit() or store.contains(heading, int(path.stem)):
+                continue
+            store.put(heading, int(path.stem), path.read_bytes())
+            imported += 1
+
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a directory of scraped pages into a shard store")
+    parser.add_argument("source", nargs="?", default="./data/scraped")
+    parser.add_argument("--root", default="./data/shards")
+    args = parser.parse_args()
+
+    with ShardStore(args.root, writer_id="migrate") as store:
+        print(f"Imported {migrate_directory(args.source, store)} pages into {args.root}")
@@ -0,0 +1,235 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+from collections.abc import Iterable, Iterator
+from functools import cache
+from itertools import islice
+from pathlib import Path
+
+from pubchem_scraper.augment import augment_batch
+from pubchem_scraper.corpus import iter_elements
+from pubchem_scraper.datatypes import Example, Molecule, merge_molecules
+from pubchem_scraper.dedup import Deduper, band_keys, content_digest, in_valid_split
+from pubchem_scraper.names import NameIndex, get_name_index
+from pubchem_scraper.pubchem_schema import SimpleElement, SimpleStringWithMarkup
+
+logger = logging.getLogger(__name__)
+
+ALIAS_TERMS = "compound|ligand|derivative|complex|pyrazole|amide|urea|hydroxyl|ketone|pyridazinone|piperazine|cyclohexyl|ester|acid|analog|conjugate|inhibitor"  # noqa: E501
+ALIASED_RE = re.compile(rf"^({ALIAS_TERMS})( ({ALIAS_TERMS}))? [1-9][0-9]?[a-z]?$")
+PARENTHETICAL_RE = re.compile(r"(.*) \((.*)\)")
+ALIAS_ID_RE = re.compile(r"\d+[a-z]?$")
+
+
+@cache
+def load_prompt(path: str = "./data/prompt.md") -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def is_aliased(name: str) -> bool:
+    return ALIASED_RE.match(name) is not None
+
+
+def create_ft_example(element: SimpleStringWithMarkup, prompt: str | None = None) -> Example:
+    string = element.string
+
+    mols = []
+    for markup in element.markup:
+        name = markup.comp_hit(string)
+        m = PARENTHETICAL_RE.match(name)
+        if m:
+            name, anything = m.groups()
+            anything = [anything]
+        else:
+            anything = []
+
+        if is_aliased(name):
+            anything.append(ALIAS_ID_RE.search(name).group(0))  # type: ignore
+
+        mols.append(Molecule(name=name, alternatives=anything))
+
+    mols = merge_molecules(mols)
+    return Example(
+        sys_prompt=prompt if prompt is not None else load_prompt(),
+        user_prompt=string,
+        response=json.dumps([m.model_dump() for m in mols], separators=(",", ":")),
+    )
+
+
+def to_conversation(example: Example) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": example.sys_prompt},
+            {"role": "user", "content": example.user_prompt},
+            {"role": "assistant", "content": example.response},
+        ]
+    }
+
+
+def read_elements(path: str | Path) -> Iterator[SimpleElement]:
+    """Streams elements from a corpus dataset directory, a JSONL file, or a legacy `selected.json` list"""
+    path = Path(path)
+    if path.is_dir():
+        yield from iter_elements(path)
+    elif path.suffix == ".jsonl":
+        with open(path) as f:
+            for line in f:
+                yield SimpleElement.model_validate_json(line)
+    else:
+        with open(path) as f:
+            for x in json.load(f):
+                yield SimpleElement.model_validate(x)
+
+
+_prompt: str | None = None
+_names: NameIndex | None = None
+
+
+def _init_worker(prompt: str | None, names: NameIndex) -> None:
+    global _prompt, _names
+    _prompt = prompt
+    _names = names
+
+
+def _examples_for_chunk(args: tuple[list[SimpleElement], int, int]) -> list[tuple[int, list[int], list[str]]]:
+    """
+    Per element of the chunk: the content digest and LSH band keys of its text, and the JSON lines of its original
+    and augmented conversation
+    """
+    chunk, seed, n = args
+    strings = [element.string for element in chunk]
+
+    # Strings without markup have nothing to augment and are passed through as-is
+    augmented = iter(augment_batch([s for s in strings if s.markup], n=n, seed=seed, names=_names))
+
+    results = []
+    for string in strings:
+        lines = [
+            json.dumps(to_conversation(create_ft_example(variant, _prompt)))
+            for variant in (string, next(augmented) if string.markup else string)
+        ]
+        results.append((content_digest(string.string), band_keys(string.string), lines))
+    return results
+
+
+class ShardWriter:
+    """Writes JSONL lines to `{prefix}-00000.jsonl`, `{prefix}-00001.jsonl`, ..., `shard_size` lines per file"""
+
+    def __init__(self, out_dir: Path, prefix: str, shard_size: int):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.count = 0
+        self._file = None
+
+    def write(self, line: str) -> None:
+        if self.count % self.shard_size == 0:
+            self.close()
+            self._file = open(self.out_dir / f"{self.prefix}-{self.count // self.shard_size:05d}.jsonl", "w")  # noqa: SIM115
+        self._file.write(line + "\n")  # type: ignore
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def generate(
+    elements: Iterable[SimpleElement],
+    out_dir: str | Path = "./data/training",
+    seed: int = 0,
+    n: int = 2,
+    valid_fraction: float = 0.2,
+    shard_size: int = 100_000,
+    chunk_size: int = 512,
+    processes: int | None = None,
+    prompt: str | None = None,
+    dedup_path: str | Path | None = None,
+    names: NameIndex | None = None,
+) -> dict[str, int]:
+    """
+    Turns elements into fine-tuning conversations, one as-is and one augmented (`n` edits) per element.
+
+    Elements are streamed to a pool of worker processes in chunks and the resulting conversations are written to
+    train/valid JSONL shards as they come back, in input order. `prompt` defaults to `data/prompt.md`, and `names` (the
+    replacement names augmentation draws from) to the index over the Parquet tables in `data/`.
+
+    Exact duplicate conversations are dropped. Source texts are clustered by MinHash-LSH similarity and each cluster
+    goes wholly to one split, together with the augmentations of its members. Augmentation is seeded per element and
+    clustering follows input order, so the output does not depend on the number of processes or the chunk size. The
+    dedup state is kept in SQLite at `dedup_path` (a temporary file by default).
+
+    Returns the number of conversations written per split and the number of duplicates dropped.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writers = {split: ShardWriter(out_dir, split, shard_size) for split in ("train", "valid")}
+    duplicates = 0
+
+    # Workers look names up in the memory-mapped index; it is built here so they do not all race to build it
+    names = names or get_name_index()
+    names.ensure_built()
+
+    iterator = iter(elements)
+    chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+
+    # Spawned, not forked: the parent has used polars by now, and forked children would deadlock in its thread pool
+    context = multiprocessing.get_context("spawn")
+    with (
+        Deduper(dedup_path) as deduper,
+        context.Pool(processes or os.cpu_count(), initializer=_init_worker, initargs=(prompt, names)) as pool,
+    ):
+        for results in pool.imap(_examples_for_chunk, ((chunk, seed, n) for chunk in chunks)):
+            for digest, keys, lines in results:
+                cluster = deduper.cluster(digest, keys)
+                split = "valid" if in_valid_split(cluster, seed, valid_fraction) else "train"
+                for line in lines:
+                    if deduper.is_new(content_digest(line)):
+                        writers[split].write(line)
+                    else:
+                        duplicates += 1
+            deduper.flush()
+
+    for writer in writers.values():
+        writer.close()
+    return {split: writer.count for split, writer in writers.items()} | {"duplicates": duplicates}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Generate train/valid conversation shards from corpus elements")
+    parser.add_argument("--input", default="./data/corpus", help="Corpus dataset directory, .jsonl or .json file")
+    parser.add_argument("--out", default="./data/training")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--augment-n", type=int, default=2)
+    parser.add_argument("--valid-fraction", type=float, default=0.2)
+    parser.add_argument("--shard-size", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--prompt", default="./data/prompt.md", help="System prompt file")
+    parser.add_argument("--dedup-db", default=None, help="Where to keep dedup state (default: a temporary file)")
+    parser.add_argument("--iupac", default="./data/iupac_subset.parquet", help="IUPAC names for augmentation")
+    parser.add_argument("--synonyms", default="./data/synonyms_subset.parquet", help="Synonyms for augmentation")
+    parser.add_argument("--name-index", default="./data/name_index", help="Where to keep the index over both tables")
+    args = parser.parse_args()
+
+    counts = generate(
+        read_elements(args.input),
+        out_dir=args.out,
+        seed=args.seed,
+        n=args.augment_n,
+        valid_fraction=args.valid_fraction,
+        shard_size=args.shard_size,
+        chunk_size=args.chunk_size,
+        processes=args.processes,
+        prompt=load_prompt(args.prompt),
+        dedup_path=args.dedup_db,
+        names=NameIndex(args.iupac, args.synonyms, args.name_index),
+    )
+    logger.info(f"Wrote {counts} conversations to {args.out}")
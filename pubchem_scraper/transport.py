@@ -0,0 +1,193 @@
+"""
+The scraper's HTTP transport: a keep-alive connection pool per proxy, and compressed transfers.
+
+Every proxy gets a ClientSession of its own, whose connector keeps up to `pool_size` connections to it open between
+requests. A request through a proxy thus reuses one of that proxy's idle connections (and with it the TCP, CONNECT and
+TLS handshakes) instead of competing with all other proxies for a single shared pool. Sessions are created on a
+proxy's first request and closed with the transport, or by `discard` once the proxy is out of the proxy list and has
+no requests left in flight, so a long run with a rotating proxy list does not keep the connections of every proxy it
+ever used.
+
+Pages are requested gzip compressed, or brotli compressed when the optional `brotli` package (1.2 or later, which can
+cap a decoder's output) is installed, and are decoded chunk by chunk as they arrive, which tells both how many bytes
+crossed the wire and how large the page is. A compressed body that ends before its compressed stream does is reported
+as a payload error, like a connection that broke off. How many requests got a new connection and how many reused one
+is counted per proxy in the metrics.
+
+Bodies are read into memory, since the writer parses each page whole and stores it as one gzip member. A body that
+decodes to more than `max_body_size` bytes (a generous multiple of the largest PubChem pages, about 12 MB) is given
+up on as soon as it gets there with BodyTooLarge, so a runaway or decompression-bomb response cannot exhaust memory:
+the scraper holds at most one body per worker. Such a page is not retried, as it would be as large through any proxy.
+"""
+
+import asyncio
+import zlib
+from types import SimpleNamespace
+from typing import NamedTuple
+
+import aiohttp
+
+from pubchem_scraper.metrics import ScrapeMetrics
+
+try:
+    import brotli
+
+    # Before 1.2 the decoder cannot cap its output, and a few bytes of input can decode to many megabytes
+    brotli.Decompressor().process(b"", output_buffer_limit=1)
+except (ImportError, TypeError):
+    brotli = None
+
+ACCEPT_ENCODING = "br, gzip" if brotli is not None else "gzip"
+_DECODE_ERRORS = (zlib.error, brotli.error) if brotli is not None else (zlib.error,)
+
+
+# Decoded bytes per response before it is given up on
+MAX_BODY_SIZE = 64 << 20
+
+
+class BodyTooLarge(Exception):
+    """A response body decodes to more than the allowed size"""
+
+
+class Body(NamedTuple):
+    data: bytes
+    wire_size: int
+    """Bytes received, before decoding"""
+
+
+class _Decoder:
+    """Incremental decoder for one Content-Encoding"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._brotli = None
+        if encoding in ("gzip", "x-gzip"):
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        elif encoding == "br" and brotli is not None:
+            self._brotli = brotli.Decompressor()
+        else:
+            raise aiohttp.ClientPayloadError(f"Unsupported Content-Encoding {encoding!r}")
+
+    def decompress(self, chunk: bytes, max_length: int = 0) -> bytes:
+        """
+        Decoded `chunk`, cut off once it reaches `max_length` bytes (0: no limit), after which the decoder must not be
+        used any more
+        """
+        try:
+            if self._brotli is not None:
+                return self._brotli.process(chunk, output_buffer_limit=max_length)
+            return self._zlib.decompress(chunk, max_length)
+        except _DECODE_ERRORS as e:
+            raise aiohttp.ClientPayloadError(f"Corrupt {self.encoding} body: {e}") from e
+
+    def finish(self) -> bytes:
+        """The rest of the body; raises if the compressed stream was cut short"""
+        if self._brotli is not None:
+            complete, tail = self._brotli.is_finished(), b""
+        else:
+            tail = self._zlib.flush()
+            complete = self._zlib.eof
+        if not complete:
+            raise aiohttp.ClientPayloadError(f"The {self.encoding} body ended early")
+        return tail
+
+
+async def read_body(response: aiohttp.ClientResponse, max_size: int = MAX_BODY_SIZE, chunk_size: int = 1 << 16) -> Body:
+    """
+    Reads and decodes a response of a session with `auto_decompress=False`, raising BodyTooLarge as soon as it is
+    known to decode to more than `max_size` bytes
+    """
+    encoding = response.headers.get("Content-Encoding", "identity").strip().lower()
+    decoder = None if encoding == "identity" else _Decoder(encoding)
+    if decoder is None and response.content_length is not None and response.content_length > max_size:
+        raise BodyTooLarge(f"Body of {response.content_length} bytes exceeds {max_size}")
+
+    parts = []
+    size = 0
+    wire_size = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        wire_size += len(chunk)
+        parts.append(decoder.decompress(chunk, max_size - size + 1) if decoder else chunk)
+        size += len(parts[-1])
+        if size > max_size:
+            raise BodyTooLarge(f"Body exceeds {max_size} bytes")
+    if decoder:
+        parts.append(decoder.finish())
+        if size + len(parts[-1]) > max_size:
+            raise BodyTooLarge(f"Body exceeds {max_size} bytes")
+    return Body(b"".join(parts), wire_size)
+
+
+class Transport:
+    """
+    One pooled ClientSession per proxy.
+
+    `pool_size` should be at least the number of requests allowed in flight on a proxy, so that requests never wait
+    for a connection of their own proxy's pool. `max_body_size` is what `read_body` should allow.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 8,
+        timeout: aiohttp.ClientTimeout | None = None,
+        keepalive_timeout: float = 60.0,
+        metrics: ScrapeMetrics | None = None,
+        max_body_size: int = MAX_BODY_SIZE,
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout or aiohttp.ClientTimeout(total=30)
+        self.keepalive_timeout = keepalive_timeout
+        self.metrics = metrics
+        self.max_body_size = max_body_size
+        self.sessions: dict[str, aiohttp.ClientSession] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    def session(self, proxy: str) -> aiohttp.ClientSession:
+        session = self.sessions.get(proxy)
+        if session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            session = self.sessions[proxy] = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=connector,
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                auto_decompress=False,
+                trace_configs=[_connection_trace(proxy, self.metrics)] if self.metrics else None,
+            )
+        return session
+
+    def discard(self, proxy: str) -> None:
+        """Closes the session of a proxy that gets no more requests, in the background"""
+        session = self.sessions.pop(proxy, None)
+        if session is not None:
+            task = asyncio.create_task(session.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def close(self) -> None:
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+        await asyncio.gather(*self._closing)
+
+    async def __aenter__(self) -> "Transport":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+def _connection_trace(proxy: str, metrics: ScrapeMetrics) -> aiohttp.TraceConfig:
+    """Counts the requests through `proxy` that opened a new connection and those that reused an idle one"""
+
+    async def created(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+        metrics.connection(proxy, reused=False)
+
+    async def reused(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+        metrics.connection(proxy, reused=True)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(created)
+    trace.on_connection_reuseconn.append(reused)
+    return trace
@@ -0,0 +1,86 @@
+"""
+The scraper's write stage: validates downloaded pages and commits them to the shard store off the event loop.
+
+A page is only stored once it parses as JSON with an `Annotations` object for the requested page, so a truncated
+body or a proxy's error page answered with a 200 is retried instead of being marked done. Committing is atomic
+through the store: a page is appended as one complete gzip member and only then indexed, so a crash mid-write leaves
+an unindexed tail that no reader ever sees.
+
+Pages are handled as whole bodies in memory rather than streamed through temp files: validating one means parsing
+it whole, and the store compresses it into a single member. Their size is bounded by the transport (see
+`pubchem_scraper.transport.MAX_BODY_SIZE`).
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from pubchem_scraper.refresh import ADDED, CHANGED, UNCHANGED, content_hash
+from pubchem_scraper.storage import ShardStore
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+class StoredPage(NamedTuple):
+    outcome: str
+    """ADDED, CHANGED or UNCHANGED (see `pubchem_scraper.refresh`)"""
+    digest: str | None
+    total_pages: int | None
+    """TotalPages of the page, None if it was not downloaded again (a 304)"""
+
+
+NOT_MODIFIED = StoredPage(UNCHANGED, None, None)
+
+
+def validate_page(body: bytes, page: int) -> int:
+    """Checks that `body` is a complete PUG-View annotations page numbered `page`; returns its TotalPages"""
+    try:
+        data = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise InvalidPage(f"Not JSON ({len(body)} bytes): {e}") from e
+
+    annotations = data.get("Annotations") if isinstance(data, dict) else None
+    if not isinstance(annotations, dict) or not isinstance(annotations.get("Annotation"), list):
+        raise InvalidPage("No Annotations.Annotation list")
+    if annotations.get("Page") != page:
+        raise InvalidPage(f"Annotations.Page is {annotations.get('Page')!r}, expected {page}")
+    if not isinstance(annotations.get("TotalPages"), int):
+        raise InvalidPage("No Annotations.TotalPages")
+    return annotations["TotalPages"]
+
+
+class PageWriter:
+    """
+    Runs validation, hashing and storing of pages on a small thread pool of its own.
+
+    A page is rewritten only if its content hash differs from `stored_hash` (or, for pages stored before hashes were
+    kept, from the stored copy).
+    """
+
+    def __init__(self, store: ShardStore, max_workers: int = 4):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="page-writer")
+
+    async def write(self, heading: str, page: int, body: bytes, stored_hash: str | None) -> StoredPage:
+        """Raises InvalidPage, without storing anything, if the body is not a complete page"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._write, heading, page, body, stored_hash)
+
+    def _write(self, heading: str, page: int, body: bytes, stored_hash: str | None) -> StoredPage:
+        total_pages = validate_page(body, page)
+        digest = content_hash(body)
+
+        if stored_hash is None and self.store.contains(heading, page):
+            stored_hash = content_hash(self.store.get(heading, page))
+        if digest == stored_hash:
+            return StoredPage(UNCHANGED, digest, total_pages)
+
+        self.store.put(heading, page, body)
+        return StoredPage(ADDED if stored_hash is None else CHANGED, digest, total_pages)
+
+    def close(self) -> None:
+        """Waits for pending writes"""
+        self.executor.shutdown(wait=True)
@@ -1,127 +1,547 @@
+import argparse
 import asyncio
 import json
 import logging
-from collections.abc import Sequence
-from itertools import cycle
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from functools import partial
 from pathlib import Path
+from typing import NamedTuple
 from urllib.parse import quote
 
-import aiofiles
 import aiohttp
 
-logging.basicConfig(level=logging.DEBUG)
+from pubchem_scraper.leases import Leases, split_proxies
+from pubchem_scraper.manifest import Manifest, ManifestWriter, backoff_delay
+from pubchem_scraper.metrics import MetricsReporter, ScrapeMetrics
+from pubchem_scraper.proxies import ProxyPool, read_proxies
+from pubchem_scraper.ratelimit import THROTTLE_STATUSES, RateLimiter, parse_retry_after
+from pubchem_scraper.refresh import ALL, MODES, UNCHANGED, ChangeReport, conditional_headers
+from pubchem_scraper.scheduler import SMALLEST_FIRST, PageScheduler
+from pubchem_scraper.storage import ShardStore
+from pubchem_scraper.transport import MAX_BODY_SIZE, BodyTooLarge, Transport, read_body
+from pubchem_scraper.writer import NOT_MODIFIED, InvalidPage, PageWriter, StoredPage
+
 logger = logging.getLogger(__name__)
 
+BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/annotations/heading"
+
+# Client errors that say more about the proxy (its credentials or its IP being banned) than about the page
+PROXY_FAULT_STATUSES = frozenset({403, 407})
+
 
-class ProxyRotator:
-    def __init__(self, proxies: Sequence[str]):
-        self.proxy_cycle = cycle(proxies)
+class PageError(Exception):
+    def __init__(self, message: str, retryable: bool = True, proxy_fault: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.proxy_fault = proxy_fault
 
-    def get_next(self) -> str:
-        return next(self.proxy_cycle)
 
+class Fetched(NamedTuple):
+    body: bytes | None
+    """None when the server answered 304 Not Modified"""
+    etag: str | None
+    last_modified: str | None
+    elapsed: float
+    """Seconds from sending the request to having read the body"""
 
-async def download_page(
-    session: aiohttp.ClientSession,
+
+async def fetch_page(
+    transport: Transport,
     url: str,
-    heading: str,
-    page: int,
-    proxy_rotator: ProxyRotator,
-    semaphore: asyncio.Semaphore,
-) -> str | None:
-    """Downloads a single page using the next proxy in rotation with concurrency control"""
-    opath = Path(f"./data/scraped/{heading}/{page}.json")
-    opath.parent.mkdir(parents=True, exist_ok=True)
-
-    if opath.exists():
-        logger.info(f"Skipping {heading} page {page} as it already exists")
-        async with aiofiles.open(opath) as f:
-            return await f.read()
-
-    async with semaphore:  # Control concurrency
-        try:
-            proxy = proxy_rotator.get_next()
-            async with session.get(url, proxy=proxy) as response:
-                if response.status != 200:
-                    logger.error(f"Error {response.status} for {url} using proxy {proxy}")
-                    return None
+    proxy: str,
+    rate_limiter: RateLimiter,
+    metrics: ScrapeMetrics,
+    headers: dict[str, str] | None = None,
+) -> Fetched:
+    """
+    Makes a single attempt at downloading a page through `proxy`, raising PageError on failure.
 
-                text = await response.text()
-                opath.parent.mkdir(parents=True, exist_ok=True)
-                opath.write_text(text)
+    With conditional `headers` (see `conditional_headers`) an unchanged page comes back as a body of None. Errors
+    that are likely the proxy's fault rather than the server's are flagged as such (`PageError.proxy_fault`).
+    """
+    await rate_limiter.acquire(proxy)  # Pace per proxy and globally
 
-                logger.info(f"Downloaded {heading} page {page}")
-                await asyncio.sleep(4.0)  # Keep existing delay
-                return text
+    metrics.request_started()
+    start = time.perf_counter()
+    status = "unknown"
+    body = b""
+    wire_size = 0
+    try:
+        async with transport.session(proxy).get(url, proxy=proxy, headers=headers) as response:
+            status = str(response.status)
+            rate_limiter.record(proxy, response.status, parse_retry_after(response.headers.get("Retry-After")))
+            validators = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            if response.status == 304:
+                return Fetched(None, *validators, time.perf_counter() - start)
+            if response.status != 200:
+                # Client errors other than throttling will not go away by retrying, unless the proxy caused them.
+                # Server errors count against the proxy too: random ones hit all proxies alike, which leaves their
+                # weighting as it was, while a proxy that keeps getting them is usually the cause.
+                throttled = response.status in THROTTLE_STATUSES
+                proxy_fault = response.status in PROXY_FAULT_STATUSES or (response.status >= 500 and not throttled)
+                retryable = throttled or proxy_fault
+                raise PageError(f"HTTP {response.status} using proxy {proxy}", retryable, proxy_fault)
 
-        except Exception as e:
-            logger.error(f"Error downloading {url}: {str(e)}")
-            return None
+            body, wire_size = await read_body(response, transport.max_body_size)
+    except BodyTooLarge as e:
+        # The page is this large through any proxy
+        status = type(e).__name__
+        raise PageError(f"{e} using proxy {proxy}", retryable=False) from e
+    except (asyncio.TimeoutError, aiohttp.ClientError) as e:  # Not the builtin TimeoutError before Python 3.11
+        status = type(e).__name__
+        raise PageError(f"{type(e).__name__}: {e} using proxy {proxy}", proxy_fault=True) from e
+    finally:
+        metrics.request_finished(proxy, status, time.perf_counter() - start, len(body), wire_size)
 
+    return Fetched(body, *validators, time.perf_counter() - start)
 
-async def download_pubchem_heading(
-    heading: str, session: aiohttp.ClientSession, proxy_rotator: ProxyRotator, semaphore: asyncio.Semaphore
-) -> None:
-    """Downloads all pages for a given PubChem heading asynchronously"""
-    base_url = "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/annotations/heading"
+
+@dataclass
+class ScrapeContext:
+    """Shared state handed to every worker"""
+
+    transport: Transport
+    proxy_pool: ProxyPool
+    semaphore: asyncio.Semaphore
+    rate_limiter: RateLimiter
+    manifest: Manifest
+    manifest_writer: ManifestWriter
+    """Per-page updates of `manifest`, made off the event loop"""
+    store: ShardStore
+    writer: PageWriter
+    metrics: ScrapeMetrics
+    max_attempts: int = 5
+    base_url: str = BASE_URL
+    changes: ChangeReport = field(default_factory=ChangeReport)
+
+
+def page_url(heading: str, page: int, base_url: str = BASE_URL) -> str:
     encoded_heading = quote(heading, safe="")
+    if page == 1:
+        return f"{base_url}/{encoded_heading}/JSON?heading_type=Compound"
+    return f"{base_url}/{encoded_heading}/JSON?page={page}&heading_type=Compound"
 
-    # Get first page and total pages
-    url = f"{base_url}/{encoded_heading}/JSON?heading_type=Compound"
-    text = await download_page(session, url, heading, 1, proxy_rotator, semaphore)
 
-    if not text:
-        logger.error(f"Failed to get first page for {heading}")
-        return
+async def download_page(ctx: ScrapeContext, heading: str, page: int) -> StoredPage | None:
+    """
+    Downloads a single page, retrying with jittered exponential backoff and a different proxy on each attempt.
+
+    Bodies that are not a complete page are retried like failed requests. Every attempt's outcome is reported to the
+    proxy pool, so failing proxies get less work. Pages downloaded before are requested
+    conditionally, and are only written to the store again if their content hash differs (see `PageWriter`).
+    Returns what was stored, or None if the page failed.
+
+    Every outcome is recorded in the manifest (off the event loop, see `ManifestWriter`), so pages that exhaust their
+    retries are picked up by the next run.
+    """
+    url = page_url(heading, page, ctx.base_url)
+    start = time.perf_counter()
+    etag, last_modified, stored_hash = await ctx.manifest_writer.validators(heading, page)
+    headers = conditional_headers(etag, last_modified)
+
+    proxy = None
+    for attempt in range(1, ctx.max_attempts + 1):
+        try:
+            async with ctx.semaphore:  # A request slot overall, then one on a proxy with room
+                proxy = await ctx.proxy_pool.acquire(avoid=proxy)
+                try:
+                    fetched = await fetch_page(ctx.transport, url, proxy, ctx.rate_limiter, ctx.metrics, headers)
+                finally:
+                    await ctx.proxy_pool.release(proxy)
+
+            stored = NOT_MODIFIED
+            if fetched.body is not None:
+                try:
+                    stored = await ctx.writer.write(heading, page, fetched.body, stored_hash)
+                except InvalidPage as e:
+                    # Most likely a body cut short, or an error page of the proxy's own
+                    raise PageError(f"Invalid page using proxy {proxy}: {e}", proxy_fault=True) from e
+            ctx.proxy_pool.record_success(proxy, fetched.elapsed)
+        except PageError as e:
+            if e.proxy_fault and proxy is not None:
+                ctx.proxy_pool.record_failure(proxy)
+            if not e.retryable or attempt == ctx.max_attempts:
+                logger.error(f"Giving up on {heading} page {page} after {attempt} attempts: {e}")
+                await ctx.manifest_writer.mark_failed(heading, page, str(e))
+                ctx.metrics.page_failed()
+                return None
 
+            # Per-page messages use lazy formatting, so they cost nothing unless debug logging is on
+            logger.debug("Attempt %d for %s page %d failed: %s", attempt, heading, page, e)
+            await ctx.manifest_writer.record_attempt(heading, page, str(e))
+            ctx.metrics.retry()
+            await asyncio.sleep(backoff_delay(attempt))  # Back off without holding a request or proxy slot
+            continue
+
+        await ctx.manifest_writer.mark_done(heading, page, fetched.etag, fetched.last_modified, stored.digest)
+        ctx.changes.page(heading, page, stored.outcome)
+        ctx.metrics.page_done(heading, time.perf_counter() - start)
+        logger.debug("Downloaded %s page %d (%s)", heading, page, stored.outcome)
+        return stored
+
+    return None
+
+
+async def worker(ctx: ScrapeContext, queue: asyncio.Queue[tuple[str, int]]) -> None:
+    """Downloads pages from the queue until cancelled, keeping no page body around once it is persisted"""
+    while True:
+        heading, page = await queue.get()
+        try:
+            await process_page(ctx, heading, page)
+        finally:
+            queue.task_done()
+
+
+async def process_page(ctx: ScrapeContext, heading: str, page: int) -> None:
     try:
-        data = json.loads(text)
-        total_pages = data["Annotations"]["TotalPages"]
-    except (json.JSONDecodeError, KeyError) as e:
-        logger.error(f"Error parsing response for {heading}: {str(e)}")
+        stored = await download_page(ctx, heading, page)
+        # An unchanged first page still has its count recorded if a run died between storing it and doing so
+        if (
+            stored
+            and stored.total_pages is not None
+            and page == 1
+            and (stored.outcome != UNCHANGED or ctx.manifest.total_pages(heading) is None)
+        ):
+            record_total_pages(ctx, heading, stored.total_pages)
+    except Exception as e:
+        logger.error(f"Error downloading page {page} of {heading}: {str(e)}")
+
+
+def record_total_pages(ctx: ScrapeContext, heading: str, total_pages: int) -> None:
+    """
+    Registers the page count from a newly stored first page.
+
+    If the heading was scraped before, annotations may have been added or removed anywhere, shifting every later
+    page: those are all marked for a (conditional) re-check, and pages beyond a shrunken page count are dropped.
+    """
+    old_total = ctx.manifest.total_pages(heading)
+    removed = ctx.manifest.set_total_pages(heading, total_pages)
+    if old_total is None:
         return
 
-    # Create tasks for remaining pages
-    tasks = []
-    for page in range(2, total_pages + 1):
-        url = f"{base_url}/{encoded_heading}/JSON?page={page}&heading_type=Compound"
-        tasks.append(download_page(session, url, heading, page, proxy_rotator, semaphore))
+    stale = ctx.manifest.mark_stale(heading, 2)
+    if removed:
+        ctx.store.delete(heading, removed)
+    if removed or old_total != total_pages:
+        ctx.changes.resized(heading, old_total, total_pages, removed)
+    logger.info(f"{heading} changed ({old_total} -> {total_pages} pages), re-checking {stale} pages")
+
+
+async def produce(
+    headings: list[str],
+    manifest: Manifest,
+    queue: asyncio.Queue[tuple[str, int]],
+    policy: str = SMALLEST_FIRST,
+    priorities: dict[str, float] | None = None,
+    refresh: str | None = None,
+) -> None:
+    """
+    Feeds outstanding pages into the bounded queue.
+
+    The first page of every heading whose page count is unknown (or of every heading, when refreshing) is fetched up
+    front, so `TotalPages` is known for all headings before any other page is queued. The remaining pages are then
+    dispatched across headings in the order given by `policy` (see `PageScheduler`), streamed out of the manifest so
+    nothing proportional to the corpus size is ever held in memory.
+    """
+    for heading in headings:
+        if refresh or manifest.total_pages(heading) is None:
+            if refresh == ALL:
+                manifest.mark_stale(heading, 2)
+            await queue.put((heading, 1))
+    await queue.join()
+
+    wanted = [heading for heading in headings if manifest.total_pages(heading) is not None]
+    for heading, page in PageScheduler(manifest, wanted, policy, priorities):
+        await queue.put((heading, page))
+    await queue.join()
+
 
-    # Wait for all pages to download
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+async def produce_leased(
+    ctx: ScrapeContext,
+    leases: Leases,
+    headings: list[str],
+    target_pages: int,
+    poll_interval: float = 1.0,
+) -> None:
+    """
+    Downloads chunks of pages leased from the manifest until no chunk is left, for running several processes at once.
+
+    Chunks are leased as long as fewer than `target_pages` pages are in progress, and leases are renewed in the
+    background. Chunks leased by other processes are waited for, and taken over should their lease expire. When
+    refreshing, the pages to re-check must have been marked once for all processes beforehand (see
+    `mark_for_refresh`); marking them here would undo the checks of the processes that started earlier.
+    """
+    leases.add_headings(headings)
+    leases.reopen()
+
+    in_progress = 0
+
+    async def run_lease(heading: str, chunk: int) -> None:
+        nonlocal in_progress
+        attempted: set[int] = set()
+        while pages := [page for page in leases.outstanding_pages(heading, chunk) if page not in attempted]:
+            attempted.update(pages)
+            in_progress += len(pages)
+            try:
+                await asyncio.gather(*(process_page(ctx, heading, page) for page in pages))
+            finally:
+                in_progress -= len(pages)
+            if chunk == 0:  # Page 1 tells how many chunks there are, and may have made later pages stale
+                leases.add_headings([heading])
+                leases.reopen(heading)
+        if not leases.finish(heading, chunk):
+            logger.warning(f"Lost the lease on chunk {chunk} of {heading} to another process")
+
+    async def renew() -> None:
+        while True:
+            await asyncio.sleep(leases.lease_seconds / 3)
+            leases.renew()
+
+    running: set[asyncio.Task] = set()
+    ctx.metrics.add_gauge("leases", lambda: len(running))
+    renewer = asyncio.create_task(renew())
+    try:
+        while True:
+            while in_progress < target_pages and (lease := leases.acquire()):
+                running.add(asyncio.create_task(run_lease(*lease)))
+                await asyncio.sleep(0)  # Let it count its pages
+
+            if not running:
+                if not leases.unfinished():
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+
+            done, running = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+    finally:
+        for task in (renewer, *running):
+            task.cancel()
+        await asyncio.gather(renewer, *running, return_exceptions=True)
+
+
+@dataclass
+class ScrapeConfig:
+    """Knobs of a scraper run; the modules named below explain the machinery behind them"""
+
+    max_concurrent: int = 10
+    """Requests in flight at once, across all proxies"""
+    num_workers: int | None = None
+    """
+    Workers taking pages off the queue, by default twice `max_concurrent` so that workers sleeping off a retry
+    backoff don't leave request slots idle
+    """
+    global_rate: float | None = 20.0
+    """Token bucket rate in requests per second over all proxies, None for no limit; backs off on 429/503"""
+    per_proxy_rate: float | None = 4.0
+    """Token bucket rate in requests per second through each proxy, None for no limit; backs off on 429/503"""
+    per_proxy_concurrency: int | None = None
+    """Requests in flight through each proxy, None for no cap beyond `max_concurrent` (see `pubchem_scraper.proxies`)"""
+    max_attempts: int = 5
+    request_timeout: float = 30.0
+    """Seconds"""
+    limit_per_host: int = 30
+    """Keep-alive connections per proxy when `per_proxy_concurrency` is not set (see `pubchem_scraper.transport`)"""
+    max_body_size: int = MAX_BODY_SIZE
+    """Decoded bytes of a response before the page is given up on without retrying"""
+    base_url: str = BASE_URL
+    """PUG-View endpoint, e.g. the local stand-in in `benchmarks.fake_pugview`"""
+
+    manifest_path: str | Path = "./data/manifest.sqlite"
+    """Progress of the scrape; rerunning only schedules pages that are not done yet"""
+    store_root: str | Path = "./data/shards"
+    """Shard store the pages are appended to (see `python -m pubchem_scraper.storage` to import `data/scraped`)"""
+    proxies_path: str | Path | None = None
+    """File the proxy list is reloaded from whenever it changes"""
+
+    policy: str = SMALLEST_FIRST
+    """Order of pages across headings (see `pubchem_scraper.scheduler`)"""
+    priorities: dict[str, float] | None = None
+    """Per heading for the "priority" policy, higher first"""
+    refresh: str | None = None
+    """Re-check pages that are already done, "probe" or "all" (see `pubchem_scraper.refresh`)"""
+    changes_path: str | Path | None = "./data/changes.jsonl"
+    """JSON lines file the run's `ChangeReport` is appended to"""
+
+    metrics_path: str | Path | None = "./data/metrics.json"
+    """Where a metrics snapshot is written every `progress_interval` seconds (see `pubchem_scraper.metrics`)"""
+    metrics_port: int | None = None
+    """Port serving the snapshot at `http://127.0.0.1:{metrics_port}/metrics`"""
+    progress_interval: float = 10.0
+
+    partition: tuple[int, int] | None = None
+    """(index, count) of this process among `count` sharing the manifest and store (see `pubchem_scraper.leases`)"""
+    lease_seconds: float = 120.0
+
+    def for_partition(self) -> "ScrapeConfig":
+        """This config with the global rate split evenly and the partition index added to the metrics file and port"""
+        if not self.partition:
+            return self
+        index, count = self.partition
+        return replace(
+            self,
+            global_rate=self.global_rate / count if self.global_rate else self.global_rate,
+            metrics_path=Path(self.metrics_path).with_stem(f"{Path(self.metrics_path).stem}-{index}")
+            if self.metrics_path
+            else None,
+            metrics_port=self.metrics_port + index if self.metrics_port is not None else None,
+        )
 
-    # Log any exceptions that occurred
-    for i, result in enumerate(results, start=2):
-        if isinstance(result, Exception):
-            logger.error(f"Error downloading page {i} of {heading}: {str(result)}")
 
+async def main(headings: list[str], proxies: list[str], config: ScrapeConfig | None = None) -> None:
+    """
+    Downloads the pages of `headings` through rotating `proxies`, keeping progress in the manifest.
 
-async def main(headings: list[str], proxies: list[str], max_concurrent: int = 10) -> None:
-    """Downloads multiple headings in parallel using rotating proxies with concurrency limit"""
-    proxy_rotator = ProxyRotator(proxies)
-    semaphore = asyncio.Semaphore(max_concurrent)
+    With `config.partition` set, work is handed out in leased chunks of pages instead of by `config.policy`, and only
+    this partition's share of `proxies` is used.
+    """
+    config = (config or ScrapeConfig()).for_partition()
+    refresh = config.refresh
+    if refresh is not None and refresh not in MODES:
+        raise ValueError(f"Unknown refresh mode {refresh!r}, expected one of {', '.join(MODES)}")
 
-    timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
-    connector = aiohttp.TCPConnector(limit_per_host=30)
+    select_proxies = None
+    if config.partition:
+        index, count = config.partition
+        select_proxies = partial(split_proxies, index=index, count=count)
+        proxies = select_proxies(proxies)
 
-    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-        tasks = [download_pubchem_heading(heading, session, proxy_rotator, semaphore) for heading in headings]
-        await asyncio.gather(*tasks)
+    store = ShardStore(config.store_root)
+    writer = PageWriter(store)
+    manifest = Manifest(config.manifest_path)
+    if manifest.is_new:
+        manifest.import_store(store, headings)
+    manifest_writer = ManifestWriter(config.manifest_path)
+    leases = Leases(manifest, lease_seconds=config.lease_seconds) if config.partition else None
 
+    num_workers = config.num_workers or 2 * config.max_concurrent
+    queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue(maxsize=2 * num_workers)
 
-def read_proxies(file_path: str) -> list[str]:
-    with open(file_path) as f:
-        return [
-            f"http://{user}:{password}@{ip}:{port}"
-            for ip, port, user, password in (line.strip().split(":") for line in f if line.strip())
-        ]
+    proxy_pool = ProxyPool(proxies, config.per_proxy_concurrency)
+
+    metrics = ScrapeMetrics()
+    metrics.add_gauge("queue_depth", queue.qsize)
+    metrics.add_gauge("proxies_full", proxy_pool.busy)
+    metrics.add_gauge("proxies_open", proxy_pool.open_circuits)
+    reporter = MetricsReporter(
+        metrics, config.metrics_path, config.metrics_port, config.progress_interval, progress=manifest.counts_in_thread
+    )
+
+    timeout = aiohttp.ClientTimeout(total=config.request_timeout)
+    pool_size = config.per_proxy_concurrency or config.limit_per_host
+
+    try:
+        async with Transport(pool_size, timeout, metrics=metrics, max_body_size=config.max_body_size) as transport:
+            proxy_pool.on_removed = transport.discard
+            ctx = ScrapeContext(
+                transport=transport,
+                proxy_pool=proxy_pool,
+                semaphore=asyncio.Semaphore(config.max_concurrent),
+                rate_limiter=RateLimiter(global_rate=config.global_rate, per_proxy_rate=config.per_proxy_rate),
+                manifest=manifest,
+                manifest_writer=manifest_writer,
+                store=store,
+                writer=writer,
+                metrics=metrics,
+                max_attempts=config.max_attempts,
+                base_url=config.base_url,
+                changes=ChangeReport(refresh),
+            )
+            await reporter.start()
+            workers = [] if leases else [asyncio.create_task(worker(ctx, queue)) for _ in range(num_workers)]
+            if config.proxies_path:
+                workers.append(asyncio.create_task(proxy_pool.watch(config.proxies_path, select=select_proxies)))
+            try:
+                if leases:
+                    await produce_leased(ctx, leases, headings, num_workers)
+                else:
+                    await produce(headings, manifest, queue, config.policy, config.priorities, refresh)
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                await reporter.stop()
+                logger.info(f"Changes: {ctx.changes.summary()}")
+                if config.changes_path:
+                    ctx.changes.append_to(config.changes_path)
+    finally:
+        logger.info(f"Manifest status: {manifest.counts()}")
+        writer.close()
+        manifest_writer.close()
+        manifest.close()
+        store.close()
+
+
+def mark_for_refresh(headings: list[str], config: ScrapeConfig) -> None:
+    """
+    Makes the done pages that `config.refresh` re-checks pending again: the first page of every heading for "probe",
+    all pages for "all". Partitioned runs lease chunks of pending pages, so this is done once before they start.
+    """
+    store = ShardStore(config.store_root)
+    manifest = Manifest(config.manifest_path)
+    try:
+        if manifest.is_new:
+            manifest.import_store(store, headings)
+        for heading in headings:
+            manifest.mark_stale(heading, 1, None if config.refresh == ALL else 1)
+    finally:
+        manifest.close()
+        store.close()
+
+
+def launch_partitions(count: int, argv: list[str], headings: list[str], config: ScrapeConfig) -> int:
+    """
+    Runs `count` scraper processes on this machine, one per partition, each with `argv` (which must include
+    `--partitions`) plus its `--partition`. Returns the first non-zero exit code.
+
+    When `config.refresh` is set, the pages to re-check are marked here, before any partition starts.
+    """
+    if config.refresh:
+        mark_for_refresh(headings, config)
+
+    processes = [
+        subprocess.Popen([sys.executable, __file__, *argv, "--partition", str(index)]) for index in range(count)
+    ]
+    codes = [process.wait() for process in processes]
+    return next((code for code in codes if code), 0)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the annotations of every heading in data/headings.json")
+    parser.add_argument(
+        "--refresh", choices=MODES, default=None, help="Re-check pages that are already done for changes"
+    )
+    parser.add_argument("--partitions", type=int, default=1, help="Number of scraper processes sharing the work")
+    parser.add_argument(
+        "--partition",
+        type=int,
+        default=None,
+        help="Run only this partition; default: all of them (with --refresh, expects the pages marked by that launch)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
     with open("./data/headings.json") as f:
         headings = json.load(f)
 
-    proxies = read_proxies("data/proxies.txt")
+    # Run with max 30 concurrent downloads, at most 4 req/s and 8 requests in flight through each proxy
+    config = ScrapeConfig(
+        max_concurrent=30,
+        global_rate=20.0,
+        per_proxy_rate=4.0,
+        per_proxy_concurrency=8,
+        proxies_path="data/proxies.txt",
+        refresh=args.refresh,
+        partition=(args.partition, args.partitions) if args.partitions > 1 else None,
+    )
 
-    # Run with max 10 concurrent downloads
-    asyncio.run(main(headings, proxies, max_concurrent=30))
+    if args.partitions > 1 and args.partition is None:
+        sys.exit(launch_partitions(args.partitions, sys.argv[1:], headings, config))
+
+    proxies = read_proxies("data/proxies.txt")
+    asyncio.run(main(headings, proxies, config))
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+_ASYNCIO_TIMEOUT = asyncio.TimeoutError
+
+
+class Py310TimeoutError(Exception):
+    """Stands in for `asyncio.TimeoutError` before Python 3.11, which the builtin TimeoutError does not catch"""
+
+
+@pytest.fixture
+def py310_timeouts(monkeypatch: pytest.MonkeyPatch) -> type[Exception]:
+    """
+    Timeouts as Python 3.10 raises them: `asyncio.wait_for` raises `asyncio.TimeoutError`, a class of its own, so
+    code that only catches the builtin TimeoutError lets them through. Returns that class.
+    """
+    wait_for = asyncio.wait_for
+
+    async def wait_for_py310(awaitable, timeout):
+        try:
+            return await wait_for(awaitable, timeout)
+        except (TimeoutError, _ASYNCIO_TIMEOUT) as e:
+            raise Py310TimeoutError() from e
+
+    monkeypatch.setattr(asyncio, "TimeoutError", Py310TimeoutError)
+    monkeypatch.setattr(asyncio, "wait_for", wait_for_py310)
+    return Py310TimeoutError
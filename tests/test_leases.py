@@ -0,0 +1,103 @@
+import types
+
+import pytest
+
+from pubchem_scraper import leases as leases_module
+from pubchem_scraper.leases import Leases, split_proxies
+from pubchem_scraper.manifest import Manifest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(leases_module, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def manifests(tmp_path):
+    """Two connections to one manifest, as two scraper processes would have"""
+    path = tmp_path / "manifest.sqlite"
+    first, second = Manifest(path), Manifest(path)
+    first.set_total_pages("Boiling Point", 25)
+    first.set_total_pages("Density", 5)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_expired_lease_is_reclaimed(manifests, clock):
+    a = Leases(manifests[0], owner="a", chunk_size=10, lease_seconds=60)
+    b = Leases(manifests[1], owner="b", chunk_size=10, lease_seconds=60)
+    a.add_headings(["Boiling Point", "Density"])
+    b.add_headings(["Boiling Point", "Density"])  # Idempotent
+
+    # Lowest chunk first, across headings
+    assert a.acquire() == ("Boiling Point", 0)
+    assert b.acquire() == ("Density", 0)
+    assert b.acquire() == ("Boiling Point", 1)
+    assert b.acquire() == ("Boiling Point", 2)
+    assert a.acquire() is None
+
+    clock.now += 30
+    assert a.renew() == 1
+    clock.now += 45  # b's leases expired, a's renewed one did not
+    assert a.acquire() == ("Density", 0)
+    assert a.acquire() == ("Boiling Point", 1)
+    assert a.acquire() == ("Boiling Point", 2)
+    assert a.acquire() is None
+    assert b.renew() == 0
+
+    # The chunks are a's to finish now
+    assert not b.finish("Boiling Point", 1)
+    assert a.finish("Boiling Point", 1)
+    assert b.unfinished()
+
+    for heading, chunk in [("Boiling Point", 0), ("Boiling Point", 2), ("Density", 0)]:
+        assert a.finish(heading, chunk)
+    assert not b.unfinished()
+    assert b.acquire() is None
+
+
+def test_reopen_outstanding_chunks(manifests, clock):
+    manifest = manifests[0]
+    leases = Leases(manifest, owner="a", chunk_size=10)
+    leases.add_headings(["Boiling Point"])
+    for page in range(1, 26):
+        manifest.mark_done("Boiling Point", page)
+    manifest.mark_failed("Boiling Point", 14, "HTTP 500")
+
+    while chunk := leases.acquire():
+        assert leases.outstanding_pages(*chunk) == ([14] if chunk == ("Boiling Point", 1) else [])
+        leases.finish(*chunk)
+
+    assert leases.reopen() == 1
+    assert leases.acquire() == ("Boiling Point", 1)
+    assert leases.acquire() is None
+
+
+def test_unknown_page_count_gets_one_chunk(tmp_path, clock):
+    manifest = Manifest(tmp_path / "manifest.sqlite")
+    leases = Leases(manifest, owner="a", chunk_size=10)
+    leases.add_headings(["Solubility"])
+    assert leases.acquire() == ("Solubility", 0)
+    assert leases.outstanding_pages("Solubility", 0) == [1]
+    assert leases.acquire() is None
+    manifest.close()
+
+
+def test_split_proxies():
+    proxies = [f"http://10.0.0.{i}:8080" for i in range(5)]
+    shares = [split_proxies(proxies, index, 2) for index in range(2)]
+    assert sorted(shares[0] + shares[1]) == proxies
+    assert not set(shares[0]) & set(shares[1])
+    with pytest.raises(ValueError):
+        split_proxies(proxies[:1], 1, 2)
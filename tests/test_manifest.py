@@ -0,0 +1,98 @@
+import asyncio
+import sqlite3
+
+from pubchem_scraper.manifest import _ADDED_COLUMNS, DONE, FAILED, PENDING, Manifest, ManifestWriter
+
+
+def page_row(manifest: Manifest, heading: str, page: int) -> tuple:
+    return manifest.conn.execute(
+        "SELECT status, attempts, last_error FROM pages WHERE heading = ? AND page = ?", (heading, page)
+    ).fetchone()
+
+
+def test_status_transitions(tmp_path):
+    manifest = Manifest(tmp_path / "manifest.sqlite")
+    assert manifest.set_total_pages("Boiling Point", 3) == []
+    assert page_row(manifest, "Boiling Point", 1) == (PENDING, 0, None)
+
+    manifest.record_attempt("Boiling Point", 1, "HTTP 503")
+    assert page_row(manifest, "Boiling Point", 1) == (PENDING, 1, "HTTP 503")
+
+    manifest.mark_failed("Boiling Point", 1, "HTTP 500")
+    assert page_row(manifest, "Boiling Point", 1) == (FAILED, 2, "HTTP 500")
+    assert list(manifest.iter_outstanding()) == [("Boiling Point", 1), ("Boiling Point", 2), ("Boiling Point", 3)]
+
+    manifest.mark_done("Boiling Point", 1, etag='"a"', content_hash="h1")
+    assert page_row(manifest, "Boiling Point", 1) == (DONE, 2, None)
+    assert list(manifest.iter_outstanding()) == [("Boiling Point", 2), ("Boiling Point", 3)]
+    assert manifest.counts() == {DONE: 1, PENDING: 2}
+
+    # A 304 leaves out validators, which keep their previous values
+    manifest.mark_done("Boiling Point", 1, last_modified="Tue, 01 Jul 2025 00:00:00 GMT")
+    assert manifest.validators("Boiling Point", 1) == ('"a"', "Tue, 01 Jul 2025 00:00:00 GMT", "h1")
+
+    assert manifest.mark_stale("Boiling Point") == 1
+    assert page_row(manifest, "Boiling Point", 1)[0] == PENDING
+    assert manifest.validators("Boiling Point", 1)[0] == '"a"'
+
+    assert manifest.set_total_pages("Boiling Point", 1) == [2, 3]
+    assert manifest.outstanding_counts() == {"Boiling Point": 1}
+    manifest.close()
+
+
+def test_added_columns_migration(tmp_path):
+    path = tmp_path / "manifest.sqlite"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE headings (heading TEXT PRIMARY KEY, total_pages INTEGER NOT NULL);
+        CREATE TABLE pages (
+            heading TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_at REAL,
+            PRIMARY KEY (heading, page)
+        );
+        INSERT INTO headings VALUES ('Melting Point', 2);
+        INSERT INTO pages (heading, page, status, attempts) VALUES ('Melting Point', 1, 'done', 1);
+        INSERT INTO pages (heading, page) VALUES ('Melting Point', 2);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    manifest = Manifest(path)
+    columns = {row[1] for row in manifest.conn.execute("PRAGMA table_info(pages)")}
+    assert set(_ADDED_COLUMNS) <= columns
+    assert not manifest.is_new
+    assert page_row(manifest, "Melting Point", 1) == (DONE, 1, None)
+    assert manifest.validators("Melting Point", 1) == (None, None, None)
+
+    manifest.mark_done("Melting Point", 2, etag='"b"')
+    assert manifest.validators("Melting Point", 2) == ('"b"', None, None)
+    manifest.close()
+
+    # Opening an upgraded manifest again leaves it as it is
+    manifest = Manifest(path)
+    assert manifest.validators("Melting Point", 2) == ('"b"', None, None)
+    manifest.close()
+
+
+def test_writer_applies_updates_in_order(tmp_path):
+    path = tmp_path / "manifest.sqlite"
+    manifest = Manifest(path)
+    manifest.set_total_pages("Density", 1)
+
+    async def record(writer: ManifestWriter) -> tuple:
+        await writer.record_attempt("Density", 1, "timeout")
+        await writer.mark_done("Density", 1, etag='"c"')
+        return await writer.validators("Density", 1)
+
+    writer = ManifestWriter(path)
+    assert asyncio.run(record(writer)) == ('"c"', None, None)
+    writer.close()
+
+    assert page_row(manifest, "Density", 1) == (DONE, 1, None)
+    manifest.close()
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+
+from pubchem_scraper.proxies import CLOSED, HALF_OPEN, OPEN, ProxyPool
+
+PROXIES = ["http://10.0.0.1:8080", "http://10.0.0.2:8080"]
+
+
+def test_circuit_cycle(py310_timeouts):
+    async def cycle():
+        pool = ProxyPool(PROXIES[:1], failure_threshold=2, open_seconds=0.05, rng=random.Random(0))
+        proxy = PROXIES[0]
+        health = pool.health[proxy]
+
+        for _ in range(2):
+            assert await pool.acquire() == proxy
+            pool.record_failure(proxy)
+            await pool.release(proxy)
+        assert health.state == OPEN
+        assert pool.open_circuits() == 1
+
+        # No proxy can take a request until the circuit turns half-open, which the wait times out for
+        start = time.monotonic()
+        assert await asyncio.wait_for(pool.acquire(), 1.0) == proxy
+        assert time.monotonic() - start >= 0.04
+        assert health.state == HALF_OPEN
+
+        # One probe at a time; a failed one reopens the circuit for twice as long
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.02)
+        assert not waiting.done()
+        pool.record_failure(proxy)
+        await pool.release(proxy)
+        assert health.state == OPEN
+        assert health.open_seconds == 0.1
+
+        start = time.monotonic()
+        assert await asyncio.wait_for(waiting, 1.0) == proxy
+        assert time.monotonic() - start >= 0.08
+        assert health.state == HALF_OPEN
+
+        pool.record_success(proxy, 0.2)
+        await pool.release(proxy)
+        assert health.state == CLOSED
+        assert health.open_seconds == 0.05
+        assert pool.open_circuits() == 0
+
+    asyncio.run(cycle())
+
+
+def test_open_circuit_is_skipped():
+    async def pick():
+        pool = ProxyPool(PROXIES, failure_threshold=1, open_seconds=60, rng=random.Random(0))
+        pool.record_failure(PROXIES[0])
+        picked = [await pool.acquire() for _ in range(10)]
+        return pool, picked
+
+    pool, picked = asyncio.run(pick())
+    assert picked == [PROXIES[1]] * 10
+    assert pool.health[PROXIES[1]].in_use == 10
+
+
+def test_removed_proxy_is_forgotten_after_its_last_request():
+    removed = []
+
+    async def reload():
+        pool = ProxyPool(PROXIES, per_proxy=1, on_removed=removed.append, rng=random.Random(0))
+        proxy = await pool.acquire()
+        pool.reload([p for p in PROXIES if p != proxy])
+        assert proxy in pool.health
+        assert not removed
+        await pool.release(proxy)
+        return pool, proxy
+
+    pool, proxy = asyncio.run(reload())
+    assert removed == [proxy]
+    assert proxy not in pool.health
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from benchmarks.bench_augment import legacy_augment, make_overlapping, make_strings
+from benchmarks.synthetic import PageSpec, make_names
+from pubchem_scraper.augment import augment
+from pubchem_scraper.markup_columns import ColumnarString
+from pubchem_scraper.pubchem_schema import SimpleMarkup, SimpleStringWithMarkup
+from pubchem_scraper.rewrite import MarkupRewriter, _overlapping
+
+
+@pytest.fixture(scope="module")
+def names():
+    return make_names(PageSpec().num_cids)
+
+
+@pytest.fixture(scope="module")
+def strings():
+    return make_strings(300, markup_density=0.15)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5])
+@pytest.mark.parametrize("overlapping", [False, True], ids=["disjoint", "overlapping"])
+def test_matches_legacy_augment(strings, names, n, overlapping):
+    if overlapping:
+        strings = make_overlapping(strings)
+    for i, string in enumerate(strings):
+        original = string.model_dump()
+        expected = legacy_augment(string, n, random.Random(i), names)
+        assert augment(string, n, random.Random(i), names).model_dump() == expected.model_dump()
+        assert string.model_dump() == original
+
+
+def markup(text: str, start: int, length: int, cid: int) -> SimpleMarkup:
+    return SimpleMarkup(start=start, length=length, cid=cid, hit=text[start : start + length])
+
+
+TEXT = "benzoic acid dissolves in ethanol"
+SHARED_START = SimpleStringWithMarkup(
+    string=TEXT, markup=[markup(TEXT, 0, 12, 243), markup(TEXT, 0, 7, 243), markup(TEXT, 26, 7, 702)]
+)
+
+
+def test_overlap_detection():
+    def spans(*spans: tuple[int, int]) -> ColumnarString:
+        return ColumnarString(TEXT, [s for s, _ in spans], [length for _, length in spans], [1] * len(spans))
+
+    assert not _overlapping(spans((0, 12), (26, 7)))
+    assert not _overlapping(spans((26, 7), (0, 12), (12, 1)))
+    assert _overlapping(spans((0, 12), (0, 7)))
+    assert _overlapping(spans((0, 12), (26, 7), (3, 2)))
+    assert _overlapping(spans((26, 7), (26, 7)))
+
+
+def test_overlapping_edits_apply_in_order():
+    rewriter = MarkupRewriter(SHARED_START)
+    rewriter.replace(0, "toluene")
+    rewriter.settle()
+    rewriter.replace(1, "xylene")  # Still the first 7 characters, now of "toluene"
+    rewriter.settle()
+    rewriter.prepend("ethanol", 702)
+    rewriter.settle()
+    result = rewriter.apply()
+
+    assert result.string == "ethanol: xylene dissolves in ethanol"
+    assert [(m.start, m.length, m.hit) for m in result.markup] == [
+        (0, 7, "ethanol"),
+        (9, 7, "toluene"),
+        (9, 6, "xylene"),
+        (29, 7, "ethanol"),
+    ]
+    assert SHARED_START.string == TEXT
+
+
+def test_sequential_matches_single_pass(strings):
+    for string in strings[:50]:
+        results = []
+        for sequential in (False, True):
+            rewriter = MarkupRewriter(string, sequential=sequential)
+            for idx in range(0, len(string.markup), 2):
+                rewriter.replace(idx, f"compound {idx}")
+                rewriter.settle()
+            rewriter.prepend("prefix", string.markup[0].cid)
+            rewriter.settle()
+            results.append(rewriter.apply().model_dump())
+        assert results[0] == results[1]